@@ -1,13 +1,13 @@
 # app/__init__.py
 
-from flask import Flask
+from flask import Flask, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_login import LoginManager
+from flask_login import LoginManager, current_user
 from config import Config
-from app.utils import has_role  # Import the has_role function
+from app.database import RoutingSession, configure_engines
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login = LoginManager()
 login.login_view = 'views.login'
@@ -15,23 +15,101 @@ login.login_view = 'views.login'
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    configure_engines(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
     login.init_app(app)
 
+    from app import instrumentation, metrics
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+
+    from app.models import user_cache
+    user_cache.configure(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
     from app.views import bp as views_bp
     app.register_blueprint(views_bp)
 
     from app.lookup_views import bp as lookup_bp
     app.register_blueprint(lookup_bp, url_prefix='/lookup')
 
+    from app.media_views import bp as media_bp
+    app.register_blueprint(media_bp, url_prefix='/media')
+
+    from app.gradebook_views import bp as gradebook_bp
+    app.register_blueprint(gradebook_bp, url_prefix='/gradebook')
+
+    from app.job_views import bp as jobs_bp
+    app.register_blueprint(jobs_bp, url_prefix='/admin/jobs')
+
+    from app.jobs import runner
+    runner.configure(app.config['JOB_WORKERS'], app.config['JOB_PROCESSES'], app.config['JOB_LIMITS'])
+
+    from app.cli import register_commands
+    register_commands(app)
+
+    from app.utils import has_role  # Import the has_role function
+    from app.permissions import permissions_for, permissions_for_role
+    from app.permissions import _cache as permission_cache
+    permission_cache.check_interval = app.config['PERMISSIONS_CHECK_INTERVAL']
+
     # Register custom filter
     @app.template_filter('get_role_groups')
     def get_role_groups(role):
-        return [group.name for group in role.groups]
+        return sorted(permissions_for_role(role.id).groups)
 
     # Make has_role function available to templates
     app.jinja_env.globals['has_role'] = has_role
 
+    # Cached reference tables for templates
+    from app.lookups import lookup_cache, lookup_name
+    lookup_cache.ttl = app.config['LOOKUP_CACHE_TTL']
+    app.jinja_env.globals['lookup_name'] = lookup_name
+
+    # Role-aware fragment cache for templates
+    from app.fragments import cached_fragment, fragment_cache
+    fragment_cache.configure(maxsize=app.config['FRAGMENT_CACHE_SIZE'], ttl=app.config['FRAGMENT_CACHE_TTL'])
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+
+    # Stored images: thumbnails are rendered in the background, never in a request
+    from app.images import school_logo, thumbnails, ImageError
+
+    thumbnails.configure(app.config['MEDIA_ROOT'], app.config['THUMBNAIL_SIZES'], app.config['IMAGE_WORKERS'])
+
+    def image_url(digest, size='small'):
+        return url_for('media.thumbnail', digest=digest, size=size) if digest else None
+
+    # School-wide settings, read from the in-process snapshot
+    from app.settings import setting, settings
+    settings.check_interval = app.config['SETTINGS_CHECK_INTERVAL']
+    app.jinja_env.globals['setting'] = setting
+
+    def school_logo_url(size='icon'):
+        # A logo uploaded on the settings page wins over the SCHOOL_LOGO file
+        digest = setting('school_logo')
+        if digest:
+            return image_url(digest, size)
+        try:
+            digest = school_logo.digest(app.config['SCHOOL_LOGO'], app.config['MEDIA_ROOT'],
+                                        app.config['MAX_IMAGE_BYTES'])
+        except (ImageError, OSError):
+            app.logger.exception("Could not load the school logo")
+            return None
+        return image_url(digest, size)
+
+    app.jinja_env.globals['image_url'] = image_url
+    app.jinja_env.globals['school_logo_url'] = school_logo_url
+
+    from app.search import search_index
+    search_index.max_age = app.config['SEARCH_INDEX_MAX_AGE']
+    search_index.check_interval = app.config['SEARCH_INDEX_CHECK_INTERVAL']
+    if app.config['SEARCH_INDEX_PRELOAD'] and app.config['SEARCH_BACKEND'] == 'memory':
+        search_index.preload(app)
+
+    # Compiled permissions of the logged-in user, shared by all templates
+    @app.context_processor
+    def inject_permissions():
+        return {'current_permissions': permissions_for(current_user)}
+
     return app
@@ -0,0 +1,460 @@
+# app/cli.py
+
+import json
+import sys
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command('export-users')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--role', 'role_id', type=int, help='Only users with this role id.')
+@click.option('--group', 'group_id', type=int, help='Only users in this role group id.')
+@click.option('--chunk-size', default=1000, show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write to a file instead of stdout.')
+@with_appcontext
+def export_users_command(fmt, compress, role_id, group_id, chunk_size, output):
+    """Stream users joined with their student profiles as CSV or JSONL."""
+    from app.export import export_roster
+    stream = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in export_roster(fmt, compress, role_id, group_id, chunk_size):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+
+
+@click.command('import-students')
+@click.argument('source')
+@click.option('--role', 'role_name', default='student', show_default=True, help='Role given to imported users.')
+@click.option('--source-role-id', default=19, show_default=True, help='Student role id in the legacy database.')
+@click.option('--chunk-size', default=1000, show_default=True)
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False),
+              help='Progress file used to resume an interrupted import.')
+@click.option('--default-password', help='Password for rows without a hash (defaults to the default password setting).')
+@click.option('--source-table', default='users', show_default=True, help='Table to read from a .sql dump.')
+@with_appcontext
+def import_students_command(source, role_name, source_role_id, chunk_size, checkpoint_path, default_password,
+                            source_table):
+    """Import students from a database URL, SQLite file, CSV file or .sql dump."""
+    from concurrent.futures import ProcessPoolExecutor
+    from app.importer import ImportSourceError, import_students
+    from app.settings import settings
+    from app.sqldump import DumpError
+    default_password = default_password or settings.get('default_password')
+    # One hashing pool for the whole run rather than one per chunk
+    pool = ProcessPoolExecutor(max_workers=current_app.config['JOB_PROCESSES'])
+    try:
+        result = import_students(source, role_name, source_role_id, chunk_size, checkpoint_path,
+                                 default_password, echo=click.echo, hash_pool=pool, source_table=source_table)
+    except (ImportSourceError, DumpError) as e:
+        raise click.ClickException(str(e))
+    finally:
+        pool.shutdown()
+    click.echo(f"Done: {result.inserted} inserted, {result.skipped} skipped, "
+               f"{result.read} read in {result.seconds:.1f}s ({result.rate:.0f} rows/s)")
+
+
+@click.command('dump-info')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def dump_info_command(path):
+    """List the tables, columns and row counts in a .sql dump."""
+    from app.sqldump import DumpError, DumpReader
+    reader = DumpReader(path)
+    rows = {}
+    try:
+        for batch in reader.batches(batch_size=10000):
+            rows[batch.table] = rows.get(batch.table, 0) + len(batch.rows)
+    except DumpError as e:
+        raise click.ClickException(str(e))
+    for name in sorted(set(reader.tables) | set(rows)):
+        columns = reader.tables[name].columns if name in reader.tables else ()
+        click.echo(f"{name}: {rows.get(name, 0)} rows")
+        for column in columns:
+            click.echo(f"    {column.name} {column.type}")
+
+
+@click.command('sync')
+@click.argument('tables', nargs=-1)
+@click.option('--source', help='Legacy database URL, SQLite file or .sql dump (defaults to LEGACY_DATABASE_URI).')
+@click.option('--full', is_flag=True, help='Read every source row instead of only those changed since the last sync.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--role', 'role_name', default='student', show_default=True, help='Role given to new students.')
+@click.option('--source-role-id', default=19, show_default=True, help='Student role id in the legacy database.')
+@with_appcontext
+def sync_command(tables, source, full, batch_size, role_name, source_role_id):
+    """Copy new and changed rows from school10 (roles, languages, students; all by default)."""
+    from concurrent.futures import ProcessPoolExecutor
+    from app.importer import ImportSourceError
+    from app.sqldump import DumpError
+    from app.sync import SYNC_TABLES, SyncError, sync_table
+    source = source or current_app.config['LEGACY_DATABASE_URI']
+    # One hashing pool for every batch of every table
+    pool = ProcessPoolExecutor(max_workers=current_app.config['JOB_PROCESSES'])
+    try:
+        for name in tables or SYNC_TABLES:
+            try:
+                result = sync_table(name, source, full, batch_size, role_name=role_name,
+                                    source_role_id=source_role_id, hash_pool=pool)
+            except (SyncError, ImportSourceError, DumpError) as e:
+                raise click.ClickException(str(e))
+            click.echo(f"{name}: {result.read} read, {result.inserted} inserted, {result.updated} updated, "
+                       f"{result.unchanged} unchanged, {result.conflicts} conflicts in {result.seconds:.1f}s")
+    finally:
+        pool.shutdown()
+
+
+@click.group('gradebook')
+def gradebook_command():
+    """Gradebook maintenance."""
+
+
+@gradebook_command.command('recompute')
+@click.option('--section', 'section_ids', type=int, multiple=True, help='Section id (repeatable).')
+@click.option('--term', 'term_id', type=int, help='Every section in this term.')
+@with_appcontext
+def gradebook_recompute_command(section_ids, term_id):
+    """Recompute stored averages, e.g. after changing weights or drop rules."""
+    from app import db
+    from app.gradebook import recompute_section
+    from app.models import Section
+    query = db.select(Section.id).order_by(Section.id)
+    if section_ids:
+        query = query.where(Section.id.in_(section_ids))
+    if term_id is not None:
+        query = query.where(Section.term_id == term_id)
+    section_ids = db.session.execute(query).scalars().all()
+    for section_id in section_ids:
+        grades = recompute_section(section_id)
+        click.echo(f"Section {section_id}: {len(grades.student_ids)} students")
+    click.echo(f"Recomputed {len(section_ids)} sections.")
+
+
+@gradebook_command.command('term-report')
+@click.argument('term_id', type=int)
+@with_appcontext
+def gradebook_term_report_command(term_id):
+    """Print course and section averages for a term."""
+    from app.gradebook import term_rollup
+    rollup = term_rollup(term_id)
+    if rollup.average is None:
+        raise click.ClickException(f"Nothing has been graded in term {term_id}.")
+    for course_id, average in sorted(rollup.courses.items()):
+        click.echo(f"Course {course_id}: {average:.2f}")
+    for section_id, average in sorted(rollup.sections.items()):
+        click.echo(f"Section {section_id}: {average:.2f}")
+    click.echo(f"Term average: {rollup.average:.2f} over {len(rollup.students)} students")
+
+
+@gradebook_command.command('add-term')
+@click.argument('name')
+@click.option('--starts', type=click.DateTime(['%Y-%m-%d']), help='First day, YYYY-MM-DD.')
+@click.option('--ends', type=click.DateTime(['%Y-%m-%d']), help='Last day, YYYY-MM-DD.')
+@with_appcontext
+def gradebook_add_term_command(name, starts, ends):
+    """Create a term."""
+    from app import db
+    from app.models import Term
+    if Term.query.filter_by(name=name).first() is not None:
+        raise click.ClickException(f"Term {name} already exists.")
+    term = Term(name=name, starts_on=starts.date() if starts else None, ends_on=ends.date() if ends else None)
+    db.session.add(term)
+    db.session.commit()
+    click.echo(f"Added term {term.id}: {name}.")
+
+
+@gradebook_command.command('add-course')
+@click.argument('code')
+@click.argument('name')
+@click.option('--grade', 'grade_id', type=int, help='Grade id the course is taught in.')
+@with_appcontext
+def gradebook_add_course_command(code, name, grade_id):
+    """Create a course."""
+    from app import db
+    from app.models import Course, Grade
+    if grade_id is not None and db.session.get(Grade, grade_id) is None:
+        raise click.ClickException(f"Grade {grade_id} does not exist.")
+    if Course.query.filter_by(code=code).first() is not None:
+        raise click.ClickException(f"Course {code} already exists.")
+    course = Course(code=code, name=name, grade_id=grade_id)
+    db.session.add(course)
+    db.session.commit()
+    click.echo(f"Added course {course.id}: {code} {name}.")
+
+
+@gradebook_command.command('add-section')
+@click.argument('course_code')
+@click.argument('term')
+@click.argument('name')
+@click.option('--teacher', help='Username of the teacher.')
+@with_appcontext
+def gradebook_add_section_command(course_code, term, name, teacher):
+    """Create a section of COURSE_CODE in the term named TERM."""
+    from app import db
+    from app.models import Course, Section, Term, User
+    course = Course.query.filter_by(code=course_code).first()
+    if course is None:
+        raise click.ClickException(f"Course {course_code} does not exist.")
+    term_row = Term.query.filter_by(name=term).first()
+    if term_row is None:
+        raise click.ClickException(f"Term {term} does not exist.")
+    teacher_id = None
+    if teacher:
+        user = User.query.filter_by(username=teacher).first()
+        if user is None:
+            raise click.ClickException(f"User {teacher} does not exist.")
+        teacher_id = user.id
+    section = Section(course_id=course.id, term_id=term_row.id, name=name, teacher_id=teacher_id)
+    db.session.add(section)
+    db.session.commit()
+    click.echo(f"Added section {section.id}: {course_code} {name}.")
+
+
+@gradebook_command.command('enroll')
+@click.argument('section_id', type=int)
+@click.argument('usernames', nargs=-1)
+@click.option('--grade', 'grade_id', type=int, help='Also enroll every student placed in this grade.')
+@with_appcontext
+def gradebook_enroll_command(section_id, usernames, grade_id):
+    """Enroll students in a section by username and/or grade."""
+    from app import db
+    from app.gradebook import recompute_section
+    from app.models import Enrollment, Section, StudentProfile, User
+    if db.session.get(Section, section_id) is None:
+        raise click.ClickException(f"Section {section_id} does not exist.")
+    student_ids = set()
+    if usernames:
+        found = dict(db.session.query(User.username, User.id).filter(User.username.in_(usernames)))
+        missing = sorted(set(usernames) - set(found))
+        if missing:
+            raise click.ClickException(f"Unknown users: {', '.join(missing)}")
+        student_ids.update(found.values())
+    if grade_id is not None:
+        student_ids.update(db.session.execute(
+            db.select(StudentProfile.user_id).where(StudentProfile.grade_id == grade_id)).scalars())
+    enrolled = set(db.session.execute(
+        db.select(Enrollment.student_id).where(Enrollment.section_id == section_id)).scalars())
+    new_ids = sorted(student_ids - enrolled)
+    db.session.add_all(Enrollment(section_id=section_id, student_id=student_id) for student_id in new_ids)
+    db.session.flush()
+    recompute_section(section_id)
+    click.echo(f"Enrolled {len(new_ids)} students in section {section_id}.")
+
+
+@click.group('homerooms')
+def homerooms_command():
+    """Homeroom placement."""
+
+
+@homerooms_command.command('add')
+@click.argument('name')
+@click.option('--grade', 'grade_id', type=int, required=True, help='Grade id the homeroom belongs to.')
+@click.option('--capacity', default=25, show_default=True, type=click.IntRange(1, 200))
+@click.option('--teacher', 'teacher', help='Username of the homeroom teacher.')
+@with_appcontext
+def homerooms_add_command(name, grade_id, capacity, teacher):
+    """Create a homeroom."""
+    from app import db
+    from app.models import Grade, Homeroom, User
+    if db.session.get(Grade, grade_id) is None:
+        raise click.ClickException(f"Grade {grade_id} does not exist.")
+    if Homeroom.query.filter_by(name=name).first() is not None:
+        raise click.ClickException(f"Homeroom {name} already exists.")
+    teacher_id = None
+    if teacher:
+        user = User.query.filter_by(username=teacher).first()
+        if user is None:
+            raise click.ClickException(f"User {teacher} does not exist.")
+        teacher_id = user.id
+    homeroom = Homeroom(name=name, grade_id=grade_id, capacity=capacity, teacher_id=teacher_id)
+    db.session.add(homeroom)
+    db.session.commit()
+    click.echo(f"Added homeroom {homeroom.id}: {name}.")
+
+
+@homerooms_command.command('assign')
+@click.argument('grade_id', type=int)
+@click.option('--full', is_flag=True, help='Place the whole grade from scratch instead of rebalancing.')
+@click.option('--apply', 'apply_', is_flag=True, help='Save the placement (otherwise only preview it).')
+@with_appcontext
+def homerooms_assign_command(grade_id, full, apply_):
+    """Balance a grade's students across its homerooms by headcount and language."""
+    from app.homerooms import apply_placement, plan_grade
+    from app.lookups import lookup_name
+    placement = plan_grade(grade_id, rebalance=not full)
+    if not placement.rooms:
+        raise click.ClickException(f"Grade {grade_id} has no homerooms.")
+    for room in placement.rooms:
+        languages = ', '.join(f"{lookup_name('languages', language_id, 'unknown')} {count}"
+                              for language_id, count in sorted(room.languages.items(), key=lambda item: -item[1]))
+        click.echo(f"{room.name}: {room.students}/{room.capacity} ({languages})")
+    click.echo(f"{len(placement.moves)} students move, {len(placement.unplaced)} could not be placed.")
+    if apply_:
+        click.echo(f"Saved {apply_placement(placement)} changes.")
+
+
+@click.group('images')
+def images_command():
+    """Stored images and thumbnails."""
+
+
+@images_command.command('import')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def images_import_command(paths):
+    """Add image files to the store and render their thumbnails."""
+    from app.images import ImageError, store_file, thumbnails
+    futures = []
+    for path in paths:
+        try:
+            digest = store_file(path, current_app.config['MEDIA_ROOT'], current_app.config['MAX_IMAGE_BYTES'])
+        except ImageError as e:
+            raise click.ClickException(f"{path}: {e}")
+        futures.append(thumbnails.submit(digest))
+        click.echo(f"{digest}  {path}")
+    for future in futures:
+        future.result()
+
+
+@images_command.command('rebuild')
+@with_appcontext
+def images_rebuild_command():
+    """Render any missing thumbnails, e.g. after adding a size to THUMBNAIL_SIZES."""
+    import os
+    from app.images import DIGEST, thumbnails
+    originals = os.path.join(current_app.config['MEDIA_ROOT'], 'originals')
+    digests = [name for _, _, names in os.walk(originals) for name in names if DIGEST.match(name)]
+    futures = [thumbnails.submit(digest) for digest in digests if thumbnails.missing(digest)]
+    rendered = sum(future.result() for future in futures)
+    click.echo(f"Rendered {rendered} thumbnails for {len(futures)} of {len(digests)} images.")
+
+
+@click.group('jobs')
+def jobs_command():
+    """Background jobs."""
+
+
+def _parse_param(item):
+    key, sep, value = item.partition('=')
+    if not sep:
+        raise click.BadParameter(f"{item} is not KEY=VALUE.")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+@jobs_command.command('list')
+@click.option('--status', type=click.Choice(['queued', 'running', 'succeeded', 'failed', 'cancelled']))
+@click.option('--limit', default=20, show_default=True)
+@with_appcontext
+def jobs_list_command(status, limit):
+    """Show the most recent jobs."""
+    from app.models import Job
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter(Job.status == status)
+    for job in query.limit(limit):
+        progress = f"{job.done}/{job.total}" if job.total is not None else str(job.done)
+        click.echo(f"{job.id:>6}  {job.type:<20} {job.status:<10} {progress:<12} {job.error or job.message or ''}")
+
+
+@jobs_command.command('show')
+@click.argument('job_id', type=int)
+@with_appcontext
+def jobs_show_command(job_id):
+    """Print a job's status, progress and result as JSON."""
+    from app.jobs import job_info
+    from app.models import Job
+    job = Job.query.get(job_id)
+    if job is None:
+        raise click.ClickException(f"Job {job_id} does not exist.")
+    click.echo(json.dumps(job_info(job), indent=2))
+
+
+@jobs_command.command('submit')
+@click.argument('job_type')
+@click.argument('params', nargs=-1)
+@click.option('--wait', is_flag=True, help='Run the job in this process and wait for it.')
+@with_appcontext
+def jobs_submit_command(job_type, params, wait):
+    """Queue a job, e.g. ``flask jobs submit import source=students.csv``.
+
+    Values are parsed as JSON where possible (``user_ids=[1,2,3]``).
+    """
+    from app.jobs import JobError, runner, submit
+    try:
+        job_id = submit(job_type, dict(_parse_param(item) for item in params), start=wait)
+    except JobError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Queued job {job_id}.")
+    if wait:
+        while runner.busy():
+            time.sleep(0.2)
+        runner.shutdown()
+        from app.models import Job
+        job = Job.query.get(job_id)
+        click.echo(f"Job {job_id} {job.status}: {job.error or job.result or ''}")
+
+
+@jobs_command.command('cancel')
+@click.argument('job_id', type=int)
+@with_appcontext
+def jobs_cancel_command(job_id):
+    """Cancel a queued job, or ask a running one to stop."""
+    from app.jobs import cancel
+    if not cancel(job_id):
+        raise click.ClickException(f"Job {job_id} is not queued or running.")
+    click.echo(f"Cancel requested for job {job_id}.")
+
+
+@jobs_command.command('run')
+@click.option('--once', is_flag=True, help='Run the jobs queued now, then exit.')
+@click.option('--interval', default=2.0, show_default=True, help='Seconds between checks for new jobs.')
+@with_appcontext
+def jobs_run_command(once, interval):
+    """Run queued jobs; use with JOBS_RUN_IN_WEB = False to keep them out of the web workers."""
+    from app.jobs import dispatch_queued, recover_stale, runner
+    app = current_app._get_current_object()
+    try:
+        while True:
+            recovered = recover_stale(app.config['JOB_STALE_AFTER'])
+            if recovered:
+                click.echo(f"Marked {recovered} abandoned jobs as failed.")
+            started = dispatch_queued(app)
+            if started:
+                click.echo(f"Started {started} jobs.")
+            if once:
+                while runner.busy():
+                    time.sleep(0.2)
+                return
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        click.echo("Waiting for running jobs to finish...")
+    finally:
+        runner.shutdown()
+
+
+@jobs_command.command('prune')
+@click.option('--days', default=30, show_default=True, help='Keep jobs that finished more recently than this.')
+@with_appcontext
+def jobs_prune_command(days):
+    """Delete old finished jobs and their files."""
+    from app.jobs import prune
+    click.echo(f"Deleted {prune(days)} jobs.")
+
+
+def register_commands(app):
+    app.cli.add_command(export_users_command)
+    app.cli.add_command(import_students_command)
+    app.cli.add_command(dump_info_command)
+    app.cli.add_command(sync_command)
+    app.cli.add_command(gradebook_command)
+    app.cli.add_command(homerooms_command)
+    app.cli.add_command(images_command)
+    app.cli.add_command(jobs_command)
@@ -0,0 +1,143 @@
+# app/database.py
+
+import threading
+import time
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import exc, make_url
+from sqlalchemy.pool import QueuePool
+
+REPLICA_BIND = 'replica'
+
+
+class CheckoutStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            if seconds > self.max_wait:
+                self.max_wait = seconds
+
+    def timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = CheckoutStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timed_out()
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(config, url):
+    """Pool settings from ``Config`` for one database URL."""
+    url = make_url(url)
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options  # Flask-SQLAlchemy pins in-memory SQLite to a StaticPool
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    })
+    return options
+
+
+def configure_engines(app):
+    config = app.config
+    options = engine_options(config, config['SQLALCHEMY_DATABASE_URI'])
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    replica_uri = config.get('REPLICA_DATABASE_URI')
+    if replica_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_uri, **engine_options(config, replica_uri)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def use_replica():
+    """Send the rest of this request's reads to the replica, if configured."""
+    g.read_replica = True
+
+
+def _replica_requested():
+    return has_request_context() and g.get('read_replica', False)
+
+
+class RoutingSession(Session):
+    """Routes reads to the replica bind for requests marked read-only.
+
+    Flushes always go to the primary, as do models with their own bind key.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _replica_requested():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                table = getattr(mapper, 'local_table', None) if mapper is not None else None
+                if table is None or table.metadata.info.get('bind_key') is None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_engine():
+    from app import db
+    if _replica_requested():
+        return db.engines.get(REPLICA_BIND, db.engine)
+    return db.engine
+
+
+def pool_stats():
+    from app import db
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        entry = {'pool': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'max_overflow': pool._max_overflow,
+            })
+            entry['saturation'] = round(entry['checked_out'] / (entry['size'] + max(entry['max_overflow'], 0) or 1), 3)
+        checkout = getattr(pool, 'stats', None)
+        if checkout is not None:
+            entry.update({
+                'checkouts': checkout.checkouts,
+                'checkout_timeouts': checkout.timeouts,
+                'checkout_wait_total_s': checkout.total_wait,
+                'checkout_wait_avg_ms': round(checkout.total_wait / checkout.checkouts * 1000, 3) if checkout.checkouts else 0.0,
+                'checkout_wait_max_ms': round(checkout.max_wait * 1000, 3),
+            })
+        stats[key or 'primary'] = entry
+    return stats
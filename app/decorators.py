@@ -3,19 +3,27 @@
 from functools import wraps
 from flask import abort, current_app
 from flask_login import current_user
-
-SUPERUSER_ROLES = ['IT Support', 'superadmin']  # Add any other superuser roles here
+from app.permissions import permissions_for
+from app.database import use_replica
 
 def role_required(role):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            role_groups = [group.name for group in current_user.role.groups]
-            current_app.logger.debug(f"User {current_user.username} has role groups: {role_groups}")
-            current_app.logger.debug(f"User {current_user.username} has role: {current_user.role.name}")
-            if role not in role_groups and current_user.role.name not in SUPERUSER_ROLES:
-                current_app.logger.debug(f"Access denied for user {current_user.username} with role {current_user.role.name}")
+            permissions = permissions_for(current_user)
+            current_app.logger.debug(f"User {current_user.username} has role groups: {sorted(permissions.groups)}")
+            current_app.logger.debug(f"User {current_user.username} has role: {permissions.role_name}")
+            if not permissions.allows(role):
+                current_app.logger.debug(f"Access denied for user {current_user.username} with role {permissions.role_name}")
                 abort(403)
             return f(*args, **kwargs)
         return decorated_function
     return decorator
+
+def read_only(f):
+    """Route the view's queries to the read replica when one is configured."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        use_replica()
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,93 @@
+# app/export.py
+
+import csv
+import io
+import json
+import zlib
+from sqlalchemy import select
+from app.models import User, Role, StudentProfile, Grade, State, Language
+from app.queries import filter_users
+from app.database import read_engine
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+EXPORT_COLUMNS = [
+    User.id, User.username, User.email, User.first_name, User.last_name,
+    Role.name.label('role'),
+    StudentProfile.age,
+    Grade.name.label('grade'),
+    StudentProfile.address1, StudentProfile.address2, StudentProfile.city,
+    State.name.label('state'), State.abbreviation.label('state_abbreviation'),
+    StudentProfile.zip,
+    Language.name.label('primary_language'),
+]
+
+
+def roster_query(role_id=None, group_id=None):
+    query = select(*EXPORT_COLUMNS) \
+        .select_from(User) \
+        .outerjoin(Role, Role.id == User.role_id) \
+        .outerjoin(StudentProfile, StudentProfile.user_id == User.id) \
+        .outerjoin(Grade, Grade.id == StudentProfile.grade_id) \
+        .outerjoin(State, State.id == StudentProfile.state_id) \
+        .outerjoin(Language, Language.id == StudentProfile.primary_language_id) \
+        .order_by(User.id)
+    return filter_users(query, role_id, group_id)
+
+
+def roster_batches(role_id=None, group_id=None, chunk_size=1000, progress=None):
+    # Server-side cursor: rows arrive chunk_size at a time as plain tuples,
+    # never as ORM objects, so memory stays flat however big the roster is
+    rows = 0
+    with read_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size) \
+            .execute(roster_query(role_id, group_id))
+        for batch in result.partitions():
+            rows += len(batch)
+            if progress:
+                progress(rows)
+            yield batch
+
+
+def export_columns():
+    return [column.key for column in EXPORT_COLUMNS]
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_columns())
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def jsonl_chunks(batches):
+    columns = export_columns()
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in batch)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_roster(fmt='csv', compress=False, role_id=None, group_id=None, chunk_size=1000, progress=None):
+    """Encoded chunks of the roster; ``progress(rows)`` is called per batch read."""
+    batches = roster_batches(role_id, group_id, chunk_size, progress)
+    chunks = csv_chunks(batches) if fmt == 'csv' else jsonl_chunks(batches)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
@@ -1,9 +1,13 @@
 # app/forms.py
 
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import StringField, PasswordField, SubmitField, SelectField, IntegerField, TextAreaField
-from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Optional
-from app.models import User, Role, Grade, Language, State
+from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Optional, NumberRange
+from app.models import User
+from app.lookups import choices
+from app.homerooms import teacher_choices
+from app.settings import THEMES
 
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -39,7 +43,7 @@ class ManualStudentEntryForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(ManualStudentEntryForm, self).__init__(*args, **kwargs)
-        self.role.choices = [(role.id, role.name) for role in Role.query.order_by('name')]
+        self.role.choices = choices('roles')
 
 class StudentProfileForm(FlaskForm):
     age = IntegerField('Age', validators=[Optional()])
@@ -54,6 +58,45 @@ class StudentProfileForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(StudentProfileForm, self).__init__(*args, **kwargs)
-        self.grade.choices = [(grade.id, grade.name) for grade in Grade.query.order_by('name')]
-        self.primary_language.choices = [(language.id, language.name) for language in Language.query.order_by('name')]
-        self.state.choices = [(state.id, state.name) for state in State.query.order_by('name')]
+        self.grade.choices = choices('grades')
+        self.primary_language.choices = choices('languages')
+        self.state.choices = choices('states')
+
+class NoteForm(FlaskForm):
+    note = TextAreaField('Note', validators=[DataRequired()])
+    submit = SubmitField('Save')
+
+class PhotoForm(FlaskForm):
+    photo = FileField('Photo', validators=[FileRequired()])
+    submit = SubmitField('Upload')
+
+class SettingsForm(FlaskForm):
+    school_name = StringField('School Name', validators=[DataRequired()])
+    school_domain = StringField('Email Domain', validators=[DataRequired()])
+    default_password = StringField('Default Password', validators=[DataRequired()])
+    theme = SelectField('Theme', choices=THEMES)
+    logo = FileField('School Logo')
+    submit = SubmitField('Save')
+
+    def validate_school_domain(self, school_domain):
+        domain = school_domain.data.strip().lstrip('@')
+        if '.' not in domain or ' ' in domain:
+            raise ValidationError('Enter a domain such as school.edu.')
+        school_domain.data = domain
+
+class ImportForm(FlaskForm):
+    file = FileField('Student File', validators=[FileRequired(), FileAllowed(['csv', 'sql'], 'Upload a CSV file or SQL dump.')])
+    role = StringField('Role', default='student', validators=[DataRequired()])
+    submit = SubmitField('Import')
+
+class HomeroomForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired()])
+    grade = SelectField('Grade', coerce=int, validators=[DataRequired()])
+    teacher = SelectField('Teacher', coerce=int, validators=[Optional()])
+    capacity = IntegerField('Capacity', default=25, validators=[DataRequired(), NumberRange(min=1, max=200)])
+    submit = SubmitField('Save')
+
+    def __init__(self, *args, **kwargs):
+        super(HomeroomForm, self).__init__(*args, **kwargs)
+        self.grade.choices = choices('grades')
+        self.teacher.choices = [(0, 'No teacher')] + teacher_choices()
@@ -0,0 +1,91 @@
+# app/fragments.py
+
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import get_flashed_messages, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from app.cache import LRUCache
+from app.permissions import permissions_for
+from app.versions import current_versions
+
+# Rendered template fragments; see cached_fragment
+fragment_cache = LRUCache('fragments', maxsize=512, ttl=600)
+
+
+def _audience():
+    # Everything the nav and list pages vary on for a viewer: their role groups
+    permissions = permissions_for(current_user)
+    return (current_user.is_authenticated, permissions.mask, permissions.is_superuser)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def cached_fragment(name, *key, depends=(), caller=None):
+    """Jinja helper: ``{% call cached_fragment('nav', depends=('roles',)) %}...{% endcall %}``.
+
+    The body is rendered once per fragment name, extra ``key`` values, the
+    viewer's role-group set and the versions of the ``depends`` data, then
+    served from a bounded LRU cache. Queries the body needs should happen
+    inside it (pass lazy queries or loaders from the view) so a hit runs none.
+    """
+    versions = current_versions() if depends else {}
+    cache_key = (name, _freeze(key), _audience(), tuple(versions[dependency][0] for dependency in depends))
+    html = fragment_cache.get(cache_key)
+    if html is None:
+        html = Markup(caller())
+        fragment_cache.set(cache_key, html)
+    return html
+
+
+def conditional(*depends, unless=None):
+    """Serve GETs with an ETag and Last-Modified, answering 304 before the view runs.
+
+    The ETag covers the URL, the viewer and their role groups and the named
+    data versions (plus 'settings'), so revalidating costs one small query. ``unless`` (called
+    with the view's arguments) opts a request out, e.g. pages with a CSRF
+    token that must not be reused from the browser cache.
+    """
+    # Every page renders the school name and theme from the settings table
+    depends = depends + ('settings',)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes') or (unless and unless(**kwargs)):
+                return f(*args, **kwargs)
+            versions = current_versions()
+            parts = (request.endpoint, request.full_path, current_user.get_id(), _audience(),
+                     [versions[name][0] for name in depends])
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+            stamps = [versions[name][1] for name in depends if versions[name][1] is not None]
+            last_modified = max(stamps).replace(microsecond=0, tzinfo=timezone.utc) if stamps else None
+
+            # If-None-Match wins when both are sent (RFC 9110 13.2.2)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(last_modified and since and last_modified <= since)
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                # A page showing a flashed message is a one-off
+                if response.status_code != 200 or get_flashed_messages():
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
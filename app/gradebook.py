@@ -0,0 +1,252 @@
+# app/gradebook.py
+
+from collections import namedtuple
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from app import db
+from app.models import Assignment, AssignmentCategory, Enrollment, Score, Section
+
+SectionLayout = namedtuple('SectionLayout', ['assignment_ids', 'columns', 'category_ids', 'category_index',
+                                             'possible', 'weights', 'drop_lowest'])
+SectionGrades = namedtuple('SectionGrades', ['student_ids', 'categories', 'averages'])
+TermRollup = namedtuple('TermRollup', ['students', 'sections', 'courses', 'average'])
+AssignmentStats = namedtuple('AssignmentStats', ['assignment_id', 'graded', 'mean', 'median', 'low', 'high'])
+
+
+def load_layout(section_id):
+    """Categories and assignments of a section as aligned arrays."""
+    categories = db.session.execute(
+        select(AssignmentCategory.id, AssignmentCategory.weight, AssignmentCategory.drop_lowest)
+        .where(AssignmentCategory.section_id == section_id).order_by(AssignmentCategory.id)
+    ).all()
+    category_ids = [row.id for row in categories]
+    category_positions = {category_id: index for index, category_id in enumerate(category_ids)}
+    assignments = db.session.execute(
+        select(Assignment.id, Assignment.category_id, Assignment.points_possible)
+        .where(Assignment.section_id == section_id).order_by(Assignment.id)
+    ).all()
+    assignment_ids = [row.id for row in assignments]
+    return SectionLayout(
+        assignment_ids=assignment_ids,
+        columns={assignment_id: index for index, assignment_id in enumerate(assignment_ids)},
+        category_ids=category_ids,
+        category_index=np.array([category_positions[row.category_id] for row in assignments], dtype=np.intp),
+        possible=np.array([row.points_possible for row in assignments], dtype=float),
+        weights=np.array([row.weight for row in categories], dtype=float),
+        drop_lowest=np.array([row.drop_lowest for row in categories], dtype=np.intp),
+    )
+
+
+def load_scores(layout, section_id, student_ids):
+    """(students x assignments) matrix of points; NaN where ungraded or excused."""
+    rows = {student_id: index for index, student_id in enumerate(student_ids)}
+    scores = np.full((len(student_ids), len(layout.assignment_ids)), np.nan)
+    if not student_ids or not layout.assignment_ids:
+        return scores
+    query = (select(Score.student_id, Score.assignment_id, Score.points)
+             .join(Assignment, Assignment.id == Score.assignment_id)
+             .where(Assignment.section_id == section_id, Score.excused.is_(False), Score.points.is_not(None)))
+    if len(student_ids) == 1:
+        query = query.where(Score.student_id == student_ids[0])
+    found = [(rows[student_id], layout.columns[assignment_id], points)
+             for student_id, assignment_id, points in db.session.execute(query) if student_id in rows]
+    if found:
+        row_index, column_index, points = zip(*found)
+        scores[list(row_index), list(column_index)] = points
+    return scores
+
+
+def weighted_averages(scores, layout):
+    """Category and final percentages for every row of ``scores`` at once.
+
+    Within a category the percentage is points earned over points possible
+    for the graded assignments that survive the drop-lowest rule (by
+    percentage, always keeping at least one). Categories with nothing graded
+    are left out and the remaining weights renormalized, so a student's
+    average only reflects work that has been graded.
+    """
+    student_count, assignment_count = scores.shape
+    category_count = len(layout.category_ids)
+    if not student_count or not category_count:
+        return np.full((student_count, category_count), np.nan), np.full(student_count, np.nan)
+
+    possible = layout.possible
+    graded = ~np.isnan(scores)
+    earned = np.where(graded, scores, 0.0)
+    percent = np.where(graded, earned / np.where(possible > 0, possible, 1.0), np.inf)
+
+    # Drop-lowest is one vectorized pass per category that has the rule
+    for category in np.flatnonzero(layout.drop_lowest > 0):
+        columns = np.flatnonzero(layout.category_index == category)
+        drop = min(int(layout.drop_lowest[category]), len(columns))
+        if not drop:
+            continue
+        lowest = np.argsort(percent[:, columns], axis=1, kind='stable')[:, :drop]
+        to_drop = np.minimum(drop, np.maximum(graded[:, columns].sum(axis=1) - 1, 0))
+        dropped = np.arange(drop) < to_drop[:, None]
+        rows = np.broadcast_to(np.arange(student_count)[:, None], lowest.shape)
+        graded[rows[dropped], columns[lowest[dropped]]] = False
+
+    # Sum assignments into categories with a one-hot (assignments x categories) matrix
+    membership = np.zeros((assignment_count, category_count))
+    membership[np.arange(assignment_count), layout.category_index] = 1.0
+    earned_by_category = np.where(graded, earned, 0.0) @ membership
+    possible_by_category = np.where(graded, possible, 0.0) @ membership
+    categories = np.full_like(earned_by_category, np.nan)
+    np.divide(earned_by_category, possible_by_category, out=categories, where=possible_by_category > 0)
+
+    weights = layout.weights if layout.weights.sum() > 0 else np.ones(category_count)
+    weights = np.where(np.isnan(categories), 0.0, weights)
+    total_weight = weights.sum(axis=1)
+    averages = np.full(student_count, np.nan)
+    np.divide(np.nansum(categories * weights, axis=1), total_weight, out=averages, where=total_weight > 0)
+    return categories * 100, averages * 100
+
+
+def _enrolled_student_ids(section_id):
+    return list(db.session.execute(
+        select(Enrollment.student_id).where(Enrollment.section_id == section_id).order_by(Enrollment.student_id)
+    ).scalars())
+
+
+def _as_float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def section_grades(section_id):
+    layout = load_layout(section_id)
+    student_ids = _enrolled_student_ids(section_id)
+    categories, averages = weighted_averages(load_scores(layout, section_id, student_ids), layout)
+    return SectionGrades(student_ids, categories, averages)
+
+
+def recompute_section(section_id):
+    """Recompute every enrollment average and the section aggregate.
+
+    Needed after changes to the section's categories or assignments (weights,
+    drop rules, points possible); single score edits go through record_score.
+    """
+    grades = section_grades(section_id)
+    averages = [_as_float(value) for value in grades.averages]
+    if grades.student_ids:
+        statement = (update(Enrollment.__table__)
+                     .where(Enrollment.section_id == bindparam('b_section_id'),
+                            Enrollment.student_id == bindparam('b_student_id'))
+                     .values(average=bindparam('b_average')))
+        db.session.execute(statement, [{'b_section_id': section_id, 'b_student_id': student_id, 'b_average': average}
+                                       for student_id, average in zip(grades.student_ids, averages)])
+    graded = [average for average in averages if average is not None]
+    db.session.execute(update(Section.__table__).where(Section.id == section_id).values(
+        average=float(np.mean(graded)) if graded else None, graded_count=len(graded)))
+    db.session.commit()
+    return grades
+
+
+def _apply_section_delta(section, old, new):
+    total = (section.average or 0.0) * section.graded_count
+    count = section.graded_count
+    if old is not None:
+        total -= old
+        count -= 1
+    if new is not None:
+        total += new
+        count += 1
+    section.graded_count = count
+    section.average = total / count if count else None
+
+
+def recompute_student(section_id, student_id):
+    """Recompute one enrollment and shift the section aggregate by the change."""
+    enrollment = db.session.get(Enrollment, (section_id, student_id))
+    if enrollment is None:
+        return None
+    layout = load_layout(section_id)
+    _, averages = weighted_averages(load_scores(layout, section_id, [student_id]), layout)
+    old, new = enrollment.average, _as_float(averages[0])
+    if old != new:
+        enrollment.average = new
+        _apply_section_delta(db.session.get(Section, section_id), old, new)
+    return new
+
+
+def record_score(assignment_id, student_id, points, excused=False):
+    """Save one score and update only that student's and section's averages."""
+    assignment = db.session.get(Assignment, assignment_id)
+    if assignment is None:
+        raise ValueError(f"Assignment {assignment_id} does not exist.")
+    score = db.session.get(Score, (assignment_id, student_id))
+    if score is None:
+        score = Score(assignment_id=assignment_id, student_id=student_id)
+        db.session.add(score)
+    score.points = points
+    score.excused = excused
+    db.session.flush()
+    average = recompute_student(assignment.section_id, student_id)
+    db.session.commit()
+    return average
+
+
+def record_scores(assignment_id, points_by_student):
+    """Save a whole column of scores ({student_id: points}) and recompute the section."""
+    assignment = db.session.get(Assignment, assignment_id)
+    if assignment is None:
+        raise ValueError(f"Assignment {assignment_id} does not exist.")
+    existing = {score.student_id: score for score in
+                Score.query.filter(Score.assignment_id == assignment_id,
+                                   Score.student_id.in_(list(points_by_student)))}
+    for student_id, points in points_by_student.items():
+        score = existing.get(student_id)
+        if score is None:
+            db.session.add(Score(assignment_id=assignment_id, student_id=student_id, points=points))
+        else:
+            score.points = points
+    db.session.flush()
+    return recompute_section(assignment.section_id)
+
+
+def assignment_statistics(section_id):
+    """Mean, median and range of each assignment's percentage across the section."""
+    layout = load_layout(section_id)
+    scores = load_scores(layout, section_id, _enrolled_student_ids(section_id))
+    percent = np.full_like(scores, np.nan)
+    np.divide(scores * 100, layout.possible, out=percent, where=layout.possible > 0)
+    graded = (~np.isnan(percent)).sum(axis=0)
+    filled = np.where(np.isnan(percent), 0.0, percent)
+    means = np.full(len(layout.assignment_ids), np.nan)
+    np.divide(filled.sum(axis=0), graded, out=means, where=graded > 0)
+    has_scores = graded > 0
+    medians = np.full_like(means, np.nan)
+    lows = np.full_like(means, np.nan)
+    highs = np.full_like(means, np.nan)
+    if has_scores.any():
+        medians[has_scores] = np.nanmedian(percent[:, has_scores], axis=0)
+        lows[has_scores] = np.nanmin(percent[:, has_scores], axis=0)
+        highs[has_scores] = np.nanmax(percent[:, has_scores], axis=0)
+    return [AssignmentStats(assignment_id, int(graded[index]), _as_float(means[index]), _as_float(medians[index]),
+                            _as_float(lows[index]), _as_float(highs[index]))
+            for index, assignment_id in enumerate(layout.assignment_ids)]
+
+
+def _grouped_means(keys, values):
+    ids, index = np.unique(keys, return_inverse=True)
+    means = np.bincount(index, weights=values) / np.bincount(index)
+    return {int(key): round(float(mean), 4) for key, mean in zip(ids, means)}
+
+
+def term_rollup(term_id):
+    """Average of the stored section averages per student, section and course."""
+    rows = db.session.execute(
+        select(Enrollment.student_id, Enrollment.section_id, Section.course_id, Enrollment.average)
+        .join(Section, Section.id == Enrollment.section_id)
+        .where(Section.term_id == term_id, Enrollment.average.is_not(None))
+    ).all()
+    if not rows:
+        return TermRollup({}, {}, {}, None)
+    student_ids, section_ids, course_ids, averages = (np.array(column) for column in zip(*rows))
+    averages = averages.astype(float)
+    return TermRollup(
+        students=_grouped_means(student_ids, averages),
+        sections=_grouped_means(section_ids, averages),
+        courses=_grouped_means(course_ids, averages),
+        average=round(float(averages.mean()), 4),
+    )
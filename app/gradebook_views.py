@@ -0,0 +1,138 @@
+# app/gradebook_views.py
+
+import datetime
+import math
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
+from app import db
+from app.gradebook import (assignment_statistics, load_layout, load_scores, record_scores, recompute_section,
+                           weighted_averages)
+from app.models import Assignment, AssignmentCategory, Enrollment, Section, User
+from app.permissions import permissions_for
+
+bp = Blueprint('gradebook', __name__)
+
+
+def _can_grade(section):
+    # Admins grade every section, teachers the ones they teach
+    return permissions_for(current_user).allows('admin') or section.teacher_id == current_user.id
+
+
+def _section_or_403(section_id):
+    section = Section.query.options(joinedload(Section.course), joinedload(Section.term)) \
+        .filter_by(id=section_id).first_or_404()
+    if not _can_grade(section):
+        abort(403)
+    return section
+
+
+def _number(value):
+    value = (value or '').strip()
+    return float(value) if value else None
+
+
+def _cells(values):
+    # NumPy rows to template values; NaN (ungraded) becomes None
+    return [None if math.isnan(value) else round(float(value), 2) for value in values]
+
+
+# Sections the current user can grade
+@bp.route('/')
+@login_required
+def list_sections():
+    permissions = permissions_for(current_user)
+    if not (permissions.allows('faculty') or permissions.allows('admin')):
+        abort(403)
+    query = Section.query.options(joinedload(Section.course), joinedload(Section.term), joinedload(Section.teacher))
+    if not permissions.allows('admin'):
+        query = query.filter(Section.teacher_id == current_user.id)
+    sections = query.order_by(Section.term_id.desc(), Section.course_id, Section.name).all()
+    return render_template('gradebook_sections.html', title='Gradebook', sections=sections)
+
+
+# One section: scores and averages, plus categories, assignments and enrollment
+@bp.route('/section/<int:section_id>', methods=['GET', 'POST'])
+@login_required
+def section(section_id):
+    section = _section_or_403(section_id)
+    if request.method == 'POST':
+        action = request.form.get('action')
+        name = request.form.get('name', '').strip()
+        if action in ('category', 'assignment') and not name:
+            flash('Enter a name.')
+            return redirect(url_for('gradebook.section', section_id=section.id))
+        try:
+            if action == 'category':
+                db.session.add(AssignmentCategory(section_id=section.id, name=name,
+                                                  weight=_number(request.form.get('weight')) or 1.0,
+                                                  drop_lowest=int(request.form.get('drop_lowest') or 0)))
+                db.session.flush()
+                recompute_section(section.id)
+                flash('Category added.')
+            elif action == 'assignment':
+                category = db.session.get(AssignmentCategory, request.form.get('category', type=int) or 0)
+                if category is None or category.section_id != section.id:
+                    abort(400)
+                due_on = request.form.get('due_on')
+                db.session.add(Assignment(section_id=section.id, category_id=category.id, name=name,
+                                          points_possible=_number(request.form.get('points_possible')) or 100.0,
+                                          due_on=datetime.date.fromisoformat(due_on) if due_on else None))
+                db.session.commit()
+                flash('Assignment added.')
+            elif action == 'enroll':
+                student = User.query.filter_by(username=request.form['username'].strip()).first()
+                if student is None:
+                    flash('No user with that username.')
+                elif db.session.get(Enrollment, (section.id, student.id)) is None:
+                    db.session.add(Enrollment(section_id=section.id, student_id=student.id))
+                    db.session.flush()
+                    recompute_section(section.id)
+                    flash(f'{student.username} enrolled.')
+            else:
+                abort(400)
+        except ValueError:
+            db.session.rollback()
+            flash('Enter numbers for weights, points and drop counts, and dates as YYYY-MM-DD.')
+        return redirect(url_for('gradebook.section', section_id=section.id))
+
+    layout = load_layout(section.id)
+    student_ids = [student_id for (student_id,) in db.session.query(Enrollment.student_id)
+                   .filter(Enrollment.section_id == section.id).order_by(Enrollment.student_id)]
+    scores = load_scores(layout, section.id, student_ids)
+    categories, averages = weighted_averages(scores, layout)
+    students = {user.id: user for user in User.query.filter(User.id.in_(student_ids))} if student_ids else {}
+    rows = [(students[student_id], _cells(scores[index]), _cells(categories[index]), _cells([averages[index]])[0])
+            for index, student_id in enumerate(student_ids)]
+    return render_template('gradebook_section.html', title=section.name, section=section,
+                           categories=AssignmentCategory.query.filter_by(section_id=section.id)
+                           .order_by(AssignmentCategory.id).all(),
+                           assignments=Assignment.query.filter_by(section_id=section.id).order_by(Assignment.id).all(),
+                           rows=rows, statistics=assignment_statistics(section.id))
+
+
+# Enter or correct a whole column of scores for one assignment
+@bp.route('/assignment/<int:assignment_id>/scores', methods=['GET', 'POST'])
+@login_required
+def enter_scores(assignment_id):
+    assignment = db.get_or_404(Assignment, assignment_id)
+    section = _section_or_403(assignment.section_id)
+    enrollments = Enrollment.query.options(joinedload(Enrollment.student)) \
+        .filter_by(section_id=section.id).order_by(Enrollment.student_id).all()
+    if request.method == 'POST':
+        try:
+            points = {enrollment.student_id: _number(request.form.get(f'score-{enrollment.student_id}'))
+                      for enrollment in enrollments}
+        except ValueError:
+            flash('Scores must be numbers; leave a box empty if it is not graded yet.')
+            return redirect(url_for('gradebook.enter_scores', assignment_id=assignment.id))
+        record_scores(assignment.id, points)
+        flash('Scores saved.')
+        return redirect(url_for('gradebook.section', section_id=section.id))
+    layout = load_layout(section.id)
+    scores = load_scores(layout, section.id, [enrollment.student_id for enrollment in enrollments])
+    column = layout.columns[assignment.id]
+    current = {enrollment.student_id: value
+               for enrollment, value in zip(enrollments, _cells(scores[:, column]))}
+    return render_template('gradebook_scores.html', title=assignment.name, section=section, assignment=assignment,
+                           enrollments=enrollments, current=current)
@@ -0,0 +1,169 @@
+# app/hashing.py
+
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from functools import partial
+from flask import current_app, has_app_context
+from sqlalchemy import update
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import metrics
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(Exception):
+    """The login hashing pool is saturated; the caller should fail fast."""
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def target_method():
+    if has_app_context():
+        return current_app.config['PASSWORD_HASH_METHOD']
+    return DEFAULT_METHOD
+
+
+def hash_method(password_hash):
+    # e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:260000'
+    return (password_hash or '').split('$', 1)[0]
+
+
+def needs_rehash(password_hash, method=None):
+    return hash_method(password_hash) != (method or target_method())
+
+
+def hash_passwords(passwords, method=None, workers=None, pool=None):
+    """Hash many passwords across a process pool, preserving order.
+
+    Each call to generate_password_hash draws its own salt, so identical
+    passwords (e.g. the default one) still get distinct hashes. Pass a
+    long-lived ``pool`` (of ``workers`` processes) to reuse it instead of starting one per call.
+    """
+    passwords = list(passwords)
+    hasher = partial(generate_password_hash, method=method or target_method())
+    workers = min(workers or default_workers(), len(passwords))
+    if pool is None and workers <= 1:
+        return [hasher(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (max(workers, 1) * 4))
+    if pool is not None:
+        return list(pool.map(hasher, passwords, chunksize=chunksize))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hasher, passwords, chunksize=chunksize))
+
+
+class LatencyStats:
+    """Recent verification latencies per hash algorithm."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self.counts = defaultdict(int)
+
+    def record(self, method, seconds):
+        with self._lock:
+            self._samples[method].append(seconds)
+            self.counts[method] += 1
+
+    def percentiles(self, points=(50, 90, 99)):
+        with self._lock:
+            samples = {method: sorted(values) for method, values in self._samples.items()}
+        report = {}
+        for method, values in samples.items():
+            report[method] = {'count': self.counts[method]}
+            for point in points:
+                index = min(len(values) - 1, int(round(point / 100 * (len(values) - 1))))
+                report[method][f'p{point}_ms'] = round(values[index] * 1000, 2)
+        return report
+
+
+class LoginHasher:
+    """Bounded process pool for login-time password work.
+
+    At most ``queue_depth`` hashes may be running or waiting per worker
+    process; beyond that verify() raises HashingBusy instead of queueing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._writer = None
+        self._slots = None
+        self.stats = LatencyStats()
+
+    def _start(self, config):
+        with self._lock:
+            if self._pool is None:
+                workers = config['LOGIN_HASH_WORKERS'] or default_workers()
+                self._slots = threading.BoundedSemaphore(config['LOGIN_HASH_QUEUE_DEPTH'])
+                self._pool = ProcessPoolExecutor(max_workers=workers)
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        config = current_app.config
+        self._start(config)
+        started = time.perf_counter()
+        future = self._submit(check_password_hash, password_hash, password)
+        try:
+            valid = future.result(timeout=config['LOGIN_HASH_TIMEOUT'])
+        except TimeoutError:
+            raise HashingBusy()
+        elapsed = time.perf_counter() - started
+        self.stats.record(hash_method(password_hash), elapsed)
+        metrics.observe('app_login_hash_seconds', (('algorithm', hash_method(password_hash)),), elapsed)
+        return valid
+
+    def schedule_rehash(self, user_id, old_hash, password):
+        """Re-hash to the target method in the background after a login."""
+        app = current_app._get_current_object()
+        self._start(app.config)
+        try:
+            future = self._submit(generate_password_hash, password, target_method())
+        except HashingBusy:
+            return  # Try again on the user's next login
+        future.add_done_callback(lambda done: self._writer.submit(_store_rehash, app, user_id, old_hash, done))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._writer.shutdown(wait=False)
+                self._pool = None
+
+
+def _store_rehash(app, user_id, old_hash, future):
+    from app import db
+    from app.models import User, invalidate_user
+    if future.exception() is not None:
+        app.logger.warning(f"Re-hash for user {user_id} failed: {future.exception()}")
+        return
+    with app.app_context():
+        # Only replace the hash we verified; a password change wins the race
+        db.session.execute(
+            update(User.__table__)
+            .where(User.id == user_id, User.password_hash == old_hash)
+            .values(password_hash=future.result())
+        )
+        db.session.commit()
+        db.session.remove()
+    invalidate_user(user_id)
+
+
+login_hasher = LoginHasher()
@@ -0,0 +1,176 @@
+# app/homerooms.py
+
+import heapq
+from collections import Counter, defaultdict, namedtuple
+from sqlalchemy import bindparam, select, update
+from app import db
+from app.models import Homeroom, RoleGroup, RoleGroupMembership, StudentProfile, User
+from app.versions import bump
+
+RoomSummary = namedtuple('RoomSummary', ['id', 'name', 'capacity', 'students', 'languages'])
+Placement = namedtuple('Placement', ['grade_id', 'assignments', 'moves', 'rooms', 'unplaced'])
+
+
+class _Rooms:
+    """Running headcount and language mix per homeroom while placing students."""
+
+    def __init__(self, homerooms):
+        self.ids = [room.id for room in homerooms]
+        self.names = [room.name for room in homerooms]
+        self.capacity = [max(room.capacity, 1) for room in homerooms]
+        self.index = {room_id: index for index, room_id in enumerate(self.ids)}
+        self.totals = [0] * len(homerooms)
+        self.languages = [Counter() for _ in homerooms]
+        self.members = [defaultdict(list) for _ in homerooms]
+
+    def fill(self, index):
+        return self.totals[index] / self.capacity[index]
+
+    def key(self, index, language_id):
+        # Emptiest room first; among equally full rooms, fewest of this language
+        return (self.fill(index), self.languages[index][language_id] / self.capacity[index], index)
+
+    def add(self, index, student_id, language_id):
+        self.totals[index] += 1
+        self.languages[index][language_id] += 1
+        self.members[index][language_id].append(student_id)
+
+    def remove(self, index, language_id):
+        self.totals[index] -= 1
+        self.languages[index][language_id] -= 1
+        return self.members[index][language_id].pop()
+
+
+def load_grade(grade_id):
+    homerooms = db.session.execute(
+        select(Homeroom.id, Homeroom.name, Homeroom.capacity)
+        .where(Homeroom.grade_id == grade_id).order_by(Homeroom.id)
+    ).all()
+    students = db.session.execute(
+        select(StudentProfile.user_id, StudentProfile.primary_language_id, StudentProfile.homeroom_id)
+        .where(StudentProfile.grade_id == grade_id).order_by(StudentProfile.user_id)
+    ).all()
+    return homerooms, students
+
+
+def _place(rooms, students, assignments):
+    """Greedily place (student_id, language_id) pairs; returns the ones that didn't fit.
+
+    Language groups go largest first and each student takes the emptiest
+    room from a heap, so every group is spread evenly on top of what earlier
+    groups left behind: O(n log rooms) for the whole grade.
+    """
+    by_language = defaultdict(list)
+    for student_id, language_id in students:
+        by_language[language_id].append(student_id)
+    unplaced = []
+    for language_id, group in sorted(by_language.items(), key=lambda item: (-len(item[1]), str(item[0]))):
+        heap = [rooms.key(index, language_id) for index in range(len(rooms.ids))
+                if rooms.totals[index] < rooms.capacity[index]]
+        heapq.heapify(heap)
+        for position, student_id in enumerate(group):
+            if not heap:
+                unplaced.extend(group[position:])
+                break
+            index = heapq.heappop(heap)[2]
+            rooms.add(index, student_id, language_id)
+            assignments[student_id] = rooms.ids[index]
+            if rooms.totals[index] < rooms.capacity[index]:
+                heapq.heappush(heap, rooms.key(index, language_id))
+    return unplaced
+
+
+def _even_out(rooms, assignments):
+    """Move single students from the fullest to the emptiest room until balanced.
+
+    Each move strictly narrows the gap, so the number of moves is the
+    minimum needed to level the headcounts. The student moved is one whose
+    language is most over-represented in the source room.
+    """
+    while len(rooms.ids) > 1:
+        fullest = max(range(len(rooms.ids)), key=rooms.fill)
+        emptiest = min(range(len(rooms.ids)), key=rooms.fill)
+        after_source = (rooms.totals[fullest] - 1) / rooms.capacity[fullest]
+        after_target = (rooms.totals[emptiest] + 1) / rooms.capacity[emptiest]
+        if rooms.totals[emptiest] >= rooms.capacity[emptiest] or after_target > after_source:
+            return
+        language_id = max(
+            (language_id for language_id, count in rooms.languages[fullest].items() if count),
+            key=lambda language_id: (rooms.languages[fullest][language_id] / rooms.capacity[fullest]
+                                     - rooms.languages[emptiest][language_id] / rooms.capacity[emptiest]),
+        )
+        student_id = rooms.remove(fullest, language_id)
+        rooms.add(emptiest, student_id, language_id)
+        assignments[student_id] = rooms.ids[emptiest]
+
+
+def plan_grade(grade_id, rebalance=True):
+    """Compute (but don't save) a homeroom placement for every student in a grade.
+
+    With ``rebalance`` students already in one of the grade's homerooms stay
+    put unless a room has to give some up to level headcounts; students
+    without a valid homeroom are placed into the emptiest rooms. Without it
+    the whole grade is placed from scratch.
+    """
+    homerooms, students = load_grade(grade_id)
+    rooms = _Rooms(homerooms)
+    assignments = {}
+    waiting = []
+    for student_id, language_id, homeroom_id in students:
+        index = rooms.index.get(homeroom_id) if rebalance else None
+        if index is not None and rooms.totals[index] < rooms.capacity[index]:
+            rooms.add(index, student_id, language_id)
+            assignments[student_id] = homeroom_id
+        else:
+            waiting.append((student_id, language_id))
+    unplaced = _place(rooms, waiting, assignments) if rooms.ids else [student_id for student_id, _ in waiting]
+    if rebalance:
+        _even_out(rooms, assignments)
+
+    current = {student_id: homeroom_id for student_id, _, homeroom_id in students}
+    for student_id in unplaced:
+        assignments[student_id] = None
+    moves = {student_id: (current[student_id], homeroom_id) for student_id, homeroom_id in assignments.items()
+             if current[student_id] != homeroom_id}
+    summary = [RoomSummary(rooms.ids[index], rooms.names[index], rooms.capacity[index], rooms.totals[index],
+                           dict(rooms.languages[index] + Counter()))
+               for index in range(len(rooms.ids))]
+    return Placement(grade_id, assignments, moves, summary, unplaced)
+
+
+def apply_placement(placement):
+    """Save only the students whose homeroom changes, in one bulk update."""
+    if placement.moves:
+        statement = (update(StudentProfile.__table__)
+                     .where(StudentProfile.user_id == bindparam('b_id'))
+                     .values(homeroom_id=bindparam('b_homeroom_id'), version=StudentProfile.version + 1))
+        db.session.execute(statement, [{'b_id': student_id, 'b_homeroom_id': new}
+                                       for student_id, (_, new) in placement.moves.items()])
+        bump('users')
+    db.session.commit()
+    return len(placement.moves)
+
+
+def teacher_choices():
+    """(id, name) of every user in the faculty role group, for homeroom forms."""
+    rows = db.session.execute(
+        select(User.id, User.username, User.first_name, User.last_name)
+        .join(RoleGroupMembership, RoleGroupMembership.role_id == User.role_id)
+        .join(RoleGroup, RoleGroup.id == RoleGroupMembership.group_id)
+        .where(RoleGroup.name == 'faculty')
+        .order_by(User.last_name, User.first_name, User.id)
+    ).all()
+    return [(user_id, f"{last_name}, {first_name}" if last_name and first_name else username)
+            for user_id, username, first_name, last_name in rows]
+
+
+def delete_homeroom(homeroom):
+    """Delete a homeroom; its students are left unplaced for the next placement."""
+    result = db.session.execute(update(StudentProfile.__table__)
+                                .where(StudentProfile.homeroom_id == homeroom.id)
+                                .values(homeroom_id=None, version=StudentProfile.version + 1))
+    if result.rowcount:
+        bump('users')
+    db.session.delete(homeroom)
+    db.session.commit()
+    return result.rowcount
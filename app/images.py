@@ -0,0 +1,193 @@
+# app/images.py
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+log = logging.getLogger('app.images')
+
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+THUMBNAIL_FORMAT = 'webp'
+
+# Magic numbers of the formats we accept; uploads are never decoded to check them
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class ImageError(Exception):
+    pass
+
+
+def sniff(head):
+    for signature, kind in _SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def original_path(root, digest):
+    return os.path.join(root, 'originals', digest[:2], digest)
+
+
+def thumbnail_path(root, digest, size_name):
+    return os.path.join(root, 'thumbs', size_name, digest[:2], f'{digest}.{THUMBNAIL_FORMAT}')
+
+
+def _temporary_file(root):
+    directory = os.path.join(root, 'tmp')
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=directory, delete=False)
+
+
+def _publish(tmp_path, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+def store_original(stream, root, max_bytes):
+    """Copy an upload into the store under its SHA-256 and return the digest.
+
+    The file is streamed to disk while it is hashed, so memory use doesn't
+    depend on its size. Storing the same image twice is a no-op.
+    """
+    hasher = hashlib.sha256()
+    head = b''
+    size = 0
+    with _temporary_file(root) as tmp:
+        while True:
+            chunk = stream.read(1 << 16)
+            if not chunk:
+                break
+            if len(head) < 16:
+                head += chunk[:16 - len(head)]
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            hasher.update(chunk)
+            tmp.write(chunk)
+    try:
+        if size > max_bytes:
+            raise ImageError(f"Images can be at most {max_bytes // (1024 * 1024)} MB.")
+        if sniff(head) is None:
+            raise ImageError("Only PNG, JPEG, GIF and WebP images are supported.")
+        digest = hasher.hexdigest()
+        path = original_path(root, digest)
+        if os.path.exists(path):
+            os.remove(tmp.name)
+        else:
+            _publish(tmp.name, path)
+    except Exception:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+        raise
+    return digest
+
+
+def store_file(path, root, max_bytes):
+    with open(path, 'rb') as f:
+        return store_original(f, root, max_bytes)
+
+
+def render_thumbnails(source, targets, root):
+    """Decode ``source`` once and write each (edge, path) in ``targets``.
+
+    Sizes are produced largest first, each one downscaled from the previous
+    result, and JPEGs are decoded straight at a reduced scale via draft().
+    """
+    largest = max(edge for edge, _ in targets)
+    with Image.open(source) as image:
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for edge, path in sorted(targets, reverse=True):
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            with _temporary_file(root) as tmp:
+                image.save(tmp, THUMBNAIL_FORMAT.upper(), quality=85, method=4)
+            _publish(tmp.name, path)
+
+
+class ThumbnailWorker:
+    """Renders thumbnails on a small thread pool, off the request path.
+
+    Requests for the same image while it is being rendered share one job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}
+        self.root = None
+        self.sizes = {}
+        self.workers = 2
+
+    def configure(self, root, sizes, workers):
+        self.root = root
+        self.sizes = dict(sizes)
+        self.workers = workers
+
+    def missing(self, digest):
+        return [(edge, thumbnail_path(self.root, digest, name)) for name, edge in self.sizes.items()
+                if not os.path.exists(thumbnail_path(self.root, digest, name))]
+
+    def submit(self, digest):
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnails')
+            future = self._executor.submit(self._render, digest)
+            self._pending[digest] = future
+        future.add_done_callback(lambda done: self._finished(digest, done))
+        return future
+
+    def _render(self, digest):
+        targets = self.missing(digest)
+        if targets:
+            render_thumbnails(original_path(self.root, digest), targets, self.root)
+        return len(targets)
+
+    def _finished(self, digest, future):
+        with self._lock:
+            self._pending.pop(digest, None)
+        if future.exception() is not None:
+            log.error("Thumbnails for %s failed: %s", digest, future.exception())
+
+
+thumbnails = ThumbnailWorker()
+
+
+class _SchoolLogo:
+    """Digest of the configured logo file, re-read only when the file changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._digest = None
+
+    def digest(self, path, root, max_bytes):
+        if not path or not os.path.exists(path):
+            return None
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            if key != self._key:
+                self._digest = store_file(path, root, max_bytes)
+                self._key = key
+                if thumbnails.missing(self._digest):
+                    thumbnails.submit(self._digest)
+            return self._digest
+
+
+school_logo = _SchoolLogo()
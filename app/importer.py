@@ -0,0 +1,205 @@
+# app/importer.py
+
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+from itertools import islice
+import sqlalchemy
+from sqlalchemy import func, insert, select, text
+from app import db
+from app.models import User, Role
+from app.usernames import generate_usernames, generate_email
+from app.hashing import hash_passwords
+from app.search import search_index
+from app.sqldump import dump_rows
+from app.versions import bump
+
+# Active students in the legacy school10 database
+LEGACY_STUDENT_QUERY = """
+SELECT
+    id,
+    username,
+    email,
+    password_hash,
+    first_name,
+    last_name
+FROM users
+WHERE role_id = :source_role_id AND is_active = 1 AND id > :last_id
+ORDER BY id
+"""
+
+USER_FIELDS = ('username', 'email', 'password_hash', 'first_name', 'last_name')
+
+class ImportResult(namedtuple('ImportResult', ['read', 'inserted', 'skipped', 'seconds'])):
+    @property
+    def rate(self):
+        return _rate(self.read, self.seconds)
+
+
+class ImportSourceError(Exception):
+    pass
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else float(count)
+
+
+def _load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'position': 0, 'last_id': 0}
+
+
+def _save_checkpoint(path, checkpoint):
+    if not path:
+        return
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _csv_rows(path, position):
+    with open(path, newline='', encoding='utf-8') as f:
+        # Resume by skipping the rows a previous run already committed
+        for row in islice(csv.DictReader(f), position, None):
+            yield row
+
+
+def _sql_rows(url, last_id, source_role_id, chunk_size):
+    engine = sqlalchemy.create_engine(url)
+    try:
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=chunk_size) \
+                .execute(text(LEGACY_STUDENT_QUERY), {'source_role_id': source_role_id, 'last_id': last_id})
+            for row in result.mappings():
+                yield dict(row)
+    finally:
+        engine.dispose()
+
+
+def _dump_rows(path, last_id, source_role_id, chunk_size, table):
+    # Same filter as LEGACY_STUDENT_QUERY, applied while streaming the dump
+    for row in dump_rows(path, table, chunk_size):
+        if row.get('role_id') == source_role_id and row.get('is_active', 1) == 1 and (row.get('id') or 0) > last_id:
+            yield row
+
+
+def source_rows(source, checkpoint, source_role_id=19, chunk_size=1000, source_table='users'):
+    """Yield source rows as dicts, starting after ``checkpoint``.
+
+    ``source`` is a SQLAlchemy URL (the school10 server or a SQLite file), a
+    path to a ``.sqlite``/``.db`` file, a ``.csv`` export, or a ``.sql``
+    (or ``.sql.gz``) dump of the legacy database, read from ``source_table``.
+    """
+    if '://' in source:
+        return _sql_rows(source, checkpoint['last_id'], source_role_id, chunk_size)
+    if not os.path.exists(source):
+        raise ImportSourceError(f"Source {source} does not exist.")
+    if source.lower().endswith(('.sql', '.sql.gz')):
+        return _dump_rows(source, checkpoint['last_id'], source_role_id, chunk_size, source_table)
+    extension = os.path.splitext(source)[1].lower()
+    if extension == '.csv':
+        return _csv_rows(source, checkpoint['position'])
+    if extension in ('.sqlite', '.sqlite3', '.db'):
+        url = 'sqlite:///' + os.path.abspath(source)
+        return _sql_rows(url, checkpoint['last_id'], source_role_id, chunk_size)
+    raise ImportSourceError(f"Don't know how to read {source}.")
+
+
+def chunked(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def resolve_role_id(role_name):
+    role_id = db.session.execute(
+        select(Role.id).where(func.lower(Role.name) == role_name.lower())
+    ).scalar()
+    if role_id is None:
+        raise ImportSourceError(f"Role {role_name} does not exist.")
+    return role_id
+
+
+def existing_identities():
+    usernames = set()
+    emails = set()
+    for username, email in db.session.execute(select(User.username, User.email)):
+        if username:
+            usernames.add(username.lower())
+        if email:
+            emails.add(email.lower())
+    return usernames, emails
+
+
+def import_students(source, role_name='student', source_role_id=19, chunk_size=1000,
+                    checkpoint_path=None, default_password=None, echo=None, progress=None, hash_pool=None,
+                    source_table='users'):
+    """Bulk import students, one committed batch per chunk.
+
+    Rows without a username get one from a single block reserved per chunk
+    (and a generated email if they have none), and rows without a password
+    hash get ``default_password``, hashed in parallel across all cores. Rows
+    whose username or email already exists (case-insensitively) are skipped,
+    so re-running after a failure never duplicates accounts; with a
+    checkpoint file the rerun also starts where the last commit left off.
+    ``progress(read, inserted, skipped)`` is called after every commit.
+    """
+    started = time.perf_counter()
+    checkpoint = _load_checkpoint(checkpoint_path)
+    role_id = resolve_role_id(role_name)
+    usernames, emails = existing_identities()
+    user_insert = insert(User.__table__)
+    read = inserted = skipped = 0
+
+    try:
+        for chunk in chunked(source_rows(source, checkpoint, source_role_id, chunk_size, source_table), chunk_size):
+            batch = []
+            missing = sum(1 for row in chunk if not (row.get('username') or '').strip())
+            new_usernames = iter(generate_usernames(missing)) if missing else None
+            for row in chunk:
+                username = (row.get('username') or '').strip() or next(new_usernames)
+                email = (row.get('email') or '').strip() or generate_email(username)
+                if username.lower() in usernames or email.lower() in emails:
+                    skipped += 1
+                    continue
+                usernames.add(username.lower())
+                emails.add(email.lower())
+                values = {field: row.get(field) or None for field in USER_FIELDS}
+                values['username'] = username
+                values['email'] = email
+                values['role_id'] = role_id
+                batch.append(values)
+            if default_password:
+                needs_password = [values for values in batch if not values['password_hash']]
+                hashes = hash_passwords([default_password] * len(needs_password), pool=hash_pool)
+                for values, password_hash in zip(needs_password, hashes):
+                    values['password_hash'] = password_hash
+            if batch:
+                db.session.execute(user_insert, batch)
+                bump('users')
+            db.session.commit()
+
+            read += len(chunk)
+            inserted += len(batch)
+            checkpoint['position'] += len(chunk)
+            if chunk[-1].get('id') is not None:
+                checkpoint['last_id'] = int(chunk[-1]['id'])
+            _save_checkpoint(checkpoint_path, checkpoint)
+            if progress:
+                progress(read, inserted, skipped)
+            if echo:
+                elapsed = time.perf_counter() - started
+                echo(f"{read} rows read, {inserted} inserted, {skipped} skipped "
+                     f"({_rate(read, elapsed):.0f} rows/s)")
+    finally:
+        if inserted:
+            search_index.invalidate()  # Core inserts bypass the ORM events that update it
+    return ImportResult(read, inserted, skipped, time.perf_counter() - started)
@@ -0,0 +1,105 @@
+# app/instrumentation.py
+
+import json
+import logging
+import time
+from collections import namedtuple
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.sql')
+
+Statement = namedtuple('Statement', ['sql', 'parameters', 'seconds'])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if has_request_context():
+        queries = g.setdefault('sql_queries', [])
+        queries.append(Statement(statement, parameters, time.perf_counter() - started))
+
+
+_listening = False
+
+
+def _listen():
+    # Listen on the Engine class so the replica bind is covered too
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+
+
+def _parameters_key(parameters):
+    try:
+        return repr(parameters)
+    except Exception:
+        return id(parameters)
+
+
+def summarize(queries, nplusone_threshold=3, slowest=3):
+    """Count, total time, slowest statements and likely N+1 patterns."""
+    by_sql = {}
+    for query in queries:
+        by_sql.setdefault(query.sql, []).append(query)
+    nplusone = []
+    for sql, runs in by_sql.items():
+        if len(runs) >= nplusone_threshold:
+            distinct = len({_parameters_key(run.parameters) for run in runs})
+            if distinct > 1:
+                nplusone.append({
+                    'sql': sql,
+                    'count': len(runs),
+                    'distinct_parameters': distinct,
+                    'ms': round(sum(run.seconds for run in runs) * 1000, 3),
+                })
+    nplusone.sort(key=lambda item: item['count'], reverse=True)
+    ordered = sorted(queries, key=lambda query: query.seconds, reverse=True)[:slowest]
+    return {
+        'count': len(queries),
+        'ms': round(sum(query.seconds for query in queries) * 1000, 3),
+        'slowest': [{'sql': query.sql, 'ms': round(query.seconds * 1000, 3)} for query in ordered],
+        'nplusone': nplusone,
+    }
+
+
+def request_summary(app):
+    summary = summarize(g.get('sql_queries', []), app.config['SQL_NPLUSONE_THRESHOLD'],
+                        app.config['SQL_SLOWEST_STATEMENTS'])
+    summary['endpoint'] = request.endpoint
+    return summary
+
+
+def init_app(app):
+    _listen()
+
+    @app.after_request
+    def report_queries(response):
+        if not g.get('sql_queries'):
+            return response
+        summary = request_summary(app)
+        if app.debug or app.config['SQL_SUMMARY_HEADER']:
+            response.headers['X-SQL-Queries'] = f"{summary['count']}; time={summary['ms']}ms; n+1={len(summary['nplusone'])}"
+        if summary['nplusone']:
+            logger.warning(json.dumps({'event': 'sql.nplusone', 'endpoint': summary['endpoint'],
+                                       'path': request.path, 'patterns': summary['nplusone']}))
+        if app.config['SQL_LOG_REQUESTS']:
+            logger.info(json.dumps({'event': 'sql.request', 'endpoint': summary['endpoint'],
+                                    'path': request.path, 'status': response.status_code,
+                                    'count': summary['count'], 'ms': summary['ms'],
+                                    'slowest': summary['slowest'], 'nplusone': len(summary['nplusone'])}))
+        return response
+
+    @app.context_processor
+    def sql_debug_panel():
+        # Called at the end of base.html, so it covers queries run while rendering
+        return {
+            'sql_debug_enabled': app.config['SQL_DEBUG_PANEL'],
+            'sql_summary': lambda: request_summary(app),
+        }
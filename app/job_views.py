@@ -0,0 +1,83 @@
+# app/job_views.py
+
+import os
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, send_file, url_for
+from flask_login import current_user, login_required
+from app.decorators import role_required
+from app.export import EXPORT_FORMATS
+from app.forms import ImportForm
+from app.jobs import ACTIVE, cancel, job_info, output_dir, save_upload, submit
+from app.models import Job
+from app.pagination import keyset_paginate
+
+bp = Blueprint('jobs', __name__)
+
+
+def _download_url(info):
+    if info['status'] == 'succeeded' and (info['result'] or {}).get('file'):
+        return url_for('jobs.download', job_id=info['id'])
+    return None
+
+
+# Background jobs, newest first, and the student import upload (admin only)
+@bp.route('/', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def list_jobs():
+    form = ImportForm()
+    if form.validate_on_submit():
+        source = save_upload(form.file.data, os.path.splitext(form.file.data.filename)[1].lower())
+        job_id = submit('import', {'source': source, 'role_name': form.role.data.strip()}, user_id=current_user.id)
+        flash(f'Import queued as job {job_id}.')
+        return redirect(url_for('jobs.list_jobs'))
+    page = keyset_paginate(Job.query, [Job.id], lambda job: (job.id,), after=request.args.get('after'),
+                           before=request.args.get('before'), per_page=current_app.config['USERS_PER_PAGE'],
+                           descending=True)
+    jobs = [job_info(job) for job in page.items]
+    for info in jobs:
+        info['download'] = _download_url(info)
+    return render_template('jobs.html', title='Jobs', jobs=jobs, page=page, form=form, active=ACTIVE)
+
+# Status of one job, polled by the jobs page while it runs
+@bp.route('/<int:job_id>')
+@login_required
+@role_required('admin')
+def job_status(job_id):
+    info = job_info(Job.query.get_or_404(job_id))
+    info['download'] = _download_url(info)
+    response = jsonify(info)
+    response.cache_control.no_store = True
+    return response
+
+@bp.route('/<int:job_id>/cancel', methods=['POST'])
+@login_required
+@role_required('admin')
+def cancel_job(job_id):
+    Job.query.get_or_404(job_id)
+    flash(f'Cancel requested for job {job_id}.' if cancel(job_id) else f'Job {job_id} has already finished.')
+    return redirect(url_for('jobs.list_jobs'))
+
+# File written by a finished export job
+@bp.route('/<int:job_id>/download')
+@login_required
+@role_required('admin')
+def download(job_id):
+    info = job_info(Job.query.get_or_404(job_id))
+    if _download_url(info) is None:
+        abort(404)
+    filename = os.path.basename(info['result']['file'])
+    return send_file(os.path.join(output_dir(job_id), filename), as_attachment=True, download_name=filename)
+
+# Export users to a file in the background instead of streaming it
+@bp.route('/export', methods=['POST'])
+@login_required
+@role_required('admin')
+def export_users():
+    fmt = request.form.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    params = {'fmt': fmt, 'compress': request.form.get('gzip', type=int) == 1,
+              'role_id': request.form.get('role', type=int), 'group_id': request.form.get('group', type=int)}
+    job_id = submit('export', params, user_id=current_user.id)
+    flash(f'Export queued as job {job_id}.')
+    return redirect(url_for('jobs.list_jobs'))
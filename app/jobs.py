@@ -0,0 +1,433 @@
+# app/jobs.py
+
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import bindparam, delete, select, update
+from app import db
+from app.models import Job, User, invalidate_user
+from app.export import export_roster
+from app.hashing import hash_passwords
+from app.homerooms import apply_placement, plan_grade
+from app.importer import import_students
+from app.queries import count_users
+from app.settings import settings
+from app.sync import SYNC_TABLES, sync_table
+from app.versions import bump
+
+log = logging.getLogger(__name__)
+
+JobType = namedtuple('JobType', ['name', 'label', 'handler', 'limit'])
+
+# Filled in by @job_type
+JOB_TYPES = {}
+
+ACTIVE = ('queued', 'running')
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+jobs_table = Job.__table__
+
+
+class JobError(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    """Raised from JobContext.progress() once a cancel has been requested."""
+
+
+def job_type(name, label, limit=1):
+    """Register ``handler(job, **params)``; ``limit`` is its default concurrency per process."""
+    def decorator(handler):
+        JOB_TYPES[name] = JobType(name, label, handler, limit)
+        return handler
+    return decorator
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def output_dir(job_id):
+    return os.path.join(current_app.config['JOB_OUTPUT_DIR'], str(job_id))
+
+
+def upload_dir():
+    return os.path.join(current_app.config['JOB_OUTPUT_DIR'], 'uploads')
+
+
+def save_upload(file, extension):
+    """Keep an uploaded source file for a job to read; returns its path."""
+    os.makedirs(upload_dir(), exist_ok=True)
+    path = os.path.join(upload_dir(), f"{uuid.uuid4().hex}{extension}")
+    file.save(path)
+    return path
+
+
+class JobContext:
+    """What a running handler sees: its id, progress reporting and the process pool."""
+
+    def __init__(self, job_id, runner):
+        self.id = job_id
+        self.runner = runner
+        self.done = 0
+        self.total = None
+        self.message = None
+        self.interval = current_app.config['JOB_PROGRESS_INTERVAL']
+        self._reported_at = time.monotonic()
+
+    @property
+    def pool(self):
+        return self.runner.process_pool()
+
+    @property
+    def processes(self):
+        return self.runner.processes
+
+    def output_path(self, filename):
+        path = output_dir(self.id)
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, filename)
+
+    def progress(self, done, total=None, message=None, force=False):
+        """Record progress; written (and a cancel checked for) at most once per interval.
+
+        Call it between units of committed work: it raises JobCancelled
+        when an admin has asked for the job to stop.
+        """
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message[:255]
+        now = time.monotonic()
+        if not force and now - self._reported_at < self.interval:
+            return
+        self._reported_at = now
+        # Own connection, so reporting never commits the handler's unfinished work
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(jobs_table).where(jobs_table.c.id == self.id)
+                .values(done=self.done, total=self.total, message=self.message,
+                        heartbeat_at=db.func.current_timestamp()))
+            cancel = connection.execute(
+                select(jobs_table.c.cancel_requested).where(jobs_table.c.id == self.id)).scalar()
+        if cancel:
+            raise JobCancelled()
+
+
+def _claim(job_id):
+    """Move a queued job to running for this process; returns (type, params), or None if it can't."""
+    now = db.func.current_timestamp()
+    with db.engine.begin() as connection:
+        claimed = connection.execute(
+            update(jobs_table).where(jobs_table.c.id == job_id, jobs_table.c.status == 'queued')
+            .values(status='running', worker=worker_name(), started_at=now, heartbeat_at=now)).rowcount
+        if not claimed:
+            return None
+        name, params = connection.execute(
+            select(jobs_table.c.type, jobs_table.c.params).where(jobs_table.c.id == job_id)).one()
+    return name, json.loads(params or '{}')
+
+
+def _finish(job, status, result=None, error=None):
+    now = db.func.current_timestamp()
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(jobs_table).where(jobs_table.c.id == job.id)
+            .values(status=status, done=job.done, total=job.total, message=job.message,
+                    result=None if result is None else json.dumps(result, default=str), error=error,
+                    heartbeat_at=now, finished_at=now))
+
+
+def execute(job_id, runner):
+    """Claim and run one job in the current app context."""
+    claimed = _claim(job_id)
+    if claimed is None:
+        return None  # Cancelled while waiting, or claimed by another process
+    name, params = claimed
+    job = JobContext(job_id, runner)
+    try:
+        result = JOB_TYPES[name].handler(job, **params)
+    except JobCancelled:
+        db.session.rollback()
+        _finish(job, 'cancelled')
+        return 'cancelled'
+    except Exception as e:
+        db.session.rollback()
+        log.exception("Job %s (%s) failed", job_id, name)
+        _finish(job, 'failed', error=str(e) or type(e).__name__)
+        return 'failed'
+    _finish(job, 'succeeded', result=result)
+    return 'succeeded'
+
+
+class JobRunner:
+    """Runs jobs on a thread pool, with CPU-heavy steps sent to a process pool.
+
+    Each job type has its own concurrency limit. Jobs over the limit wait
+    in memory (their rows are already 'queued') and start as soon as one
+    of the same type finishes, so a burst of exports can't take every
+    thread. A job only runs once this process has claimed its row, so web
+    workers and ``flask jobs run`` never run the same job twice.
+    """
+
+    def __init__(self):
+        # Reentrant: a future that is already done runs its callback at once
+        self._lock = threading.RLock()
+        self._threads = None
+        self._processes = None
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._futures = {}
+        self.workers = 2
+        self.processes = 1
+        self.limits = {}
+
+    def configure(self, workers, processes, limits):
+        self.workers = workers
+        self.processes = processes
+        self.limits = dict(limits)
+
+    def limit(self, name):
+        return self.limits.get(name, JOB_TYPES[name].limit)
+
+    def process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.processes)
+            return self._processes
+
+    def tracks(self, job_id):
+        with self._lock:
+            return job_id in self._futures or any(job_id == waiting[1] for queue in self._waiting.values()
+                                                  for waiting in queue)
+
+    def dispatch(self, job_id, name, app=None):
+        app = app or current_app._get_current_object()
+        with self._lock:
+            if self._running[name] >= self.limit(name):
+                self._waiting[name].append((app, job_id))
+            else:
+                self._start(app, job_id, name)
+
+    def _start(self, app, job_id, name):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='jobs')
+        self._running[name] += 1
+        future = self._threads.submit(self._run, app, job_id)
+        self._futures[job_id] = future
+        future.add_done_callback(lambda done: self._finished(job_id, name, done))
+
+    def _run(self, app, job_id):
+        with app.app_context():
+            try:
+                return execute(job_id, self)
+            finally:
+                db.session.remove()
+
+    def _finished(self, job_id, name, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._running[name] -= 1
+            if self._waiting[name]:
+                app, next_id = self._waiting[name].popleft()
+                self._start(app, next_id, name)
+        if future.exception() is not None:
+            log.error("Job %s could not be run: %s", job_id, future.exception())
+
+    def running_ids(self):
+        with self._lock:
+            return list(self._futures)
+
+    def busy(self):
+        with self._lock:
+            return bool(self._futures) or any(self._waiting.values())
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            threads, processes = self._threads, self._processes
+            self._threads = self._processes = None
+        if threads is not None:
+            threads.shutdown(wait=wait)
+        if processes is not None:
+            processes.shutdown(wait=wait)
+
+
+runner = JobRunner()
+
+
+def submit(name, params=None, user_id=None, start=None):
+    """Queue a job and return its id.
+
+    Unless ``start`` is False (or JOBS_RUN_IN_WEB is off) this process
+    runs it too; otherwise it waits for ``flask jobs run``.
+    """
+    if name not in JOB_TYPES:
+        raise JobError(f"Unknown job type {name}.")
+    job = Job(type=name, status='queued', params=json.dumps(params or {}), created_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    if start is None:
+        start = current_app.config['JOBS_RUN_IN_WEB']
+    if start:
+        runner.dispatch(job.id, name)
+    return job.id
+
+
+def cancel(job_id):
+    """Cancel a queued job at once, or ask a running one to stop at its next progress report."""
+    now = db.func.current_timestamp()
+    cancelled = db.session.execute(
+        update(jobs_table).where(jobs_table.c.id == job_id, jobs_table.c.status == 'queued')
+        .values(status='cancelled', finished_at=now)).rowcount
+    if not cancelled:
+        cancelled = db.session.execute(
+            update(jobs_table).where(jobs_table.c.id == job_id, jobs_table.c.status == 'running')
+            .values(cancel_requested=True)).rowcount
+    db.session.commit()
+    return bool(cancelled)
+
+
+def dispatch_queued(app=None):
+    """Hand every queued job not already known here to the runner; returns how many."""
+    queued = db.session.execute(
+        select(Job.id, Job.type).where(Job.status == 'queued').order_by(Job.id)).all()
+    db.session.commit()
+    started = 0
+    for job_id, name in queued:
+        if name in JOB_TYPES and not runner.tracks(job_id):
+            runner.dispatch(job_id, name, app)
+            started += 1
+    return started
+
+
+def recover_stale(max_age):
+    """Fail running jobs whose worker stopped reporting, e.g. after a restart."""
+    now = db.session.execute(select(db.func.current_timestamp())).scalar()
+    local = runner.running_ids()
+    query = (update(jobs_table)
+             .where(jobs_table.c.status == 'running', jobs_table.c.heartbeat_at < now - timedelta(seconds=max_age))
+             .values(status='failed', error='The worker running this job stopped.', finished_at=now))
+    if local:
+        query = query.where(jobs_table.c.id.not_in(local))
+    recovered = db.session.execute(query).rowcount
+    db.session.commit()
+    return recovered
+
+
+def prune(days):
+    """Delete finished jobs older than ``days`` with their output and uploaded files."""
+    now = db.session.execute(select(db.func.current_timestamp())).scalar()
+    old = db.session.execute(
+        select(Job.id, Job.params).where(Job.status.in_(FINISHED), Job.finished_at < now - timedelta(days=days))
+    ).all()
+    for job_id, params in old:
+        shutil.rmtree(output_dir(job_id), ignore_errors=True)
+        source = json.loads(params or '{}').get('source')
+        if isinstance(source, str) and os.path.dirname(os.path.abspath(source)) == os.path.abspath(upload_dir()):
+            try:
+                os.remove(source)
+            except FileNotFoundError:
+                pass
+    if old:
+        db.session.execute(delete(jobs_table).where(jobs_table.c.id.in_([job_id for job_id, _ in old])))
+    db.session.commit()
+    return len(old)
+
+
+def job_info(job):
+    """JSON-ready status of a Job row, as served to polling admin pages."""
+    return {
+        'id': job.id,
+        'type': job.type,
+        'label': JOB_TYPES[job.type].label if job.type in JOB_TYPES else job.type,
+        'status': job.status,
+        'done': job.done,
+        'total': job.total,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'cancel_requested': job.cancel_requested,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@job_type('import', 'Import students', limit=1)
+def run_import(job, source, role_name='student', source_role_id=19, chunk_size=1000, source_table='users'):
+    def progress(read, inserted, skipped):
+        job.progress(read, message=f"{inserted} inserted, {skipped} skipped")
+
+    result = import_students(source, role_name, source_role_id, chunk_size,
+                             default_password=settings.get('default_password'),
+                             progress=progress, hash_pool=job.pool, source_table=source_table)
+    return {'read': result.read, 'inserted': result.inserted, 'skipped': result.skipped,
+            'seconds': round(result.seconds, 1)}
+
+
+@job_type('export', 'Export users', limit=2)
+def run_export(job, fmt='csv', compress=False, role_id=None, group_id=None, chunk_size=1000):
+    total = count_users(role_id, group_id)
+    filename = f"users.{fmt}.gz" if compress else f"users.{fmt}"
+    rows = 0
+
+    def progress(count):
+        nonlocal rows
+        rows = count
+        job.progress(count, total)
+
+    with open(job.output_path(filename), 'wb') as f:
+        for chunk in export_roster(fmt, compress, role_id, group_id, chunk_size, progress):
+            f.write(chunk)
+    return {'file': filename, 'rows': rows}
+
+
+@job_type('reset_passwords', 'Reset passwords', limit=1)
+def run_reset_passwords(job, user_ids, chunk_size=200):
+    password = settings.get('default_password')
+    statement = update(User.__table__).where(User.id == bindparam('b_id')).values(password_hash=bindparam('b_hash'))
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        hashes = hash_passwords([password] * len(chunk), workers=job.processes, pool=job.pool)
+        db.session.execute(statement, [{'b_id': user_id, 'b_hash': password_hash}
+                                       for user_id, password_hash in zip(chunk, hashes)])
+        bump('users')
+        db.session.commit()
+        for user_id in chunk:
+            invalidate_user(user_id)
+        job.progress(start + len(chunk), len(user_ids))
+    return {'reset': len(user_ids)}
+
+
+@job_type('rebalance_homerooms', 'Rebalance homerooms', limit=1)
+def run_rebalance_homerooms(job, grade_id, rebalance=True):
+    placement = plan_grade(grade_id, rebalance=rebalance)
+    job.progress(0, len(placement.moves), force=True)
+    moved = apply_placement(placement)
+    job.progress(moved, len(placement.moves))
+    return {'moved': moved, 'unplaced': len(placement.unplaced)}
+
+
+@job_type('sync', 'Sync from school10', limit=1)
+def run_sync(job, source=None, tables=None, full=False, batch_size=1000):
+    source = source or current_app.config['LEGACY_DATABASE_URI']
+    result = {}
+    for name in tables or list(SYNC_TABLES):
+        def progress(read, inserted, updated):
+            job.progress(read, message=f"{name}: {inserted} inserted, {updated} updated")
+
+        synced = sync_table(name, source, full, batch_size, progress=progress, hash_pool=job.pool)
+        result[name] = {'read': synced.read, 'inserted': synced.inserted, 'updated': synced.updated,
+                        'conflicts': synced.conflicts}
+    return result
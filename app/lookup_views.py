@@ -2,16 +2,23 @@
 
 from flask import Blueprint, render_template, flash, redirect, url_for, request
 from app import db
-from app.models import Role, RoleGroup, RoleGroupMembership
+from app.models import Role, RoleGroup, invalidate_all_users
 from flask_login import login_required
+from app.permissions import bump_permissions_version
+from app.decorators import read_only
+from app.memberships import set_role_groups
+from app.fragments import conditional
 
 bp = Blueprint('lookup', __name__)
 
 # List roles
 @bp.route('/roles')
 @login_required
+@read_only
+@conditional('roles')
 def list_roles():
-    roles = Role.query.all()
+    # Lazy query: only runs when the cached rows fragment has to be re-rendered
+    roles = Role.query.order_by(Role.id)
     return render_template('list_roles.html', roles=roles)
 
 # Add role
@@ -26,6 +33,7 @@ def add_role():
         role = Role(name=role_name)
         db.session.add(role)
         db.session.commit()
+        bump_permissions_version()
         flash('Role added successfully.')
         return redirect(url_for('lookup.list_roles'))
     return render_template('add_role.html')
@@ -38,6 +46,8 @@ def edit_role(role_id):
     if request.method == 'POST':
         role.name = request.form['name']
         db.session.commit()
+        bump_permissions_version()
+        invalidate_all_users()
         flash('Role updated successfully.')
         return redirect(url_for('lookup.list_roles'))
     return render_template('edit_role.html', role=role)
@@ -49,6 +59,8 @@ def delete_role(role_id):
     role = Role.query.get_or_404(role_id)
     db.session.delete(role)
     db.session.commit()
+    bump_permissions_version()
+    invalidate_all_users()
     flash('Role deleted successfully.')
     return redirect(url_for('lookup.list_roles'))
 
@@ -57,16 +69,13 @@ def delete_role(role_id):
 @login_required
 def manage_role_groups(role_id):
     role = Role.query.get_or_404(role_id)
-    groups = RoleGroup.query.all()
     if request.method == 'POST':
-        selected_groups = request.form.getlist('groups')
-        # Clear existing group memberships
-        RoleGroupMembership.query.filter_by(role_id=role.id).delete()
-        # Add new group memberships
-        for group_id in selected_groups:
-            membership = RoleGroupMembership(role_id=role.id, group_id=group_id)
-            db.session.add(membership)
-        db.session.commit()
-        flash('Role group associations updated successfully.')
+        selected_groups = request.form.getlist('groups', type=int)
+        inserted, deleted = set_role_groups(role.id, selected_groups)
+        if inserted or deleted:
+            flash('Role group associations updated successfully.')
+        else:
+            flash('Role group associations are unchanged.')
         return redirect(url_for('lookup.list_roles'))
+    groups = RoleGroup.query.all()
     return render_template('manage_role_groups.html', role=role, groups=groups)
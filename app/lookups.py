@@ -0,0 +1,95 @@
+# app/lookups.py
+
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Grade, Language, State, Role, RoleGroup
+
+LookupRow = namedtuple('LookupRow', ['id', 'name'])
+
+# Reference tables that are read on almost every form and rarely written
+LOOKUP_MODELS = {
+    'grades': Grade,
+    'languages': Language,
+    'states': State,
+    'roles': Role,
+    'role_groups': RoleGroup,
+}
+
+
+class LookupTable(namedtuple('LookupTable', ['rows', 'names', 'loaded_at'])):
+    """Immutable snapshot: ``rows`` is a tuple of (id, name) sorted by name."""
+
+
+class _LookupCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        table = self._tables.get(name)
+        if table is not None and time.monotonic() - table.loaded_at < self.ttl:
+            self.hits += 1
+            return table
+        self.misses += 1
+        return self._load(name)
+
+    def _load(self, name):
+        model = LOOKUP_MODELS[name]
+        rows = tuple(LookupRow(id, label) for id, label in
+                     db.session.execute(select(model.id, model.name).order_by(model.name)))
+        table = LookupTable(rows, {row.id: row.name for row in rows}, time.monotonic())
+        with self._lock:
+            self._tables[name] = table
+        return table
+
+    def invalidate(self, *names):
+        with self._lock:
+            for name in names or list(self._tables):
+                self._tables.pop(name, None)
+
+
+lookup_cache = _LookupCache()
+
+
+def choices(name):
+    return lookup_cache.get(name).rows
+
+
+def lookup_name(name, id, default=None):
+    if id is None:
+        return default
+    return lookup_cache.get(name).names.get(id, default)
+
+
+# Writes to a lookup table through the ORM invalidate it once committed
+_TABLE_NAMES = {model: name for name, model in LOOKUP_MODELS.items()}
+
+
+def _mark_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('dirty_lookups', set()).add(_TABLE_NAMES[type(target)])
+
+
+for _model in LOOKUP_MODELS.values():
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_dirty)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_dirty_lookups(session):
+    dirty = session.info.pop('dirty_lookups', None)
+    if dirty:
+        lookup_cache.invalidate(*dirty)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_dirty_lookups(session):
+    session.info.pop('dirty_lookups', None)
@@ -0,0 +1,39 @@
+# app/media_views.py
+
+import os
+from flask import Blueprint, Response, abort, current_app, send_file
+from app.images import DIGEST, original_path, thumbnail_path, thumbnails
+
+bp = Blueprint('media', __name__)
+
+# Content-addressed files never change, so clients may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+PLACEHOLDER = ('<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{0}" viewBox="0 0 1 1">'
+               '<rect width="1" height="1" fill="#e9ecef"/></svg>')
+
+# Thumbnail of a stored image. The digest is the SHA-256 of the original,
+# so URLs can't be guessed without the image itself.
+@bp.route('/<digest>/<size>.webp')
+def thumbnail(digest, size):
+    sizes = current_app.config['THUMBNAIL_SIZES']
+    if size not in sizes or not DIGEST.match(digest):
+        abort(404)
+    root = current_app.config['MEDIA_ROOT']
+    path = thumbnail_path(root, digest, size)
+    if os.path.exists(path):
+        # conditional=True answers If-None-Match with 304 and lets the server
+        # stream the file with sendfile instead of reading it into memory
+        response = send_file(path, mimetype='image/webp', conditional=True, etag=f'{digest}-{size}',
+                             max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    if not os.path.exists(original_path(root, digest)):
+        abort(404)
+    # Not rendered yet: queue it and send a placeholder the browser won't keep
+    thumbnails.submit(digest)
+    response = Response(PLACEHOLDER.format(sizes[size]), mimetype='image/svg+xml')
+    response.cache_control.no_store = True
+    response.headers['Retry-After'] = '1'
+    return response
@@ -0,0 +1,66 @@
+# app/memberships.py
+
+from sqlalchemy import delete, insert, select, tuple_
+from app import db
+from app.models import RoleGroupMembership, invalidate_all_users
+from app.permissions import bump_permissions_version
+from app.versions import bump
+
+membership_table = RoleGroupMembership.__table__
+
+
+def stored_memberships(role_ids=None):
+    """{role_id: set(group_ids)} as stored, for ``role_ids`` or every role."""
+    query = select(membership_table.c.role_id, membership_table.c.group_id)
+    if role_ids is not None:
+        query = query.where(membership_table.c.role_id.in_(list(role_ids)))
+    memberships = {role_id: set() for role_id in role_ids or ()}
+    for role_id, group_id in db.session.execute(query):
+        memberships.setdefault(role_id, set()).add(group_id)
+    return memberships
+
+
+def membership_changes(stored, desired, replace=True):
+    """(pairs to insert, pairs to delete) turning ``stored`` into ``desired``.
+
+    With ``replace=False`` groups are only added, never removed.
+    """
+    to_insert = []
+    to_delete = []
+    for role_id, group_ids in desired.items():
+        current = stored.get(role_id, set())
+        wanted = {int(group_id) for group_id in group_ids}
+        to_insert.extend((role_id, group_id) for group_id in sorted(wanted - current))
+        if replace:
+            to_delete.extend((role_id, group_id) for group_id in sorted(current - wanted))
+    return to_insert, to_delete
+
+
+def set_memberships(desired, replace=True):
+    """Bring the groups of every role in ``desired`` ({role_id: group ids}) in line.
+
+    Only the difference against what is stored is written, as one bulk insert
+    and one bulk delete, and the permission and user caches are only dropped
+    when something actually changed. Commits; returns (inserted, deleted).
+    """
+    stored = stored_memberships(desired.keys())
+    to_insert, to_delete = membership_changes(stored, desired, replace)
+    if to_insert:
+        db.session.execute(insert(membership_table),
+                           [{'role_id': role_id, 'group_id': group_id} for role_id, group_id in to_insert])
+    if to_delete:
+        db.session.execute(delete(membership_table).where(
+            tuple_(membership_table.c.role_id, membership_table.c.group_id).in_(to_delete)))
+    if to_insert or to_delete:
+        bump('roles')
+    db.session.commit()
+    if to_insert or to_delete:
+        # Loaded Role.groups collections would otherwise keep the old groups
+        db.session.expire_all()
+        bump_permissions_version()
+        invalidate_all_users()
+    return len(to_insert), len(to_delete)
+
+
+def set_role_groups(role_id, group_ids):
+    return set_memberships({role_id: group_ids})
@@ -0,0 +1,274 @@
+# app/metrics.py
+
+import bisect
+import glob
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from flask import Response, abort, current_app, g, has_app_context, request
+from flask_login import current_user
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'app_http_requests_total': ('counter', 'Requests by endpoint, method and status.'),
+    'app_http_request_duration_seconds': ('histogram', 'Request latency by endpoint, method and status.'),
+    'app_login_hash_seconds': ('histogram', 'Password verification time by hash algorithm.'),
+    'app_db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'app_db_pool_checkout_timeouts_total': ('counter', 'Checkouts that timed out waiting for a connection.'),
+    'app_db_pool_checkout_wait_seconds_total': ('counter', 'Total time spent waiting for connections.'),
+    'app_db_pool_checked_out': ('gauge', 'Connections currently checked out, per worker.'),
+    'app_db_pool_size': ('gauge', 'Configured pool size, per worker.'),
+    'app_db_pool_overflow': ('gauge', 'Overflow connections in use, per worker.'),
+    'app_cache_hits_total': ('counter', 'Cache hits by cache.'),
+    'app_cache_misses_total': ('counter', 'Cache misses by cache.'),
+    'app_cache_hit_ratio': ('gauge', 'Hits / (hits + misses) by cache, across all workers.'),
+}
+
+
+class Registry:
+    """Counters and histograms for one worker process.
+
+    Recording only touches in-memory dicts under a lock; the values are
+    written to ``METRICS_DIR/<pid>-<start>.json`` at most once per flush
+    interval so /metrics in any worker can add up every worker's numbers.
+    The start time keeps a worker that reuses a dead worker's pid from
+    overwriting its counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started()
+
+    def _started(self):
+        # Also run in forked children, which start from empty counters
+        self.counters = {}
+        self.histograms = {}
+        self._last_flush = 0.0
+        self.file_name = f'{os.getpid()}-{time.time_ns()}.json'
+
+    def inc(self, name, labels, amount=1.0):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, list(buckets)]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [[name, list(labels), list(h[0]), h[1], h[2]] for (name, labels), h in self.histograms.items()]
+        return {'counters': counters, 'histograms': histograms}
+
+    def flush(self, directory, interval, force=False):
+        now = time.monotonic()
+        if not directory or (not force and now - self._last_flush < interval):
+            return
+        self._last_flush = now
+        data = self.snapshot()
+        data['gauges'] = collect_gauges()
+        data['counters'].extend(collect_counters())
+        path = os.path.join(directory, self.file_name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry._started)
+
+
+def inc(name, labels=(), amount=1.0):
+    registry.inc(name, tuple(labels), amount)
+
+
+def observe(name, labels, value):
+    registry.observe(name, tuple(labels), value)
+
+
+def collect_counters():
+    """Point-in-time counters owned by other modules (pools, caches)."""
+    from app.cache import caches
+    from app.lookups import lookup_cache
+    counters = []
+    for name, cache in list(caches.items()) + [('lookups', lookup_cache)]:
+        counters.append(['app_cache_hits_total', [['cache', name]], float(cache.hits)])
+        counters.append(['app_cache_misses_total', [['cache', name]], float(cache.misses)])
+    for bind, stats in _pool_stats().items():
+        labels = [['bind', bind]]
+        if 'checkouts' in stats:
+            counters.append(['app_db_pool_checkouts_total', labels, float(stats['checkouts'])])
+            counters.append(['app_db_pool_checkout_timeouts_total', labels, float(stats['checkout_timeouts'])])
+            counters.append(['app_db_pool_checkout_wait_seconds_total', labels, stats['checkout_wait_total_s']])
+    return counters
+
+
+def collect_gauges():
+    gauges = []
+    for bind, stats in _pool_stats().items():
+        labels = [['bind', bind], ['pid', str(os.getpid())]]
+        for key, name in (('checked_out', 'app_db_pool_checked_out'), ('size', 'app_db_pool_size'),
+                          ('overflow', 'app_db_pool_overflow')):
+            if key in stats:
+                gauges.append([name, labels, float(stats[key])])
+    return gauges
+
+
+def _pool_stats():
+    from app.database import pool_stats
+    if not has_app_context():
+        return {}
+    return pool_stats()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def gather(directory):
+    """Merge every worker's file (or just this process without a directory)."""
+    registry.flush(directory, 0, force=True)
+    if directory:
+        snapshots = []
+        newest = {}
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid, _, started = os.path.basename(path)[:-len('.json')].partition('-')
+            started = int(started) if started.isdigit() else 0
+            if pid.isdigit() and _pid_alive(int(pid)) and started >= newest.get(pid, (-1,))[0]:
+                newest[pid] = (started, len(snapshots))
+            snapshots.append(data)
+        # Counters from exited workers still count; their gauges don't.
+        # Only the newest file for a live pid belongs to the running process.
+        live = {index for _, index in newest.values()}
+        for index, data in enumerate(snapshots):
+            if index not in live:
+                data['gauges'] = []
+    else:
+        data = registry.snapshot()
+        data['gauges'] = collect_gauges()
+        data['counters'].extend(collect_counters())
+        snapshots = [data]
+
+    counters = {}
+    histograms = {}
+    gauges = []
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, buckets, total, bounds in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, bounds])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+        for name, labels, value in data['gauges']:
+            gauges.append((name, tuple(map(tuple, labels)), value))
+
+    for (name, labels), hits in list(counters.items()):
+        if name == 'app_cache_hits_total':
+            misses = counters.get(('app_cache_misses_total', labels), 0.0)
+            gauges.append(('app_cache_hit_ratio', labels, hits / (hits + misses) if hits + misses else 0.0))
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    value = float(value)
+    if not math.isfinite(value):
+        return {'inf': '+Inf', '-inf': '-Inf'}.get(str(value), 'NaN')
+    return repr(value) if value != int(value) else str(int(value))
+
+
+def render(directory):
+    counters, histograms, gauges = gather(directory)
+    lines = []
+    series = {}
+    for (name, labels), value in sorted(counters.items()):
+        series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), (buckets, total, bounds) in sorted(histograms.items()):
+        cumulative = 0
+        samples = series.setdefault(name, [])
+        for bound, count in zip(list(bounds) + ['+Inf'], buckets):
+            cumulative += count
+            samples.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+        samples.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+        samples.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    for name, labels, value in sorted(gauges):
+        series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for name in sorted(series):
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(series[name])
+    return '\n'.join(lines) + '\n'
+
+
+def _scrape_allowed():
+    # A bearer token or allowlisted address for scrapers, otherwise a logged-in admin
+    from app.permissions import permissions_for
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    if request.remote_addr in current_app.config['METRICS_ALLOWED_IPS']:
+        return True
+    return current_user.is_authenticated and permissions_for(current_user).allows('admin')
+
+
+def init_app(app):
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    interval = app.config['METRICS_FLUSH_INTERVAL']
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            labels = (('endpoint', request.endpoint or 'unknown'), ('method', request.method),
+                      ('status', str(response.status_code)))
+            registry.observe('app_http_request_duration_seconds', labels, time.perf_counter() - started)
+            registry.inc('app_http_requests_total', labels)
+            registry.flush(directory, interval)
+        return response
+
+    def metrics():
+        if not _scrape_allowed():
+            abort(403)
+        return Response(render(directory), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
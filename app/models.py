@@ -1,8 +1,12 @@
 # app/models.py
 
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
 from app import db, login
+from app.cache import LRUCache
 
 class RoleGroup(db.Model):
     __tablename__ = 'role_groups'
@@ -25,6 +29,7 @@ class RoleGroupMembership(db.Model):
 
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
+    __table_args__ = (db.Index('ix_user_last_name_id', 'last_name', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
@@ -32,19 +37,94 @@ class User(UserMixin, db.Model):
     first_name = db.Column(db.String(64))
     last_name = db.Column(db.String(64))
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
+    photo = db.Column(db.String(64))  # SHA-256 of the original in the image store
     role = db.relationship('Role', backref=db.backref('users', lazy=True))
     student_profile = db.relationship('StudentProfile', uselist=False, backref='user')
-    notes = db.relationship('Note', backref='user', lazy=True)
+    notes = db.relationship('Note', backref='user', lazy='dynamic', order_by='Note.created_at.desc(), Note.id.desc()')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# Detached User -> Role -> groups graphs, keyed by user id
+user_cache = LRUCache('users', maxsize=1024, ttl=30)
+
+def _fetch_user(user_id):
+    # Load user, role and groups in one joined query, in a private session so
+    # the cached graph is never expired by a commit in the request session
+    with Session(db.engine) as session:
+        query = select(User).options(joinedload(User.role).joinedload(Role.groups)).filter_by(id=user_id)
+        return session.execute(query).unique().scalar_one_or_none()
+
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    user_id = int(id)
+    user = user_cache.get(user_id)
+    if user is None:
+        user = _fetch_user(user_id)
+        if user is None:
+            return None
+        user_cache.set(user_id, user)
+    # Attach a copy to this request's session without touching the DB
+    return db.session.merge(user, load=False)
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
+def invalidate_all_users():
+    user_cache.clear()
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+class Setting(db.Model):
+    __tablename__ = 'settings'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_id', 'status', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.Text)  # JSON
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)  # None when the size isn't known up front
+    message = db.Column(db.String(255))
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    worker = db.Column(db.String(128))  # host:pid running the job
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Last progress report; stale means the worker died
+    finished_at = db.Column(db.DateTime)
+
+class SyncState(db.Model):
+    __tablename__ = 'sync_state'
+    name = db.Column(db.String(32), primary_key=True)  # Sync table, e.g. 'students'
+    watermark = db.Column(db.String(32))  # Newest source change already synced
+    synced_at = db.Column(db.DateTime)
+
+class SyncLedger(db.Model):
+    __tablename__ = 'sync_ledger'
+    table_name = db.Column(db.String(32), primary_key=True)
+    source_key = db.Column(db.String(64), primary_key=True)
+    row_hash = db.Column(db.String(32), nullable=False)  # Of the mapped source values last applied
+    target_id = db.Column(db.Integer)  # None while the row conflicts with another target row
+
+class UsernameSequence(db.Model):
+    __tablename__ = 'username_sequences'
+    prefix = db.Column(db.String(32), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
 
 class Grade(db.Model):
     __tablename__ = 'grades'
@@ -73,13 +153,93 @@ class StudentProfile(db.Model):
     state_id = db.Column(db.Integer, db.ForeignKey('states.id'))
     zip = db.Column(db.String(10))
     primary_language_id = db.Column(db.Integer, db.ForeignKey('languages.id'))
+    homeroom_id = db.Column(db.Integer, db.ForeignKey('homerooms.id'), index=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped on every edit
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     grade = db.relationship('Grade', backref=db.backref('students', lazy=True))
     primary_language = db.relationship('Language', backref=db.backref('students', lazy=True))
     state = db.relationship('State', backref=db.backref('students', lazy=True))
+    homeroom = db.relationship('Homeroom', backref=db.backref('students', lazy=True))
+
+class Homeroom(db.Model):
+    __tablename__ = 'homerooms'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False)
+    grade_id = db.Column(db.Integer, db.ForeignKey('grades.id'), nullable=False, index=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    capacity = db.Column(db.Integer, nullable=False, default=25)
+    grade = db.relationship('Grade', backref=db.backref('homerooms', lazy=True))
+    teacher = db.relationship('User', backref=db.backref('homerooms', lazy=True))
 
 class Note(db.Model):
     __tablename__ = 'notes'
+    __table_args__ = (db.Index('ix_notes_user_id_created_at', 'user_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     note = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class Term(db.Model):
+    __tablename__ = 'terms'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False)
+    starts_on = db.Column(db.Date)
+    ends_on = db.Column(db.Date)
+
+class Course(db.Model):
+    __tablename__ = 'courses'
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(32), unique=True, nullable=False)
+    name = db.Column(db.String(128), nullable=False)
+    grade_id = db.Column(db.Integer, db.ForeignKey('grades.id'))
+    grade = db.relationship('Grade', backref=db.backref('courses', lazy=True))
+
+class Section(db.Model):
+    __tablename__ = 'sections'
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('terms.id'), nullable=False, index=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    name = db.Column(db.String(64), nullable=False)
+    # Section aggregate, kept in step with Enrollment.average by app.gradebook
+    average = db.Column(db.Float)
+    graded_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    course = db.relationship('Course', backref=db.backref('sections', lazy=True))
+    term = db.relationship('Term', backref=db.backref('sections', lazy=True))
+    teacher = db.relationship('User', backref=db.backref('sections_taught', lazy=True))
+
+class Enrollment(db.Model):
+    __tablename__ = 'enrollments'
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    average = db.Column(db.Float)  # Weighted percentage, None until something is graded
+    section = db.relationship('Section', backref=db.backref('enrollments', lazy=True))
+    student = db.relationship('User', backref=db.backref('enrollments', lazy=True))
+
+class AssignmentCategory(db.Model):
+    __tablename__ = 'assignment_categories'
+    id = db.Column(db.Integer, primary_key=True)
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False, index=True)
+    name = db.Column(db.String(64), nullable=False)
+    weight = db.Column(db.Float, nullable=False, default=1.0)
+    drop_lowest = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    section = db.relationship('Section', backref=db.backref('categories', lazy=True))
+
+class Assignment(db.Model):
+    __tablename__ = 'assignments'
+    id = db.Column(db.Integer, primary_key=True)
+    section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('assignment_categories.id'), nullable=False)
+    name = db.Column(db.String(128), nullable=False)
+    points_possible = db.Column(db.Float, nullable=False)
+    due_on = db.Column(db.Date)
+    section = db.relationship('Section', backref=db.backref('assignments', lazy=True))
+    category = db.relationship('AssignmentCategory', backref=db.backref('assignments', lazy=True))
+
+class Score(db.Model):
+    __tablename__ = 'scores'
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    points = db.Column(db.Float)  # None means not graded yet
+    excused = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
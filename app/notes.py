@@ -0,0 +1,110 @@
+# app/notes.py
+
+import re
+from sqlalchemy import String, event, func, select, text, type_coerce
+from sqlalchemy.orm import Session
+from app import db
+from app.cache import LRUCache
+from app.models import Note
+from app.pagination import KeysetPage, keyset_paginate
+
+# Newest first; served by ix_notes_user_id_created_at (user_id, created_at, id).
+# Cursors carry created_at exactly as stored: SQLite keeps CURRENT_TIMESTAMP as
+# 'YYYY-MM-DD HH:MM:SS' text, which a bound datetime ('...:SS.000000') doesn't compare equal to
+NOTE_CREATED = type_coerce(Note.created_at, String)
+NOTE_ORDER = (NOTE_CREATED, Note.id)
+
+# Per-user note totals shown on profiles, dropped when a note is added or removed
+note_counts = LRUCache('note_counts', maxsize=4096, ttl=300)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_sqlite_fts = {}
+
+
+def count_notes(user_id):
+    total = note_counts.get(user_id)
+    if total is None:
+        total = db.session.execute(select(func.count(Note.id)).where(Note.user_id == user_id)).scalar()
+        note_counts.set(user_id, total)
+    return total
+
+
+def notes_page(user_id, after=None, before=None, per_page=20):
+    query = db.session.query(Note, NOTE_CREATED).filter(Note.user_id == user_id)
+    page = keyset_paginate(query, NOTE_ORDER, key=lambda row: [row[1], row[0].id],
+                           after=after, before=before, per_page=per_page, descending=True)
+    return KeysetPage([note for note, created in page.items], page.next_cursor, page.prev_cursor)
+
+
+def _has_sqlite_fts(engine):
+    # The FTS5 table only exists when the schema came from the migrations
+    key = str(engine.url)
+    if key not in _sqlite_fts:
+        with engine.connect() as connection:
+            _sqlite_fts[key] = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).first() is not None
+    return _sqlite_fts[key]
+
+
+def _ranked_ids(engine, words, user_id, limit):
+    params = {'limit': limit}
+    user_filter = ''
+    if user_id is not None:
+        user_filter = 'AND notes.user_id = :user_id'
+        params['user_id'] = user_id
+    if engine.dialect.name == 'mysql':
+        params['q'] = ' '.join(f'+{word}*' for word in words)
+        sql = ("SELECT notes.id FROM notes WHERE MATCH (notes.note) AGAINST (:q IN BOOLEAN MODE) "
+               f"{user_filter} ORDER BY MATCH (notes.note) AGAINST (:q IN BOOLEAN MODE) DESC LIMIT :limit")
+    elif engine.dialect.name == 'sqlite' and _has_sqlite_fts(engine):
+        params['q'] = ' '.join(f'"{word}"*' for word in words)
+        sql = ("SELECT notes.id FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+               f"WHERE notes_fts MATCH :q {user_filter} ORDER BY notes_fts.rank LIMIT :limit")
+    else:
+        return None
+    return list(db.session.execute(text(sql), params).scalars())
+
+
+def search_notes(query, user_id=None, limit=50):
+    """Notes matching every word of ``query`` (as prefixes), best match first.
+
+    Uses the FULLTEXT index on MySQL and the FTS5 table on SQLite; anything
+    else (or SQLite without the FTS table) falls back to LIKE, newest first.
+    """
+    words = _WORD.findall((query or '').lower())[:10]
+    if not words:
+        return []
+    ids = _ranked_ids(db.session.get_bind(mapper=Note.__mapper__), words, user_id, limit)
+    if ids is None:
+        notes = Note.query
+        if user_id is not None:
+            notes = notes.filter(Note.user_id == user_id)
+        for word in words:
+            notes = notes.filter(Note.note.ilike(f'%{word}%'))
+        return notes.order_by(Note.created_at.desc(), Note.id.desc()).limit(limit).all()
+    if not ids:
+        return []
+    by_id = {note.id: note for note in Note.query.filter(Note.id.in_(ids))}
+    return [by_id[note_id] for note_id in ids if note_id in by_id]
+
+
+# Drop cached counts for users whose notes were added or removed, once committed
+def _note_count_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('note_count_users', set()).add(target.user_id)
+
+
+event.listen(Note, 'after_insert', _note_count_changed)
+event.listen(Note, 'after_delete', _note_count_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_note_counts(session):
+    for user_id in session.info.pop('note_count_users', ()):
+        note_counts.delete(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_note_counts(session):
+    session.info.pop('note_count_users', None)
@@ -0,0 +1,91 @@
+# app/pagination.py
+
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import DateTime, and_, false, or_
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        return None
+
+
+def _cursor_values(columns, cursor):
+    values = decode_cursor(cursor)
+    if not isinstance(values, list) or len(values) != len(columns):
+        return None
+    try:
+        # Timestamps come back from the JSON cursor as strings
+        return [datetime.fromisoformat(value) if isinstance(value, str) and isinstance(column.type, DateTime)
+                else value for column, value in zip(columns, values)]
+    except ValueError:
+        return None
+
+
+def _seek(columns, values, forward):
+    # Rows strictly after (forward) or before the cursor in ascending order.
+    # NULLs sort first ascending on both MySQL and SQLite.
+    column, value = columns[0], values[0]
+    rest = _seek(columns[1:], values[1:], forward) if len(columns) > 1 else None
+    if value is None:
+        if forward:
+            clauses = [column.isnot(None)]
+        else:
+            clauses = []
+        if rest is not None:
+            clauses.append(and_(column.is_(None), rest))
+        return or_(*clauses) if clauses else false()
+    clauses = [column > value if forward else column < value]
+    if not forward:
+        clauses.append(column.is_(None))
+    if rest is not None:
+        clauses.append(and_(column == value, rest))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, key, after=None, before=None, per_page=50, descending=False):
+    """Seek pagination over ``columns`` (the last one must be unique).
+
+    ``key`` maps a result row to its values for ``columns``. Only
+    ``per_page + 1`` rows are ever fetched, whatever page is requested.
+    With ``descending`` pages run from the highest values down (newest
+    first for timestamps).
+    """
+    def order(reverse):
+        return [column.desc() if reverse else column for column in columns]
+
+    after_values = _cursor_values(columns, after)
+    before_values = _cursor_values(columns, before)
+    if before_values is not None:
+        query = query.filter(_seek(columns, before_values, forward=descending))
+        query = query.order_by(*order(not descending))
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        next_cursor = encode_cursor(key(items[-1])) if items else None
+        prev_cursor = encode_cursor(key(items[0])) if items and has_more else None
+        return KeysetPage(items, next_cursor, prev_cursor)
+
+    if after_values is not None:
+        query = query.filter(_seek(columns, after_values, forward=not descending))
+    query = query.order_by(*order(descending))
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    next_cursor = encode_cursor(key(items[-1])) if items and has_more else None
+    prev_cursor = encode_cursor(key(items[0])) if items and after_values is not None else None
+    return KeysetPage(items, next_cursor, prev_cursor)
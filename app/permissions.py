@@ -0,0 +1,134 @@
+# app/permissions.py
+
+import threading
+import time
+from collections import namedtuple
+from app import db
+from app.models import Role, RoleGroup, RoleGroupMembership
+from app.versions import current_versions
+
+SUPERUSER_ROLES = ['IT Support', 'superadmin']  # Add any other superuser roles here
+
+
+class Permissions(namedtuple('Permissions', ['role_id', 'role_name', 'groups', 'mask', 'is_superuser'])):
+    """Compiled permissions for a single role.
+
+    ``groups`` is a frozenset of role group names and ``mask`` has one bit set
+    per group (bit position = role group id), so checks never touch the DB.
+    """
+
+    def in_group(self, group_name):
+        return bool(self.mask & _cache.group_bit(group_name))
+
+    def allows(self, group_name):
+        # Same rule role_required has always applied: group member or superuser
+        return self.is_superuser or self.in_group(group_name)
+
+    def has_role(self, role_name):
+        return self.role_name == role_name
+
+    def has_any_role(self, *role_names):
+        return self.role_name in role_names
+
+
+ANONYMOUS = Permissions(None, None, frozenset(), 0, False)
+
+
+class _PermissionCache:
+    """Compiled permissions of every role, rebuilt when roles change.
+
+    The table is keyed on this process's counter, bumped by local changes,
+    and on the shared 'roles' data version, which every write to roles or
+    memberships bumps in any worker, job or script. The shared version is
+    read at most once per ``check_interval`` seconds, so checks normally
+    run no query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._built_key = None
+        self._roles = {}
+        self._group_bits = {}
+        self._shared = None
+        self._checked_at = 0.0
+        self.check_interval = 5
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+            # This process just wrote roles; pick up the shared version it moved on the next check
+            self._shared = None
+
+    def group_bit(self, group_name):
+        return self._group_bits.get(group_name, 0)
+
+    def _shared_version(self):
+        now = time.monotonic()
+        if self._shared is None or now - self._checked_at > self.check_interval:
+            self._shared = current_versions()['roles'][0]
+            self._checked_at = now
+        return self._shared
+
+    def get(self, role_id):
+        key = (self._version, self._shared_version())
+        with self._lock:
+            if self._built_key != key:
+                self._rebuild(key)
+            # A role missing from a current table doesn't exist; no reload per lookup
+            return self._roles.get(role_id, ANONYMOUS)
+
+    def _rebuild(self, key):
+        # Called with the lock held; one query for every role and its groups
+        rows = db.session.query(Role.id, Role.name, RoleGroup.id, RoleGroup.name) \
+            .outerjoin(RoleGroupMembership, RoleGroupMembership.role_id == Role.id) \
+            .outerjoin(RoleGroup, RoleGroup.id == RoleGroupMembership.group_id) \
+            .all()
+        names = {}
+        groups = {}
+        group_bits = {}
+        for role_id, role_name, group_id, group_name in rows:
+            names[role_id] = role_name
+            groups.setdefault(role_id, set())
+            if group_id is not None:
+                groups[role_id].add(group_name)
+                group_bits[group_name] = 1 << group_id
+        roles = {}
+        for role_id, role_name in names.items():
+            role_groups = frozenset(groups[role_id])
+            mask = 0
+            for group_name in role_groups:
+                mask |= group_bits[group_name]
+            roles[role_id] = Permissions(role_id, role_name, role_groups, mask,
+                                         role_name in SUPERUSER_ROLES)
+        self._group_bits = group_bits
+        self._roles = roles
+        self._built_key = key
+
+
+_cache = _PermissionCache()
+
+
+def permissions_for_role(role_id):
+    if role_id is None:
+        return ANONYMOUS
+    return _cache.get(role_id)
+
+
+def permissions_for(user):
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    return permissions_for_role(user.role_id)
+
+
+def permissions_version():
+    return _cache.version
+
+
+def bump_permissions_version():
+    """Invalidate compiled permissions after roles or memberships change."""
+    _cache.bump()
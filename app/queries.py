@@ -0,0 +1,40 @@
+# app/queries.py
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from app import db
+from app.cache import LRUCache
+from app.models import User, RoleGroupMembership
+
+# Sort orders accepted by the user list; the last column is always unique
+USER_SORTS = {
+    'id': (User.id,),
+    'last_name': (User.last_name, User.id),
+}
+
+# Filtered user totals; counting the whole table on every page view is what
+# made the user list slow, so totals are allowed to lag by the TTL
+user_counts = LRUCache('user_counts', maxsize=256, ttl=60)
+
+
+def filter_users(query, role_id=None, group_id=None):
+    if role_id:
+        query = query.filter(User.role_id == role_id)
+    if group_id:
+        group_roles = select(RoleGroupMembership.role_id).where(RoleGroupMembership.group_id == group_id)
+        query = query.filter(User.role_id.in_(group_roles))
+    return query
+
+
+def users_query(role_id=None, group_id=None):
+    query = User.query.options(joinedload(User.role))
+    return filter_users(query, role_id, group_id)
+
+
+def count_users(role_id=None, group_id=None):
+    key = (role_id or None, group_id or None)
+    total = user_counts.get(key)
+    if total is None:
+        total = filter_users(db.session.query(func.count(User.id)), role_id, group_id).scalar()
+        user_counts.set(key, total)
+    return total
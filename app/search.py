@@ -0,0 +1,262 @@
+# app/search.py
+
+import bisect
+import re
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+from app import db
+from app.models import User
+from app.versions import committed_bumps, current_versions
+
+_SPLIT = re.compile(r'[\s\-]+')
+_WORD = re.compile(r'\w+')
+
+
+def terms_for(username, first_name, last_name, email):
+    terms = set()
+    for value in (username, email):
+        if value:
+            terms.add(value.lower())
+    for value in (first_name, last_name):
+        if value:
+            terms.update(part for part in _SPLIT.split(value.lower()) if part)
+    return terms
+
+
+def tokenize(query):
+    return [part for part in _SPLIT.split((query or '').lower()) if part]
+
+
+class UserSearchIndex:
+    """In-memory prefix index over usernames, names and emails.
+
+    ``_keys`` is a sorted list of (term, user id); a prefix lookup is one
+    bisect plus a scan of the matching run. Edits made through the ORM are
+    applied after commit; bulk writes call invalidate() and the index is
+    rebuilt in the background while the old copy keeps serving. Writes made
+    by other workers, jobs or the CLI move the 'users' data version, which
+    is checked at most once per ``check_interval`` seconds; moves that
+    this process's own commits account for are taken as already applied.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._users = {}
+        self._built_at = None
+        self._stale = False
+        self._rebuilding = False
+        self._version = None
+        self._local = 0
+        self._writes = 0
+        self._checked_at = 0.0
+        self.max_age = 3600
+        self.check_interval = 5
+
+    @property
+    def ready(self):
+        return self._built_at is not None
+
+    def build(self):
+        # Read before the rows, so writes racing the build move it again
+        writes = self._writes
+        local = committed_bumps('users')
+        version = self._stored_version()
+        keys = []
+        users = {}
+        rows = db.session.execute(select(User.id, User.username, User.first_name, User.last_name, User.email))
+        for user_id, username, first_name, last_name, email in rows:
+            terms = terms_for(username, first_name, last_name, email)
+            users[user_id] = (username, first_name, last_name, email, terms)
+            keys.extend((term, user_id) for term in terms)
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._users = users
+            self._built_at = self._checked_at = time.monotonic()
+            self._version = version
+            self._local = local
+            # An upsert that landed on the old copy meanwhile may be missing from this one
+            self._stale = self._writes != writes
+
+    def invalidate(self):
+        self._stale = True
+
+    def reset(self):
+        with self._lock:
+            self._keys = []
+            self._users = {}
+            self._built_at = None
+
+    def _rebuild_in_background(self):
+        app = current_app._get_current_object()
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    self.build()
+                    db.session.remove()
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=rebuild, name='user-search-index', daemon=True).start()
+
+    def preload(self, app):
+        with app.app_context():
+            self._rebuild_in_background()
+
+    def _stored_version(self):
+        return current_versions()['users'][0]
+
+    def _changed_elsewhere(self):
+        now = time.monotonic()
+        if now - self._checked_at <= self.check_interval:
+            return False
+        self._checked_at = now
+        # Local count first: a commit landing in between then looks external, never the reverse
+        local = committed_bumps('users')
+        version = self._stored_version()
+        if version != self._version + local - self._local:
+            return True
+        self._version, self._local = version, local
+        return False
+
+    def ensure_current(self):
+        if not self.ready:
+            self.build()
+        elif self._stale or time.monotonic() - self._built_at > self.max_age or self._changed_elsewhere():
+            self._rebuild_in_background()
+
+    def upsert(self, user_id, username, first_name, last_name, email):
+        terms = terms_for(username, first_name, last_name, email)
+        with self._lock:
+            if not self.ready:
+                return
+            self._writes += 1
+            self._remove(user_id)
+            self._users[user_id] = (username, first_name, last_name, email, terms)
+            for term in terms:
+                bisect.insort(self._keys, (term, user_id))
+
+    def remove(self, user_id):
+        with self._lock:
+            if self.ready:
+                self._writes += 1
+                self._remove(user_id)
+
+    def _remove(self, user_id):
+        entry = self._users.pop(user_id, None)
+        if entry is None:
+            return
+        for term in entry[4]:
+            index = bisect.bisect_left(self._keys, (term, user_id))
+            if index < len(self._keys) and self._keys[index] == (term, user_id):
+                del self._keys[index]
+
+    def _prefix_ids(self, prefix, limit=None):
+        keys = self._keys
+        index = bisect.bisect_left(keys, (prefix,))
+        seen = []
+        found = set()
+        while index < len(keys) and keys[index][0].startswith(prefix):
+            user_id = keys[index][1]
+            if user_id not in found:
+                found.add(user_id)
+                seen.append(user_id)
+                if limit and len(seen) >= limit:
+                    break
+            index += 1
+        return seen
+
+    def search(self, query, limit=10):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Start from the longest word; it usually has the shortest run of keys
+        tokens.sort(key=len, reverse=True)
+        with self._lock:
+            first, rest = tokens[0], tokens[1:]
+            # Every extra word must prefix-match one of the same user's terms
+            candidates = self._prefix_ids(first, None if rest else limit)
+            results = []
+            for user_id in candidates:
+                username, first_name, last_name, email, terms = self._users[user_id]
+                if all(any(term.startswith(token) for term in terms) for token in rest):
+                    results.append({'id': user_id, 'username': username, 'first_name': first_name,
+                                    'last_name': last_name, 'email': email})
+                    if len(results) >= limit:
+                        break
+        return results
+
+
+search_index = UserSearchIndex()
+
+
+def _boolean_query(query):
+    # InnoDB splits emails at '@' and '.', and both (like + - < > ( ) ~ * ") are
+    # boolean-mode syntax, so every run of word characters is its own prefix term
+    words = [word for token in tokenize(query) for word in _WORD.findall(token)]
+    return ' '.join(f'+{word}*' for word in words)
+
+
+def fulltext_search(query, limit=10):
+    """MySQL FULLTEXT search for installs too large to index in memory."""
+    terms = _boolean_query(query)
+    if not terms:
+        return []
+    rows = db.session.execute(
+        select(User.id, User.username, User.first_name, User.last_name, User.email)
+        .where(text('MATCH (username, first_name, last_name, email) AGAINST (:q IN BOOLEAN MODE)'))
+        .limit(limit),
+        {'q': terms},
+    )
+    return [{'id': user_id, 'username': username, 'first_name': first_name, 'last_name': last_name, 'email': email}
+            for user_id, username, first_name, last_name, email in rows]
+
+
+def search_users(query, limit=10):
+    if current_app.config['SEARCH_BACKEND'] == 'fulltext':
+        return fulltext_search(query, limit)
+    search_index.ensure_current()
+    return search_index.search(query, limit)
+
+
+# Keep the index in step with ORM writes once they are committed
+def _queue_upsert(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('search_changes', {})[target.id] = (
+            target.username, target.first_name, target.last_name, target.email)
+
+
+def _queue_delete(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('search_changes', {})[target.id] = None
+
+
+event.listen(User, 'after_insert', _queue_upsert)
+event.listen(User, 'after_update', _queue_upsert)
+event.listen(User, 'after_delete', _queue_delete)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_search_changes(session):
+    changes = session.info.pop('search_changes', None)
+    for user_id, values in (changes or {}).items():
+        if values is None:
+            search_index.remove(user_id)
+        else:
+            search_index.upsert(user_id, *values)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_search_changes(session):
+    session.info.pop('search_changes', None)
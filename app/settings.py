@@ -0,0 +1,111 @@
+# app/settings.py
+
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.models import DataVersion, Setting
+
+SettingSpec = namedtuple('SettingSpec', ['label', 'type', 'default', 'choices'])
+
+THEMES = (('light', 'Light'), ('dark', 'Dark'), ('spirit', 'Spirit blue'))
+
+# Every setting the DBA page can change. A default naming a config key is
+# read from the app config, so existing deployments keep their values.
+SETTINGS = {
+    'school_name': SettingSpec('School name', str, 'School Management System', None),
+    'school_domain': SettingSpec('Email domain', str, 'config:SCHOOL_DOMAIN', None),
+    'default_password': SettingSpec('Default password', str, 'config:DEFAULT_PASSWORD', None),
+    'theme': SettingSpec('Theme', str, 'light', THEMES),
+    'school_logo': SettingSpec('School logo', str, None, None),  # Image store digest
+}
+
+
+def _parse(spec, value):
+    if value is None:
+        return None
+    if spec.type is bool:
+        return value in ('1', 'true', 'True')
+    return spec.type(value)
+
+
+def _default(spec):
+    if isinstance(spec.default, str) and spec.default.startswith('config:'):
+        return current_app.config.get(spec.default[len('config:'):])
+    return spec.default
+
+
+class SettingsStore:
+    """In-process snapshot of the settings table.
+
+    Reads are a dict lookup. At most once per ``check_interval`` seconds a
+    worker compares the 'settings' data version (bumped by every write, in
+    any worker) with the one it loaded and reloads only if it moved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        self.check_interval = 5
+
+    def _stored_version(self):
+        return db.session.execute(
+            select(DataVersion.version).where(DataVersion.name == 'settings')).scalar() or 0
+
+    def _load(self, version):
+        values = {name: _default(spec) for name, spec in SETTINGS.items()}
+        for name, value in db.session.execute(select(Setting.name, Setting.value)):
+            if name in SETTINGS:
+                values[name] = _parse(SETTINGS[name], value)
+        self._values = values
+        self._version = version
+        return values
+
+    def snapshot(self):
+        # Work on a local: invalidate() may clear self._values at any moment
+        values = self._values
+        now = time.monotonic()
+        if values is None or now - self._checked_at > self.check_interval:
+            with self._lock:
+                values = self._values
+                if values is None or now - self._checked_at > self.check_interval:
+                    version = self._stored_version()
+                    if values is None or version != self._version:
+                        values = self._load(version)
+                    self._checked_at = now
+        return values
+
+    def get(self, name):
+        return self.snapshot()[name]
+
+    def update(self, values):
+        """Save changed settings (``{name: value}``) and refresh this worker at once."""
+        current = self.snapshot()
+        changed = {name: value for name, value in values.items() if name in SETTINGS and value != current[name]}
+        if not changed:
+            return {}
+        stored = {setting.name: setting for setting in Setting.query.filter(Setting.name.in_(list(changed)))}
+        for name, value in changed.items():
+            setting = stored.get(name)
+            if setting is None:
+                setting = Setting(name=name)
+                db.session.add(setting)
+            setting.value = None if value is None else str(value)
+        db.session.commit()
+        self.invalidate()
+        return changed
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+
+settings = SettingsStore()
+
+
+def setting(name):
+    return settings.get(name)
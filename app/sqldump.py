@@ -0,0 +1,317 @@
+# app/sqldump.py
+
+import datetime
+import gzip
+import re
+from collections import namedtuple
+from decimal import Decimal
+
+Column = namedtuple('Column', ['name', 'type'])
+Table = namedtuple('Table', ['name', 'columns'])
+RowBatch = namedtuple('RowBatch', ['table', 'columns', 'rows'])
+
+CHUNK_SIZE = 1 << 20  # Characters read from the dump at a time
+
+# Possessive quantifiers keep a row that is cut off at the end of the
+# buffer from backtracking; it simply fails to match until more is read
+_ROW = re.compile(r"\s*+\(((?:[^'()]++|'(?:[^'\\]++|\\.|'')*+')*+)\)\s*+([,;]|\Z)", re.S)
+_FIELD = re.compile(r"'(?:[^'\\]++|\\.|'')*+'|[^,'\s]++", re.S)
+_TOKEN = re.compile(r"'(?:[^'\\]++|\\.|'')*+'|\"(?:[^\"\\]++|\\.|\"\")*+\"|`(?:[^`]++|``)*+`|[^\s'\"`(),;]++|[(),;]",
+                    re.S)
+_SPACE = re.compile(r"\s*+")
+_ESCAPE = re.compile(r"\\(.)|''", re.S)
+# MySQL keeps the backslash of \% and \_ (they only mean something in LIKE patterns)
+_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', '%': '\\%', '_': '\\_'}
+
+INTEGER_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'year'}
+BINARY_TYPES = {'binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob'}
+
+
+class DumpError(Exception):
+    pass
+
+
+def _unescape(value):
+    if '\\' not in value and "''" not in value:
+        return value
+    return _ESCAPE.sub(lambda m: "'" if m.group(1) is None else _ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _datetime(value):
+    # MySQL writes "no date" as all zeros
+    return None if value.startswith('0000') else datetime.datetime.fromisoformat(value)
+
+
+def _date(value):
+    return None if value.startswith('0000') else datetime.date.fromisoformat(value)
+
+
+def _binary(value):
+    if value[:2] in ('0x', '0X'):
+        return bytes.fromhex(value[2:])
+    return value.encode('utf-8')
+
+
+def _number(value):
+    if value[:2] in ('0x', '0X'):
+        return bytes.fromhex(value[2:])
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def converter(sql_type):
+    """Python conversion for one column type from a CREATE TABLE, or None for text."""
+    if sql_type in INTEGER_TYPES:
+        return int
+    if sql_type in ('decimal', 'numeric'):
+        return Decimal
+    if sql_type in ('float', 'double', 'real'):
+        return float
+    if sql_type in ('datetime', 'timestamp'):
+        return _datetime
+    if sql_type == 'date':
+        return _date
+    if sql_type in BINARY_TYPES:
+        return _binary
+    return None
+
+
+def _column(values, convert):
+    # Quoted values still have their quotes; unquoted ones are NULL, numbers or 0x... literals
+    values = [(value[1:-1] if '\\' not in value and "''" not in value else _unescape(value[1:-1]))
+              if value[0] == "'" else None if value == 'NULL' else value if convert else _number(value)
+              for value in values]
+    if convert is None:
+        return values
+    return [None if value is None else convert(value) for value in values]
+
+
+def _convert(name, texts, converters):
+    """Parse and type a batch of row texts a column at a time.
+
+    One findall over the whole batch and a slice per column is much faster
+    than splitting and converting field by field.
+    """
+    width = len(converters)
+    values = _FIELD.findall(','.join(texts))
+    if len(values) != width * len(texts):
+        for text in texts:
+            count = len(_FIELD.findall(text))
+            if count != width:
+                raise DumpError(f"A row of {name} has {count} values for {width} columns: ({text[:60]}...)")
+    return list(zip(*[_column(values[index::width], convert) for index, convert in enumerate(converters)]))
+
+
+def _name(token):
+    if token[:1] == '`':
+        return token[1:-1].replace('``', '`')
+    if token[:1] in ('"', "'"):
+        return _unescape(token[1:-1])
+    return token
+
+
+class DumpReader:
+    """Reads a mysqldump/phpMyAdmin dump one statement at a time.
+
+    Only CREATE TABLE (for column names and types) and INSERT statements
+    are interpreted; everything else is skipped. Multi-row INSERTs are
+    parsed row by row from a bounded buffer, so memory doesn't grow with
+    the size of a statement or the dump. ``.gz`` dumps are read directly.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.tables = {}
+        self._file = None
+        self._data = ''
+        self._pos = 0
+        self._eof = False
+
+    # Buffer
+
+    def _fill(self):
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._data = self._data[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _find(self, needle):
+        while True:
+            index = self._data.find(needle, self._pos)
+            if index >= 0 or not self._fill():
+                return index
+
+    def _skip_space(self):
+        """Skip whitespace and comments; False at the end of the dump."""
+        while True:
+            self._pos = _SPACE.match(self._data, self._pos).end()
+            # Two characters of lookahead to recognise comment openers
+            if len(self._data) - self._pos < 2 and not self._eof:
+                self._fill()
+                continue
+            if self._pos >= len(self._data):
+                return False
+            if self._data.startswith('/*', self._pos):
+                end = self._find('*/')
+                if end < 0:
+                    raise DumpError("Unterminated comment at the end of the dump.")
+                self._pos = end + 2
+            elif self._data.startswith('--', self._pos) or self._data[self._pos] == '#':
+                end = self._find('\n')
+                self._pos = len(self._data) if end < 0 else end + 1
+            else:
+                return True
+
+    def _match(self, pattern):
+        """Match ``pattern`` at the current position, reading more until the match can't grow."""
+        while True:
+            match = pattern.match(self._data, self._pos)
+            if (match and match.end() < len(self._data)) or self._eof:
+                return match
+            if not self._fill() and match is None:
+                return None
+
+    def _token(self):
+        if not self._skip_space():
+            return None
+        match = self._match(_TOKEN)
+        if match is None:
+            raise DumpError(f"Can't read the dump near {self._data[self._pos:self._pos + 40]!r}.")
+        self._pos = match.end()
+        return match.group()
+
+    def _expect(self, *words):
+        token = self._token()
+        if token is None or token.upper() not in words:
+            raise DumpError(f"Expected {' or '.join(words)}, found {token!r}.")
+        return token
+
+    def _skip_statement(self, token):
+        while token is not None and token != ';':
+            token = self._token()
+
+    # Statements
+
+    def _create_table(self):
+        token = self._token()
+        if token is None or token.upper() != 'TABLE':
+            return self._skip_statement(token)
+        token = self._token()
+        if token.upper() == 'IF':
+            self._expect('NOT')
+            self._expect('EXISTS')
+            token = self._token()
+        name = _name(token)
+        self._expect('(')
+        columns = []
+        item = []
+        depth = 1
+        while depth:
+            token = self._token()
+            if token is None:
+                raise DumpError(f"Unterminated CREATE TABLE {name}.")
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            if depth == 1 and token == ',' or depth == 0:
+                # Column definitions start with a name; keys and constraints with a keyword
+                if len(item) >= 2 and (item[0][:1] == '`' or item[0].upper() not in (
+                        'PRIMARY', 'KEY', 'INDEX', 'UNIQUE', 'CONSTRAINT', 'FOREIGN', 'FULLTEXT', 'SPATIAL', 'CHECK')):
+                    columns.append(Column(_name(item[0]), item[1].lower()))
+                item = []
+            else:
+                item.append(token)
+        self._skip_statement(self._token())
+        self.tables[name] = Table(name, tuple(columns))
+
+    def _insert(self, wanted, batch_size):
+        token = self._token()
+        while token.upper() in ('LOW_PRIORITY', 'DELAYED', 'HIGH_PRIORITY', 'IGNORE', 'INTO'):
+            token = self._token()
+        name = _name(token)
+        table = self.tables.get(name)
+        token = self._token()
+        if token == '(':
+            names = []
+            token = self._token()
+            while token != ')':
+                if token != ',':
+                    names.append(_name(token))
+                token = self._token()
+            token = self._token()
+        elif table is not None:
+            names = [column.name for column in table.columns]
+        else:
+            raise DumpError(f"INSERT into {name} has no column list and no CREATE TABLE before it.")
+        if token.upper() not in ('VALUES', 'VALUE'):
+            raise DumpError(f"Unsupported INSERT into {name}: {token!r}.")
+
+        if wanted is not None and name not in wanted:
+            yield from self._rows(name, None, None, 0)
+            return
+        types = {column.name: column.type for column in table.columns} if table else {}
+        converters = [converter(types.get(column, '')) for column in names]
+        yield from self._rows(name, tuple(names), converters, batch_size)
+
+    def _rows(self, name, columns, converters, batch_size):
+        """Parse VALUES (...), (...); and yield RowBatches (or just skip them)."""
+        pending = []
+        while True:
+            match = self._match(_ROW)
+            if match is None:
+                if self._eof and not self._data[self._pos:].strip():
+                    raise DumpError(f"Unterminated INSERT into {name}.")
+                raise DumpError(f"Can't read a row of {name} near {self._data[self._pos:self._pos + 40].strip()!r}.")
+            self._pos = match.end()
+            if converters is not None:
+                pending.append(match.group(1))
+                if len(pending) >= batch_size:
+                    yield RowBatch(name, columns, _convert(name, pending, converters))
+                    pending = []
+            if match.group(2) != ',':
+                break
+        if pending:
+            yield RowBatch(name, columns, _convert(name, pending, converters))
+
+    def batches(self, tables=None, batch_size=1000):
+        """Yield RowBatch(table, columns, rows) for every INSERT, in dump order.
+
+        ``tables`` limits the output to those table names (rows of other
+        tables are scanned past, not converted). Values are typed from the
+        CREATE TABLE that precedes them: ints, Decimals, floats, dates and
+        datetimes, bytes for binary columns and None for NULL.
+        """
+        wanted = set(tables) if tables is not None else None
+        opener = gzip.open if str(self.path).endswith('.gz') else open
+        with opener(self.path, 'rt', encoding='utf-8', newline='') as self._file:
+            self._data, self._pos, self._eof = '', 0, False
+            while True:
+                token = self._token()
+                if token is None:
+                    return
+                keyword = token.upper()
+                if keyword == 'CREATE':
+                    self._create_table()
+                elif keyword in ('INSERT', 'REPLACE'):
+                    yield from self._insert(wanted, batch_size)
+                else:
+                    self._skip_statement(token)
+
+
+def read_dump(path, tables=None, batch_size=1000):
+    """Typed row batches from a SQL dump file; see DumpReader.batches."""
+    return DumpReader(path).batches(tables, batch_size)
+
+
+def dump_rows(path, table, batch_size=1000):
+    """Rows of one table in a dump, as dicts keyed by column name."""
+    for batch in read_dump(path, (table,), batch_size):
+        for row in batch.rows:
+            yield dict(zip(batch.columns, row))
@@ -0,0 +1,346 @@
+# app/sync.py
+
+import hashlib
+import os
+import time
+from collections import namedtuple
+import sqlalchemy
+from sqlalchemy import bindparam, delete, func, insert, or_, select, update
+from app import db
+from app.hashing import hash_passwords
+from app.importer import chunked, resolve_role_id
+from app.lookups import lookup_cache
+from app.models import Language, Role, SyncLedger, SyncState, User, invalidate_user
+from app.permissions import bump_permissions_version
+from app.search import search_index
+from app.settings import settings
+from app.sqldump import dump_rows
+from app.usernames import generate_email, generate_usernames
+from app.versions import bump
+
+SyncResult = namedtuple('SyncResult', ['table', 'read', 'inserted', 'updated', 'unchanged', 'conflicts', 'seconds'])
+
+ledger_table = SyncLedger.__table__
+state_table = SyncState.__table__
+
+
+class SyncError(Exception):
+    pass
+
+
+def row_hash(values):
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class SyncTable:
+    """How one legacy school10 table maps onto a school15 model.
+
+    ``columns`` maps target columns to source columns. Source rows are
+    tracked by ``key`` in the ledger and matched to existing target rows
+    by ``match`` the first time they are seen; ``unique`` lists the target
+    columns a new or changed row must not collide on. With a
+    ``watermark`` column only rows changed since the last sync are read.
+    """
+    keep_id = False  # Insert with the source id when it's free
+    watermark = None
+    version = None
+
+    def __init__(self, name, source_table, model, columns, match, unique=None, key='id'):
+        self.name = name
+        self.source_table = source_table
+        self.model = model
+        self.columns = columns
+        self.match = match
+        self.unique = unique or (match,)
+        self.key = key
+
+    @property
+    def source_columns(self):
+        columns = [self.key] + [column for column in self.columns.values() if column != self.key]
+        if self.watermark and self.watermark not in columns:
+            columns.append(self.watermark)
+        return columns
+
+    def filters(self, options):
+        """Equality filters on source columns."""
+        return {}
+
+    def prepare(self, rows, options):
+        """Fill in target values new rows need before they are inserted."""
+
+    def committed(self, target_ids):
+        """Invalidate caches after a batch of Core writes is committed."""
+
+
+class LookupSync(SyncTable):
+    keep_id = True
+    version = 'lookups'
+
+    def __init__(self, name, source_table, model, lookup):
+        super().__init__(name, source_table, model, {'id': 'id', 'name': 'name'}, match='name')
+        self.lookup = lookup
+
+    def committed(self, target_ids):
+        lookup_cache.invalidate(self.lookup)
+
+
+class RoleSync(LookupSync):
+    version = 'roles'
+
+    def committed(self, target_ids):
+        super().committed(target_ids)
+        bump_permissions_version()
+
+
+class StudentSync(SyncTable):
+    watermark = 'updated_at'
+    version = 'users'
+
+    def __init__(self):
+        super().__init__('students', 'users', User,
+                         {field: field for field in ('username', 'email', 'password_hash', 'first_name', 'last_name')},
+                         match='username', unique=('username', 'email'))
+
+    def filters(self, options):
+        return {'role_id': options.get('source_role_id', 19), 'is_active': 1}
+
+    def prepare(self, rows, options):
+        # Same defaults as the importer: generated usernames, emails and password
+        if 'role_id' not in options:
+            options['role_id'] = resolve_role_id(options.get('role_name') or 'student')
+        missing = [values for values in rows if not values['username']]
+        for values, username in zip(missing, generate_usernames(len(missing)) if missing else ()):
+            values['username'] = username
+        for values in rows:
+            values['email'] = values['email'] or generate_email(values['username'])
+            values['role_id'] = options['role_id']
+        password = options.get('default_password') or settings.get('default_password')
+        needs_password = [values for values in rows if not values['password_hash']]
+        hashes = hash_passwords([password] * len(needs_password), pool=options.get('hash_pool'))
+        for values, password_hash in zip(needs_password, hashes):
+            values['password_hash'] = password_hash
+
+    def committed(self, target_ids):
+        for user_id in target_ids:
+            invalidate_user(user_id)
+        search_index.invalidate()
+
+
+SYNC_TABLES = {spec.name: spec for spec in (
+    RoleSync('roles', 'roles', Role, 'roles'),
+    LookupSync('languages', 'languages', Language, 'languages'),
+    StudentSync(),
+)}
+
+
+def _watermark_text(value):
+    return None if value is None else str(value)
+
+
+def _sql_rows(url, spec, filters, watermark, batch_size):
+    source = sqlalchemy.table(spec.source_table, *[sqlalchemy.column(name) for name in spec.source_columns])
+    query = select(*source.c).order_by(source.c[spec.key])
+    for name, value in filters.items():
+        query = query.where(sqlalchemy.column(name) == value)
+    if watermark is not None:
+        # >= so rows changed within the same second are read again; their hashes drop them
+        query = query.where(or_(source.c[spec.watermark] >= watermark, source.c[spec.watermark].is_(None)))
+    engine = sqlalchemy.create_engine(url)
+    try:
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+            for row in result.mappings():
+                yield dict(row)
+    finally:
+        engine.dispose()
+
+
+def _dump_rows(path, spec, filters, watermark, batch_size):
+    for row in dump_rows(path, spec.source_table, batch_size):
+        if any(row.get(name, 1 if name == 'is_active' else None) != value for name, value in filters.items()):
+            continue
+        if watermark is not None:
+            changed = row.get(spec.watermark)
+            if changed is not None and _watermark_text(changed) < watermark:
+                continue
+        yield row
+
+
+def source_rows(source, spec, filters, watermark=None, batch_size=1000):
+    """Source rows of ``spec`` as dicts, only those changed since ``watermark`` if given.
+
+    ``source`` is a SQLAlchemy URL (the school10 server), a SQLite file or a
+    ``.sql``/``.sql.gz`` dump of the legacy database.
+    """
+    if '://' in source:
+        return _sql_rows(source, spec, filters, watermark, batch_size)
+    if not os.path.exists(source):
+        raise SyncError(f"Source {source} does not exist.")
+    if source.lower().endswith(('.sql', '.sql.gz')):
+        return _dump_rows(source, spec, filters, watermark, batch_size)
+    if os.path.splitext(source)[1].lower() in ('.sqlite', '.sqlite3', '.db'):
+        return _sql_rows('sqlite:///' + os.path.abspath(source), spec, filters, watermark, batch_size)
+    raise SyncError(f"Don't know how to read {source}.")
+
+
+def _ledger(name, keys):
+    return {key: (hash_, target_id) for key, hash_, target_id in db.session.execute(
+        select(ledger_table.c.source_key, ledger_table.c.row_hash, ledger_table.c.target_id)
+        .where(ledger_table.c.table_name == name, ledger_table.c.source_key.in_(keys)))}
+
+
+def _taken(spec, column, values):
+    """{lowercased value: target id} for the given values of a unique target column."""
+    target = spec.model.__table__
+    values = [value for value in values if value]
+    if not values:
+        return {}
+    return {str(value).lower(): target_id for target_id, value in db.session.execute(
+        select(target.c.id, target.c[column]).where(target.c[column].in_(values)))}
+
+
+def _claim_unique(spec, rows, target_ids):
+    """Drop rows that would collide with another target row (or each other) on a unique column."""
+    accepted = []
+    taken = {column: _taken(spec, column, [values.get(column) for key, values in rows]) for column in spec.unique}
+    for key, values in rows:
+        target_id = target_ids.get(key)
+        clashes = False
+        for column in spec.unique:
+            value = values.get(column)
+            if not value:
+                continue
+            owner = taken[column].get(str(value).lower(), target_id)
+            if owner != target_id:
+                clashes = True
+        if clashes:
+            continue
+        for column in spec.unique:
+            if values.get(column):
+                # Later rows in the batch can't take the same value
+                taken[column][str(values[column]).lower()] = target_id if target_id is not None else ('new', key)
+        accepted.append((key, values))
+    return accepted
+
+
+def sync_batch(spec, rows, options):
+    """Diff one batch of source rows against the ledger and apply it.
+
+    Returns (inserted, updated, unchanged, conflicts).
+    """
+    target = spec.model.__table__
+    incoming = {}
+    for row in rows:
+        values = {column: row.get(source) for column, source in spec.columns.items()}
+        values = {column: (None if value == '' else value) for column, value in values.items()}
+        incoming[str(row[spec.key])] = (row_hash(tuple(values.items())), values)
+    ledger = _ledger(spec.name, list(incoming))
+    changed = {key: entry for key, entry in incoming.items()
+               if key not in ledger or ledger[key][0] != entry[0]}
+    unchanged = len(incoming) - len(changed)
+    if not changed:
+        return 0, 0, unchanged, 0
+
+    # Rows seen before keep their target; new ones adopt an existing target row with the same match value
+    target_ids = {key: ledger[key][1] for key in changed if key in ledger and ledger[key][1] is not None}
+    new_keys = [key for key in changed if key not in target_ids]
+    existing = _taken(spec, spec.match, [changed[key][1][spec.match] for key in new_keys])
+    for key in new_keys:
+        value = changed[key][1][spec.match]
+        if value and str(value).lower() in existing:
+            target_ids[key] = existing[str(value).lower()]
+
+    candidates = [(key, dict(changed[key][1])) for key in changed]
+    # Ids are never rewritten, and only used for inserts when keep_id allows
+    for key, values in candidates:
+        if not spec.keep_id or key in target_ids:
+            values.pop('id', None)
+    accepted = _claim_unique(spec, [(key, values) for key, values in candidates if key in target_ids], target_ids)
+    new_rows = [(key, values) for key, values in candidates if key not in target_ids]
+    if new_rows:
+        new_rows = _claim_unique(spec, new_rows, target_ids)
+        spec.prepare([values for key, values in new_rows], options)
+        # Without a match value (e.g. a role with no name) the row can't be inserted or found again
+        new_rows = [(key, values) for key, values in new_rows if values.get(spec.match)]
+        # Values prepare() generated (usernames, emails) must not collide either
+        new_rows = _claim_unique(spec, new_rows, target_ids)
+        if spec.keep_id and new_rows:
+            used = {target_id for (target_id,) in db.session.execute(
+                select(target.c.id).where(target.c.id.in_([values['id'] for key, values in new_rows])))}
+            for key, values in new_rows:
+                if values['id'] in used:
+                    values.pop('id')
+    accepted_keys = {key for key, values in accepted} | {key for key, values in new_rows}
+
+    updates = [values for key, values in accepted]
+    if updates:
+        # Empty source values never blank out what the target already has
+        columns = list(updates[0])
+        statement = update(target).where(target.c.id == bindparam('b_id')).values(
+            {column: func.coalesce(bindparam('b_' + column), target.c[column]) for column in columns})
+        db.session.execute(statement, [dict({'b_id': target_ids[key]},
+                                            **{'b_' + column: values[column] for column in columns})
+                                       for key, values in accepted])
+    if new_rows:
+        # Rows that got an id and rows that didn't need separate executemany statements
+        for group in ([values for key, values in new_rows if 'id' in values],
+                      [values for key, values in new_rows if 'id' not in values]):
+            if group:
+                db.session.execute(insert(target), group)
+        inserted_ids = _taken(spec, spec.match, [values[spec.match] for key, values in new_rows])
+        for key, values in new_rows:
+            target_ids[key] = inserted_ids[str(values[spec.match]).lower()]
+
+    # Conflicting rows are recorded without a target so they are retried once they change
+    db.session.execute(delete(ledger_table).where(ledger_table.c.table_name == spec.name,
+                                                  ledger_table.c.source_key.in_(list(changed))))
+    db.session.execute(insert(ledger_table), [
+        {'table_name': spec.name, 'source_key': key, 'row_hash': hash_,
+         'target_id': target_ids.get(key) if key in accepted_keys else None}
+        for key, (hash_, values) in changed.items()])
+    if spec.version:
+        bump(spec.version)
+    db.session.commit()
+    spec.committed([target_ids[key] for key, values in accepted])
+    return len(new_rows), len(accepted), unchanged, len(changed) - len(accepted_keys)
+
+
+def sync_table(name, source, full=False, batch_size=1000, progress=None, **options):
+    """Bring one target table up to date with the legacy database.
+
+    Only source rows changed since the last sync are read (unless ``full``
+    or the table has no watermark column), rows whose hash matches the
+    ledger are skipped, and the rest are inserted or updated in one
+    committed batch per ``batch_size`` rows. Rows removed from the source
+    are left alone. ``progress(read, inserted, updated)`` is called after
+    every batch.
+    """
+    spec = SYNC_TABLES.get(name)
+    if spec is None:
+        raise SyncError(f"Unknown sync table {name}; expected one of {', '.join(sorted(SYNC_TABLES))}.")
+    started = time.perf_counter()
+    state = db.session.get(SyncState, name)
+    watermark = state.watermark if state is not None and spec.watermark and not full else None
+    db.session.rollback()  # Don't hold a transaction open while reading the source
+
+    read = inserted = updated = unchanged = conflicts = 0
+    newest = watermark
+    for batch in chunked(source_rows(source, spec, spec.filters(options), watermark, batch_size), batch_size):
+        counts = sync_batch(spec, batch, options)
+        inserted += counts[0]
+        updated += counts[1]
+        unchanged += counts[2]
+        conflicts += counts[3]
+        read += len(batch)
+        if spec.watermark:
+            seen = [_watermark_text(row.get(spec.watermark)) for row in batch if row.get(spec.watermark) is not None]
+            newest = max(seen + ([newest] if newest else []), default=None)
+        if progress:
+            progress(read, inserted, updated)
+
+    # Saved only after every batch committed, so an interrupted sync starts over from the old watermark
+    values = {'watermark': newest, 'synced_at': db.func.current_timestamp()}
+    if db.session.execute(update(state_table).where(state_table.c.name == name).values(values)).rowcount == 0:
+        db.session.execute(insert(state_table).values(name=name, **values))
+    db.session.commit()
+    return SyncResult(name, read, inserted, updated, unchanged, conflicts, time.perf_counter() - started)
@@ -0,0 +1,114 @@
+# app/usernames.py
+
+import datetime
+import threading
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, UsernameSequence
+from app.settings import settings
+
+FIRST_STUDENT_NUMBER = 442  # Starting number
+
+sequences = UsernameSequence.__table__
+
+
+def student_prefix(year=None):
+    return f"stu{year or datetime.datetime.now().year}"
+
+
+def format_username(prefix, number):
+    return f"{prefix}{number:04d}"
+
+
+def _initial_number(connection, prefix):
+    # Only runs once per prefix, when its sequence row is first created
+    highest = None
+    usernames = connection.execute(select(User.username).where(User.username.like(f"{prefix}%")))
+    for (username,) in usernames:
+        suffix = username[len(prefix):]
+        if suffix.isdigit() and (highest is None or int(suffix) > highest):
+            highest = int(suffix)
+    return FIRST_STUDENT_NUMBER if highest is None else highest + 1
+
+
+def _ensure_sequence(prefix):
+    try:
+        with db.engine.begin() as connection:
+            exists = connection.execute(select(sequences.c.prefix).where(sequences.c.prefix == prefix)).first()
+            if exists is None:
+                connection.execute(insert(sequences).values(prefix=prefix, next_value=_initial_number(connection, prefix)))
+    except IntegrityError:
+        pass  # Another worker created it first
+
+
+def reserve_block(prefix, count):
+    """Atomically reserve ``count`` consecutive numbers for ``prefix``.
+
+    The UPDATE takes the row lock, so the SELECT in the same transaction sees
+    exactly the value this call moved the sequence to.
+    """
+    if count <= 0:
+        # The UPDATE would change nothing, and MySQL reports that as no row matched
+        return range(0)
+    for _ in range(2):
+        with db.engine.begin() as connection:
+            bumped = connection.execute(
+                update(sequences)
+                .where(sequences.c.prefix == prefix)
+                .values(next_value=sequences.c.next_value + count)
+            ).rowcount
+            if bumped:
+                end = connection.execute(select(sequences.c.next_value).where(sequences.c.prefix == prefix)).scalar()
+                return range(end - count, end)
+        _ensure_sequence(prefix)
+    raise RuntimeError(f"Could not reserve usernames for {prefix}")
+
+
+class UsernameAllocator:
+    """Hands out sequence numbers from blocks reserved in the database.
+
+    Numbers left in a block when the process exits are never used, so
+    usernames can have gaps; they are never handed out twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def next_number(self, prefix, block_size):
+        with self._lock:
+            block = self._blocks.get(prefix)
+            if not block:
+                block = iter(reserve_block(prefix, block_size))
+                self._blocks[prefix] = block
+            number = next(block, None)
+            if number is None:
+                block = iter(reserve_block(prefix, block_size))
+                self._blocks[prefix] = block
+                number = next(block)
+            return number
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+allocator = UsernameAllocator()
+
+
+def generate_username():
+    prefix = student_prefix()
+    number = allocator.next_number(prefix, current_app.config['USERNAME_BLOCK_SIZE'])
+    return format_username(prefix, number)
+
+
+def generate_usernames(count, prefix=None):
+    # Bulk callers reserve exactly what they need in one statement
+    prefix = prefix or student_prefix()
+    return [format_username(prefix, number) for number in reserve_block(prefix, count)]
+
+
+def generate_email(username):
+    return f"{username}@{settings.get('school_domain')}"
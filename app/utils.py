@@ -1,4 +1,5 @@
 from flask_login import current_user
+from app.permissions import permissions_for
 
 def has_role(user, role_name):
-    return user.role.name == role_name
+    return permissions_for(user).has_role(role_name)
@@ -0,0 +1,98 @@
+# app/versions.py
+
+import threading
+from collections import Counter
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from flask import g, has_app_context
+from app import db
+from app.models import (DataVersion, Grade, Language, Note, Role, RoleGroup, RoleGroupMembership, Setting, State,
+                        StudentProfile, User)
+
+# Version counters bumped in the same transaction as any ORM write to these
+# models; page ETags and cached template fragments are keyed on them
+VERSIONED_MODELS = {
+    User: 'users',
+    StudentProfile: 'users',
+    Role: 'roles',
+    RoleGroup: 'roles',
+    RoleGroupMembership: 'roles',
+    Note: 'notes',
+    Grade: 'lookups',
+    Language: 'lookups',
+    State: 'lookups',
+    Setting: 'settings',
+}
+VERSION_NAMES = sorted(set(VERSIONED_MODELS.values()))
+
+version_table = DataVersion.__table__
+
+# How often this process has moved each counter in committed transactions,
+# so in-process caches can tell their own writes from other workers'
+_committed = Counter()
+_committed_lock = threading.Lock()
+
+
+def bump_versions(connection, names):
+    """Increment the named counters; call for Core writes that skip the ORM."""
+    for name in sorted(set(names)):
+        result = connection.execute(
+            update(version_table).where(version_table.c.name == name)
+            .values(version=version_table.c.version + 1, updated_at=db.func.current_timestamp()))
+        if result.rowcount == 0:
+            connection.execute(insert(version_table).values(name=name, version=1,
+                                                            updated_at=db.func.current_timestamp()))
+
+
+def _record(session, names):
+    session.info.setdefault('bumped_versions', Counter()).update(set(names))
+
+
+def bump(*names):
+    bump_versions(db.session.connection(), names)
+    _record(db.session, names)
+
+
+def committed_bumps(name):
+    return _committed[name]
+
+
+def current_versions():
+    """{name: (version, updated_at)} for every counter, read once per request."""
+    if has_app_context() and 'data_versions' in g:
+        return g.data_versions
+    versions = {name: (0, None) for name in VERSION_NAMES}
+    for name, version, updated_at in db.session.execute(
+            select(version_table.c.name, version_table.c.version, version_table.c.updated_at)):
+        versions[name] = (version, updated_at)
+    if has_app_context():
+        g.data_versions = versions
+    return versions
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_versions(session, flush_context):
+    names = set()
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = VERSIONED_MODELS.get(type(instance))
+        if name is not None and (instance in session.new or instance in session.deleted
+                                 or session.is_modified(instance, include_collections=False)):
+            names.add(name)
+    if names:
+        bump_versions(session.connection(), names)
+        _record(session, names)
+        if has_app_context():
+            g.pop('data_versions', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _count_committed_bumps(session):
+    bumped = session.info.pop('bumped_versions', None)
+    if bumped:
+        with _committed_lock:
+            _committed.update(bumped)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_bumps(session):
+    session.info.pop('bumped_versions', None)
@@ -1,13 +1,30 @@
 # app/views.py
 
-from flask import Blueprint, render_template, flash, redirect, url_for, request, abort
+from flask import Blueprint, render_template, flash, redirect, url_for, request, abort, current_app, Response, stream_with_context, jsonify
 from app import db
-from app.models import User, Role, RoleGroup, Grade, Language, Note, StudentProfile
+from app.models import User, Homeroom, Note, StudentProfile, invalidate_user
 from flask_login import login_user, logout_user, current_user, login_required
-from app.forms import ManualStudentEntryForm, StudentProfileForm
-from app.decorators import role_required
-import datetime
-from app.utils import has_role
+from app.forms import ManualStudentEntryForm, StudentProfileForm, NoteForm, PhotoForm, SettingsForm, HomeroomForm
+from app.decorators import role_required, read_only
+from app.database import pool_stats, use_replica
+from app.permissions import permissions_for
+from app.pagination import keyset_paginate
+from app.queries import USER_SORTS, users_query, count_users
+from app.export import EXPORT_FORMATS, export_roster
+from app.usernames import generate_username, generate_email
+from app.lookups import choices
+from app.search import search_users
+from app.homerooms import delete_homeroom, plan_grade
+from app.jobs import submit as submit_job
+from app.notes import count_notes, notes_page, search_notes
+from app.images import ImageError, store_original, thumbnails
+from app.fragments import conditional
+from app.settings import SETTINGS, settings
+from app.hashing import HashingBusy, login_hasher, needs_rehash
+from app.cache import LRUCache
+from app.versions import current_versions
+from markupsafe import Markup
+from sqlalchemy.orm import joinedload
 
 
 bp = Blueprint('views', __name__)
@@ -17,7 +34,7 @@ bp = Blueprint('views', __name__)
 @bp.route('/index')
 @login_required
 def index():
-    role_groups = [group.name for group in current_user.role.groups]
+    role_groups = sorted(permissions_for(current_user).groups)
     return render_template('index.html', title='Home', role_groups=role_groups)
 
 # User registration route
@@ -25,7 +42,7 @@ def index():
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('views.index'))
-    roles = Role.query.all()
+    roles = choices('roles')
     if request.method == 'POST':
         username = request.form['username']
         email = request.form['email']
@@ -63,13 +80,33 @@ def login():
         username = request.form['username']
         password = request.form['password']
         user = User.query.filter_by(username=username).first()
-        if user is None or not user.check_password(password):
+        try:
+            valid = user is not None and login_hasher.verify(user.password_hash, password)
+        except HashingBusy:
+            return 'Too many sign-ins in progress, please try again.', 503, {'Retry-After': '2'}
+        if not valid:
             flash('Invalid username or password')
             return redirect(url_for('views.login'))
+        if needs_rehash(user.password_hash):
+            login_hasher.schedule_rehash(user.id, user.password_hash, password)
         login_user(user)
         return redirect(url_for('views.index'))
     return render_template('login.html', title='Sign In')
 
+# Login verification latency per hash algorithm (admin only)
+@bp.route('/admin/login-stats')
+@login_required
+@role_required('admin')
+def login_stats():
+    return jsonify(login_hasher.stats.percentiles())
+
+# Connection pool checkout latency and saturation (admin only)
+@bp.route('/admin/db-stats')
+@login_required
+@role_required('admin')
+def db_stats():
+    return jsonify(pool_stats())
+
 # User logout route
 @bp.route('/logout')
 def logout():
@@ -103,6 +140,7 @@ def profile():
         current_user.first_name = first_name
         current_user.last_name = last_name
         db.session.commit()
+        invalidate_user(current_user.id)
         flash('Your profile has been updated.')
         return redirect(url_for('views.profile'))
     return render_template('profile.html', title='Profile')
@@ -118,9 +156,165 @@ def faculty_only():
 @bp.route('/admin/users')
 @login_required
 @role_required('admin')
+@read_only
+@conditional('users', 'roles')
 def list_users():
-    users = User.query.all()
-    return render_template('list_users.html', title='User List', users=users)
+    sort = request.args.get('sort', 'last_name')
+    if sort not in USER_SORTS:
+        sort = 'last_name'
+    role_id = request.args.get('role', type=int)
+    group_id = request.args.get('group', type=int)
+    per_page = request.args.get('per_page', current_app.config['USERS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MAX_USERS_PER_PAGE']))
+
+    columns = USER_SORTS[sort]
+
+    # Called from inside the cached table fragment, so a cache hit runs no query
+    def load_page():
+        return keyset_paginate(users_query(role_id, group_id), columns,
+                               key=lambda user: [getattr(user, column.key) for column in columns],
+                               after=request.args.get('after'), before=request.args.get('before'),
+                               per_page=per_page)
+
+    total = count_users(role_id, group_id)
+    filters = {'sort': sort, 'role': role_id, 'group': group_id, 'per_page': per_page}
+    roles = choices('roles')
+    groups = choices('role_groups')
+    return render_template('list_users.html', title='User List', load_page=load_page,
+                           total=total, filters=filters, roles=roles, groups=groups)
+
+# Typeahead search over usernames, names and emails (admin only)
+@bp.route('/admin/users/search')
+@login_required
+@role_required('admin')
+def search_users_api():
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    return jsonify(search_users(query, limit))
+
+# Reset the selected users to the default password (admin only)
+@bp.route('/admin/users/reset-passwords', methods=['POST'])
+@login_required
+@role_required('admin')
+def reset_passwords():
+    user_ids = [int(user_id) for user_id in request.form.getlist('user_ids') if user_id.isdigit()]
+    if not user_ids:
+        flash('No users selected.')
+        return redirect(url_for('views.list_users'))
+    # Hashing is slow by design, so it runs as a background job
+    job_id = submit_job('reset_passwords', {'user_ids': user_ids}, user_id=current_user.id)
+    flash(f'Resetting {len(user_ids)} passwords to the default password (job {job_id}).')
+    return redirect(url_for('jobs.list_jobs'))
+
+# Export users with their student profiles (admin only)
+@bp.route('/admin/users/export')
+@login_required
+@role_required('admin')
+@read_only
+def export_users():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    compress = request.args.get('gzip', type=int) == 1
+    role_id = request.args.get('role', type=int)
+    group_id = request.args.get('group', type=int)
+    filename = f"users.{fmt}.gz" if compress else f"users.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if compress:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = EXPORT_FORMATS[fmt]
+    chunks = export_roster(fmt, compress, role_id, group_id)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+# Preview and apply balanced homeroom placement for one grade (admin only)
+@bp.route('/admin/homerooms', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def homerooms():
+    grade_id = request.values.get('grade', type=int)
+    rebalance = request.values.get('mode', 'rebalance') != 'full'
+    if request.method == 'POST' and grade_id:
+        job_id = submit_job('rebalance_homerooms', {'grade_id': grade_id, 'rebalance': rebalance},
+                            user_id=current_user.id)
+        flash(f'Homeroom placement queued as job {job_id}.')
+        return redirect(url_for('jobs.list_jobs'))
+    placement = plan_grade(grade_id, rebalance=rebalance) if grade_id else None
+    rooms = Homeroom.query.options(joinedload(Homeroom.teacher)).filter_by(grade_id=grade_id) \
+        .order_by(Homeroom.name).all() if grade_id else []
+    return render_template('homerooms.html', title='Homerooms', grades=choices('grades'), grade_id=grade_id,
+                           mode='rebalance' if rebalance else 'full', placement=placement, rooms=rooms)
+
+def _save_homeroom(form, homeroom):
+    name = form.name.data.strip()
+    clash = Homeroom.query.filter(Homeroom.name == name, Homeroom.id != homeroom.id).first()
+    if clash is not None:
+        form.name.errors.append('A homeroom with this name already exists.')
+        return False
+    homeroom.name = name
+    homeroom.grade_id = form.grade.data
+    homeroom.teacher_id = form.teacher.data or None
+    homeroom.capacity = form.capacity.data
+    db.session.add(homeroom)
+    db.session.commit()
+    return True
+
+# Add, edit and delete homerooms (admin only)
+@bp.route('/admin/homerooms/add', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def add_homeroom():
+    form = HomeroomForm(grade=request.args.get('grade', type=int))
+    if form.validate_on_submit() and _save_homeroom(form, Homeroom()):
+        flash('Homeroom added.')
+        return redirect(url_for('views.homerooms', grade=form.grade.data))
+    return render_template('homeroom_form.html', title='Add Homeroom', form=form)
+
+@bp.route('/admin/homerooms/<int:homeroom_id>/edit', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def edit_homeroom(homeroom_id):
+    homeroom = Homeroom.query.get_or_404(homeroom_id)
+    form = HomeroomForm(data={'name': homeroom.name, 'grade': homeroom.grade_id,
+                              'teacher': homeroom.teacher_id or 0, 'capacity': homeroom.capacity})
+    if form.validate_on_submit() and _save_homeroom(form, homeroom):
+        flash('Homeroom updated.')
+        return redirect(url_for('views.homerooms', grade=homeroom.grade_id))
+    return render_template('homeroom_form.html', title='Edit Homeroom', form=form, homeroom=homeroom)
+
+@bp.route('/admin/homerooms/<int:homeroom_id>/delete', methods=['POST'])
+@login_required
+@role_required('admin')
+def remove_homeroom(homeroom_id):
+    homeroom = Homeroom.query.get_or_404(homeroom_id)
+    grade_id = homeroom.grade_id
+    unplaced = delete_homeroom(homeroom)
+    flash(f'Homeroom deleted; {unplaced} students need a new homeroom.' if unplaced else 'Homeroom deleted.')
+    return redirect(url_for('views.homerooms', grade=grade_id))
+
+# School-wide settings (admin only)
+@bp.route('/admin/settings', methods=['GET', 'POST'])
+@login_required
+@role_required('admin')
+def edit_settings():
+    current = settings.snapshot()
+    form = SettingsForm(data={name: current[name] for name in ('school_name', 'school_domain', 'default_password', 'theme')})
+    if form.validate_on_submit():
+        values = {name: getattr(form, name).data.strip() for name in ('school_name', 'school_domain', 'default_password')}
+        values['theme'] = form.theme.data
+        if form.logo.data:
+            try:
+                values['school_logo'] = store_original(form.logo.data.stream, current_app.config['MEDIA_ROOT'],
+                                                       current_app.config['MAX_IMAGE_BYTES'])
+            except ImageError as e:
+                flash(str(e))
+                return redirect(url_for('views.edit_settings'))
+            thumbnails.submit(values['school_logo'])
+        changed = settings.update(values)
+        flash(f"Saved {', '.join(SETTINGS[name].label.lower() for name in changed)}." if changed
+              else 'No settings changed.')
+        return redirect(url_for('views.edit_settings'))
+    return render_template('settings.html', title='Settings', form=form, logo=current['school_logo'])
 
 # Edit user route (admin only)
 @bp.route('/admin/users/<int:user_id>/edit', methods=['GET', 'POST'])
@@ -128,7 +322,7 @@ def list_users():
 @role_required('admin')
 def edit_user(user_id):
     user = User.query.get_or_404(user_id)
-    roles = Role.query.all()
+    roles = choices('roles')
     if request.method == 'POST':
         user.username = request.form['username']
         user.email = request.form['email']
@@ -136,27 +330,12 @@ def edit_user(user_id):
         user.last_name = request.form['last_name']
         user.role_id = request.form['role_id']
         db.session.commit()
+        invalidate_user(user.id)
         flash('User profile has been updated.')
         return redirect(url_for('views.list_users'))
     return render_template('edit_user.html', title='Edit User', user=user, roles=roles)
 
 
-# Function to generate a unique username
-def generate_username():
-    current_year = datetime.datetime.now().year
-    base_username = f"stu{current_year}"
-    last_user = User.query.filter(User.username.like(f"{base_username}%")).order_by(User.id.desc()).first()
-    if last_user:
-        last_number = int(last_user.username[-4:])
-        new_number = last_number + 1
-    else:
-        new_number = 442  # Starting number
-    return f"{base_username}{new_number:04d}"
-
-# Function to generate a unique email
-def generate_email(username):
-    return f"{username}@school.edu"
-
 # Route for manual student entry
 @bp.route('/admin/manual-student-entry', methods=['GET', 'POST'])
 @login_required
@@ -169,7 +348,7 @@ def manual_student_entry():
         role_id = form.role.data
         username = generate_username()
         email = generate_email(username)
-        password = "school1234"  # Default password
+        password = settings.get('default_password')
 
         user = User(username=username, email=email, first_name=first_name, last_name=last_name, role_id=role_id)
         user.set_password(password)  # Assuming you have a method to set the password hash
@@ -179,36 +358,156 @@ def manual_student_entry():
         return redirect(url_for('views.manual_student_entry'))
     return render_template('manual_student_entry.html', title='Manual Student Entry', form=form)
 
-    # Helper function to check if the user has a specific role
-def has_role(user, role_name):
-    return user.role.name == role_name
+# Rendered read-only profile details, keyed by (user id, profile version, lookups version)
+# so renamed grades, states and languages show up too
+profile_details_cache = LRUCache('student_profile_details', maxsize=2048, ttl=300)
+
+def profile_form_data(profile):
+    if profile is None:
+        return {}
+    return {
+        'age': profile.age,
+        'grade': profile.grade_id,
+        'address1': profile.address1,
+        'address2': profile.address2,
+        'city': profile.city,
+        'state': profile.state_id,
+        'zip': profile.zip,
+        'primary_language': profile.primary_language_id,
+    }
+
+def render_profile_details(user):
+    profile = user.student_profile
+    key = (user.id, profile.version if profile else None, current_versions()['lookups'][0])
+    details = profile_details_cache.get(key)
+    if details is None:
+        details = Markup(render_template('_student_profile_details.html', profile=profile or StudentProfile()))
+        profile_details_cache.set(key, details)
+    return details
+
+def _can_edit_profiles(**kwargs):
+    return permissions_for(current_user).has_any_role('admin', 'office', 'IT Support')
 
 @bp.route('/student/<int:user_id>/profile', methods=['GET', 'POST'])
 @login_required
+@conditional('users', 'notes', 'lookups', unless=_can_edit_profiles)
 def student_profile(user_id):
-    user = User.query.get_or_404(user_id)
-    if not (has_role(current_user, 'teacher') or has_role(current_user, 'admin') or has_role(current_user, 'office') or has_role(current_user, 'IT Support')):
+    permissions = permissions_for(current_user)
+    if not permissions.has_any_role('teacher', 'admin', 'office', 'IT Support'):
         abort(403)
+    can_edit = permissions.has_any_role('admin', 'office', 'IT Support')
 
-    # Ensure student_profile exists
-    if user.student_profile is None:
-        user.student_profile = StudentProfile(user_id=user.id)
-        db.session.add(user.student_profile)
-        db.session.commit()
+    if not can_edit:
+        use_replica()
 
-    form = StudentProfileForm(obj=user.student_profile)
-
-    if form.validate_on_submit() and (has_role(current_user, 'admin') or has_role(current_user, 'office') or has_role(current_user, 'IT Support')):
-        user.student_profile.age = form.age.data
-        user.student_profile.grade_id = form.grade.data
-        user.student_profile.address1 = form.address1.data
-        user.student_profile.address2 = form.address2.data
-        user.student_profile.city = form.city.data
-        user.student_profile.state_id = form.state.data
-        user.student_profile.zip = form.zip.data
-        user.student_profile.primary_language_id = form.primary_language.data
+    # User and profile in one query; names for grade/state/language come from the lookup cache
+    user = User.query.options(joinedload(User.student_profile)).filter_by(id=user_id).first_or_404()
+
+    note_count = count_notes(user.id)
+
+    if not can_edit:
+        return render_template('student_profile.html', title='Student Profile', user=user,
+                               can_edit=False, details=render_profile_details(user), note_count=note_count)
+
+    form = StudentProfileForm(data=profile_form_data(user.student_profile))
+
+    if form.validate_on_submit():
+        # Profiles are only created once there is something to save
+        profile = user.student_profile
+        if profile is None:
+            profile = StudentProfile(user_id=user.id)
+            db.session.add(profile)
+        else:
+            profile.version += 1
+        profile.age = form.age.data
+        profile.grade_id = form.grade.data
+        profile.address1 = form.address1.data
+        profile.address2 = form.address2.data
+        profile.city = form.city.data
+        profile.state_id = form.state.data
+        profile.zip = form.zip.data
+        profile.primary_language_id = form.primary_language.data
         db.session.commit()
         flash('Profile updated successfully.')
         return redirect(url_for('views.student_profile', user_id=user.id))
 
-    return render_template('student_profile.html', title='Student Profile', form=form, user=user)
\ No newline at end of file
+    return render_template('student_profile.html', title='Student Profile', form=form, user=user, can_edit=can_edit,
+                           note_count=note_count, photo_form=PhotoForm())
+
+# Upload a user's photo; thumbnails are rendered in the background
+@bp.route('/user/<int:user_id>/photo', methods=['POST'])
+@login_required
+def upload_photo(user_id):
+    if current_user.id != user_id and not permissions_for(current_user).has_any_role('admin', 'office', 'IT Support'):
+        abort(403)
+    user = User.query.get_or_404(user_id)
+    form = PhotoForm()
+    if form.validate_on_submit():
+        try:
+            digest = store_original(form.photo.data.stream, current_app.config['MEDIA_ROOT'],
+                                    current_app.config['MAX_IMAGE_BYTES'])
+        except ImageError as e:
+            flash(str(e))
+        else:
+            user.photo = digest
+            db.session.commit()
+            invalidate_user(user.id)
+            thumbnails.submit(digest)
+            flash('Photo updated.')
+    else:
+        flash('Choose an image to upload.')
+    return redirect(request.referrer or url_for('views.student_profile', user_id=user.id))
+
+# Notes timeline for a user, newest first, with full-text search
+@bp.route('/user/<int:user_id>/notes', methods=['GET', 'POST'])
+@login_required
+def user_notes(user_id):
+    permissions = permissions_for(current_user)
+    if not permissions.has_any_role('teacher', 'admin', 'office', 'IT Support'):
+        abort(403)
+    user = User.query.get_or_404(user_id)
+    form = NoteForm()
+    if form.validate_on_submit():
+        db.session.add(Note(user_id=user.id, note=form.note.data))
+        db.session.commit()
+        flash('Note added.')
+        return redirect(url_for('views.user_notes', user_id=user.id))
+
+    query = request.args.get('q', '').strip()
+    if query:
+        notes, page = search_notes(query, user_id=user.id, limit=current_app.config['NOTES_PER_PAGE']), None
+    else:
+        page = notes_page(user.id, after=request.args.get('after'), before=request.args.get('before'),
+                          per_page=current_app.config['NOTES_PER_PAGE'])
+        notes = page.items
+    return render_template('notes.html', title='Notes', user=user, notes=notes, page=page, query=query,
+                           form=form, total=count_notes(user.id),
+                           can_edit=permissions.has_any_role('admin', 'office', 'IT Support'))
+
+# Edit note route
+@bp.route('/notes/<int:note_id>/edit', methods=['GET', 'POST'])
+@login_required
+def edit_note(note_id):
+    if not permissions_for(current_user).has_any_role('admin', 'office', 'IT Support'):
+        abort(403)
+    note = Note.query.get_or_404(note_id)
+    form = NoteForm(obj=note)
+    if form.validate_on_submit():
+        note.note = form.note.data
+        db.session.commit()
+        flash('Note updated.')
+        return redirect(url_for('views.user_notes', user_id=note.user_id))
+    return render_template('edit_note.html', title='Edit Note', form=form, note=note)
+
+# Delete note route
+@bp.route('/notes/<int:note_id>/delete', methods=['POST'])
+@login_required
+def delete_note(note_id):
+    if not permissions_for(current_user).has_any_role('admin', 'office', 'IT Support'):
+        abort(403)
+    note = Note.query.get_or_404(note_id)
+    user_id = note.user_id
+    db.session.delete(note)
+    db.session.commit()
+    flash('Note deleted.')
+    return redirect(url_for('views.user_notes', user_id=user_id))
@@ -0,0 +1,26 @@
+"""add user last_name index for keyset pagination
+
+Revision ID: 7d3f1a2c9e51
+Revises: 2ed757c94f29
+Create Date: 2024-09-24 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f1a2c9e51'
+down_revision = '2ed757c94f29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_last_name_id', ['last_name', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_last_name_id')
@@ -0,0 +1,56 @@
+"""add notes timeline and full-text indexes
+
+Revision ID: c5f01a9d3e62
+Revises: b8d24e61c7f3
+Create Date: 2024-10-02 16:05:33.917204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f01a9d3e62'
+down_revision = 'b8d24e61c7f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.create_index('ix_notes_user_id_created_at', ['user_id', 'created_at', 'id'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.create_index('ix_notes_fulltext', 'notes', ['note'], unique=False, mysql_prefix='FULLTEXT')
+    elif dialect == 'sqlite':
+        # External-content FTS5 table kept in step with notes by triggers
+        op.execute("CREATE VIRTUAL TABLE notes_fts USING fts5(note, content='notes', content_rowid='id')")
+        op.execute("INSERT INTO notes_fts(rowid, note) SELECT id, note FROM notes")
+        op.execute("""
+            CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+                INSERT INTO notes_fts(rowid, note) VALUES (new.id, new.note);
+            END""")
+        op.execute("""
+            CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts(notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+            END""")
+        op.execute("""
+            CREATE TRIGGER notes_fts_update AFTER UPDATE ON notes BEGIN
+                INSERT INTO notes_fts(notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+                INSERT INTO notes_fts(rowid, note) VALUES (new.id, new.note);
+            END""")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.drop_index('ix_notes_fulltext', table_name='notes')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_insert")
+        op.execute("DROP TABLE IF EXISTS notes_fts")
+
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.drop_index('ix_notes_user_id_created_at')
@@ -0,0 +1,28 @@
+"""add user fulltext index for search
+
+Revision ID: f2b7c6d81e94
+Revises: e5a09d3b6c17
+Create Date: 2024-09-27 15:22:40.730915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c6d81e94'
+down_revision = 'e5a09d3b6c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only MySQL/MariaDB have FULLTEXT; other databases use the in-memory index
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_user_fulltext', 'user', ['username', 'first_name', 'last_name', 'email'],
+                        unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_user_fulltext', table_name='user')
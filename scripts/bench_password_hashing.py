@@ -0,0 +1,26 @@
+import sys
+import os
+import time
+
+# Add the project directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.hashing import hash_passwords, default_workers
+
+# Number of passwords to hash per run; pass a different count as the first argument
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+worker_counts = [1]
+while worker_counts[-1] * 2 <= default_workers():
+    worker_counts.append(worker_counts[-1] * 2)
+if worker_counts[-1] != default_workers():
+    worker_counts.append(default_workers())
+
+print(f"Hashing {count} passwords on {default_workers()} cores")
+print(f"{'workers':>8} {'seconds':>9} {'hashes/s':>9} {'speedup':>8}")
+baseline = None
+for workers in worker_counts:
+    started = time.perf_counter()
+    hash_passwords(["school1234"] * count, workers=workers)
+    elapsed = time.perf_counter() - started
+    baseline = baseline or elapsed
+    print(f"{workers:>8} {elapsed:>9.2f} {count / elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
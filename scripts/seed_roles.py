@@ -4,7 +4,8 @@ import os
 # Add the project directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app import db, create_app
-from app.models import Role, RoleGroup, RoleGroupMembership
+from app.models import Role, RoleGroup
+from app.memberships import set_memberships
 
 # Initialize the Flask app context
 app = create_app()
@@ -43,14 +44,15 @@ for group_name in ['admin', 'faculty', 'student', 'other']:
         db.session.add(group)
         role_groups[group_name] = group
 
-# Create roles and associate them with groups
+# Create missing roles, loading the existing ones in a single query
+existing_roles = {role.name: role for role in Role.query.all()}
 for role_data in roles:
-    role = Role.query.filter_by(name=role_data['name']).first()
-    if not role:
+    if role_data['name'] not in existing_roles:
         role = Role(name=role_data['name'])
         db.session.add(role)
-    group = role_groups[role_data['group']]
-    if group not in role.groups:
-        role.groups.append(group)
+        existing_roles[role.name] = role
+db.session.flush()
 
-db.session.commit()
+# Associate roles with groups; only missing memberships are inserted
+set_memberships({existing_roles[role_data['name']].id: [role_groups[role_data['group']].id]
+                 for role_data in roles}, replace=False)
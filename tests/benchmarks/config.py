@@ -0,0 +1,16 @@
+# tests/benchmarks/config.py
+
+import os
+from config import Config
+
+BENCHMARK_DB = os.environ.get('BENCHMARK_DB', os.path.join(os.path.dirname(__file__), 'benchmark.db'))
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(BENCHMARK_DB)
+    REPLICA_DATABASE_URI = None
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    # Seeded users share one cheap hash so seeding 100k users takes seconds
+    # and logins don't trigger background re-hashing
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
@@ -0,0 +1,188 @@
+# tests/benchmarks/run.py
+"""Endpoint latency and SQL query-count benchmarks.
+
+    python -m tests.benchmarks.run --users 100 --users 10000
+    python -m tests.benchmarks.run --users 1000 --baseline tests/benchmarks/baseline.json
+
+Each dataset size is seeded into a fresh SQLite database, the app is built
+through create_app with BenchmarkConfig, and every endpoint is requested
+``--repeat`` times after one warm-up request. Results are written as JSON.
+With ``--baseline`` the run fails (exit code 1) when an endpoint's median
+latency grows by more than ``--threshold`` (and ``--min-delta-ms``) or it
+issues more queries than the baseline recorded. Latency baselines are machine specific; regenerate
+them with ``--update-baseline`` on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from sqlalchemy import event
+from app import create_app, db
+from app.models import Role
+from tests.benchmarks.config import BenchmarkConfig, BENCHMARK_DB
+from tests.benchmarks.seed import seed, PASSWORD, ADMIN_USERNAME, TEACHER_USERNAME
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def attach(self, engines):
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self)
+
+
+def sign_in(app, username):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f"Could not sign in as {username}: {response.status_code}")
+    return client
+
+
+def endpoints(app, dataset, repeat):
+    """(name, client, method, url, form data) for each measured request."""
+    admin = sign_in(app, ADMIN_USERNAME)
+    teacher = sign_in(app, TEACHER_USERNAME)
+    student_id = dataset['student_ids'][len(dataset['student_ids']) // 2]
+    with app.app_context():
+        spare_roles = []
+        for n in range(repeat + 1):
+            role = Role(name=f'bench delete {n}')
+            db.session.add(role)
+            spare_roles.append(role)
+        db.session.commit()
+        spare_role_ids = [role.id for role in spare_roles]
+        teacher_role_id = Role.query.filter_by(name='teacher').first().id
+    counter = iter(range(10 ** 9))
+    profile_form = {'age': '12', 'grade': '3', 'address1': '1 Main St', 'address2': '', 'city': 'Springfield',
+                    'state': '1', 'zip': '45500', 'primary_language': '1'}
+
+    return [
+        ('login', lambda: app.test_client(), 'POST', lambda: '/login',
+         lambda: {'username': ADMIN_USERNAME, 'password': PASSWORD}),
+        ('index', lambda: admin, 'GET', lambda: '/index', None),
+        ('list_users', lambda: admin, 'GET', lambda: '/admin/users', None),
+        ('list_users_filtered', lambda: admin, 'GET', lambda: '/admin/users?group=3&sort=id', None),
+        ('student_profile_edit', lambda: admin, 'GET', lambda: f'/student/{student_id}/profile', None),
+        ('student_profile_read_only', lambda: teacher, 'GET', lambda: f'/student/{student_id}/profile', None),
+        ('student_profile_save', lambda: admin, 'POST', lambda: f'/student/{student_id}/profile',
+         lambda: profile_form),
+        ('manual_student_entry', lambda: admin, 'GET', lambda: '/admin/manual-student-entry', None),
+        ('manual_student_entry_save', lambda: admin, 'POST', lambda: '/admin/manual-student-entry',
+         lambda: {'first_name': 'Bench', 'last_name': 'Student', 'role': '17'}),
+        ('list_roles', lambda: admin, 'GET', lambda: '/lookup/roles', None),
+        ('add_role', lambda: admin, 'POST', lambda: '/lookup/roles/add',
+         lambda: {'name': f'bench role {next(counter)}'}),
+        ('edit_role', lambda: admin, 'POST', lambda: f'/lookup/roles/edit/{teacher_role_id}',
+         lambda: {'name': 'teacher'}),
+        ('manage_role_groups', lambda: admin, 'POST', lambda: f'/lookup/roles/manage-groups/{teacher_role_id}',
+         lambda: {'groups': ['2']}),
+        ('delete_role', lambda: admin, 'POST', lambda: f'/lookup/roles/delete/{spare_role_ids.pop()}', None),
+    ]
+
+
+def percentile(values, point):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(point / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_size(users, repeat):
+    app = create_app(BenchmarkConfig)
+    started = time.perf_counter()
+    with app.app_context():
+        dataset = seed(users)
+        counter = QueryCounter()
+        counter.attach(db.engines.values())
+    seconds = time.perf_counter() - started
+    print(f"Seeded {dataset['users']} users, {dataset['profiles']} profiles, "
+          f"{dataset['notes']} notes in {seconds:.1f}s", file=sys.stderr)
+
+    results = {}
+    for name, client, method, url, data in endpoints(app, dataset, repeat):
+        timings = []
+        queries = []
+        for attempt in range(repeat + 1):
+            request_client = client()
+            request_url = url()
+            form = data() if data else None
+            counter.count = 0
+            started = time.perf_counter()
+            response = request_client.open(request_url, method=method, data=form)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: {method} {request_url} returned {response.status_code}")
+            if attempt:  # The first request warms caches and is not counted
+                timings.append(elapsed * 1000)
+                queries.append(counter.count)
+        results[name] = {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': percentile(queries, 50),
+        }
+        print(f"  {users:>7} {name:<28} {results[name]['p50_ms']:>9.2f} ms "
+              f"{results[name]['queries']:>4} queries", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for size, endpoints_ in results.items():
+        for name, current in endpoints_.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            if current['queries'] > previous['queries']:
+                regressions.append(f"{size}/{name}: {previous['queries']} -> {current['queries']} queries")
+            slower = current['p50_ms'] - previous['p50_ms']
+            if current['p50_ms'] > previous['p50_ms'] * (1 + threshold) and slower > min_delta_ms:
+                regressions.append(f"{size}/{name}: p50 {previous['p50_ms']:.2f} -> {current['p50_ms']:.2f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, action='append', help='Dataset size (repeatable, default 100 and 1000).')
+    parser.add_argument('--repeat', type=int, default=20, help='Measured requests per endpoint.')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results.')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed median latency growth (0.25 = 25%%).')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='Ignore latency changes smaller than this, whatever the percentage.')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results to --baseline.')
+    args = parser.parse_args(argv)
+
+    results = {}
+    try:
+        for users in args.users or [100, 1000]:
+            results[str(users)] = run_size(users, args.repeat)
+    finally:
+        if os.path.exists(BENCHMARK_DB):
+            os.remove(BENCHMARK_DB)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
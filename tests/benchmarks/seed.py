@@ -0,0 +1,104 @@
+# tests/benchmarks/seed.py
+
+import random
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import (User, Role, RoleGroup, RoleGroupMembership, Grade, Language, State,
+                        StudentProfile, Note)
+
+PASSWORD = 'benchmark'
+
+GROUPS = ['admin', 'faculty', 'student', 'other']
+
+# Same roles and groups scripts/seed_roles.py creates
+ROLES = [
+    ('alumni', 'other'), ('attendance officer', 'admin'), ('board member', 'admin'),
+    ('coach', 'faculty'), ('counselor', 'faculty'), ('department head', 'admin'),
+    ('facilities', 'other'), ('finance officer', 'admin'), ('food service', 'other'),
+    ('health staff', 'other'), ('IT Support', 'admin'), ('librarian', 'faculty'),
+    ('office staff', 'other'), ('parent', 'other'), ('pastor', 'other'),
+    ('principal', 'admin'), ('student', 'student'), ('substitute teacher', 'faculty'),
+    ('teacher', 'faculty'), ('vice principal', 'admin'), ('volunteer', 'other'),
+    ('admin', 'admin'),
+]
+
+GRADES = ['K', '1st', '2nd', '3rd', '4th', '5th', '6th', '7th', '8th', '9th', '10th', '11th', '12th']
+LANGUAGES = ['English', 'Spanish', 'French', 'German', 'Mandarin', 'Arabic', 'Vietnamese']
+STATES = [('Ohio', 'OH'), ('Indiana', 'IN'), ('Michigan', 'MI'), ('Kentucky', 'KY'), ('Pennsylvania', 'PA')]
+FIRST_NAMES = ['Ava', 'Ben', 'Cara', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivan', 'Jo', 'Kai', 'Lia']
+LAST_NAMES = ['Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fox', 'Garcia', 'Hill', 'Ito', 'Jones']
+
+# Accounts the runner signs in as
+ADMIN_USERNAME = 'bench_admin'
+TEACHER_USERNAME = 'bench_teacher'
+
+
+def _batched_insert(table, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(table), rows[start:start + batch_size])
+
+
+def seed(users, seed_value=0, notes_per_user=2, profile_ratio=0.8):
+    """Create a synthetic school with ``users`` accounts in an empty database."""
+    rng = random.Random(seed_value)
+    db.drop_all()
+    db.create_all()
+
+    _batched_insert(RoleGroup.__table__, [{'id': i, 'name': name} for i, name in enumerate(GROUPS, 1)])
+    group_ids = {name: i for i, name in enumerate(GROUPS, 1)}
+    _batched_insert(Role.__table__, [{'id': i, 'name': name} for i, (name, _) in enumerate(ROLES, 1)])
+    _batched_insert(RoleGroupMembership.__table__,
+                    [{'role_id': i, 'group_id': group_ids[group]} for i, (_, group) in enumerate(ROLES, 1)])
+    role_ids = {name: i for i, (name, _) in enumerate(ROLES, 1)}
+    _batched_insert(Grade.__table__, [{'id': i, 'name': name} for i, name in enumerate(GRADES, 1)])
+    _batched_insert(Language.__table__, [{'id': i, 'name': name} for i, name in enumerate(LANGUAGES, 1)])
+    _batched_insert(State.__table__, [{'id': i, 'name': name, 'abbreviation': abbreviation}
+                                      for i, (name, abbreviation) in enumerate(STATES, 1)])
+
+    password_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+    staff_roles = [name for name, _ in ROLES if name != 'student']
+    user_rows = [
+        {'id': 1, 'username': ADMIN_USERNAME, 'email': f'{ADMIN_USERNAME}@school.edu', 'first_name': 'Bench',
+         'last_name': 'Admin', 'role_id': role_ids['IT Support'], 'password_hash': password_hash},
+        {'id': 2, 'username': TEACHER_USERNAME, 'email': f'{TEACHER_USERNAME}@school.edu', 'first_name': 'Bench',
+         'last_name': 'Teacher', 'role_id': role_ids['teacher'], 'password_hash': password_hash},
+    ]
+    for user_id in range(3, users + 1):
+        # Roughly nine students for every staff member or parent
+        role = 'student' if rng.random() < 0.9 else rng.choice(staff_roles)
+        user_rows.append({
+            'id': user_id,
+            'username': f'user{user_id:06d}',
+            'email': f'user{user_id:06d}@school.edu',
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'role_id': role_ids[role],
+            'password_hash': password_hash,
+        })
+    _batched_insert(User.__table__, user_rows)
+
+    student_ids = [row['id'] for row in user_rows if row['role_id'] == role_ids['student']]
+    profiles = [{
+        'user_id': user_id,
+        'age': rng.randint(5, 18),
+        'grade_id': rng.randint(1, len(GRADES)),
+        'city': 'Springfield',
+        'state_id': rng.randint(1, len(STATES)),
+        'zip': f'{rng.randint(10000, 99999)}',
+        'primary_language_id': rng.randint(1, len(LANGUAGES)),
+    } for user_id in student_ids if rng.random() < profile_ratio]
+    _batched_insert(StudentProfile.__table__, profiles)
+
+    notes = [{'user_id': user_id, 'note': f'Note {n} for user {user_id}'}
+             for user_id in student_ids for n in range(rng.randint(0, notes_per_user * 2))]
+    _batched_insert(Note.__table__, notes)
+    db.session.commit()
+
+    return {
+        'users': len(user_rows),
+        'students': len(student_ids),
+        'profiles': len(profiles),
+        'notes': len(notes),
+        'student_ids': student_ids,
+    }
@@ -0,0 +1,79 @@
+# tests/conftest.py
+
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import Grade, Language, Role, RoleGroup, RoleGroupMembership, State, User
+
+PASSWORD = 'secret'
+
+# One role per group plus IT Support, the superuser role
+GROUPS = ['admin', 'faculty', 'student', 'other']
+ROLES = [('admin', 'admin'), ('teacher', 'faculty'), ('student', 'student'), ('IT Support', 'admin')]
+
+
+class TestConfig(Config):
+    REPLICA_DATABASE_URI = None
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    JOB_PROCESSES = 1
+
+
+def reset_caches():
+    # Process-wide caches would otherwise carry rows over from the previous test's database
+    from app.cache import caches
+    from app.lookups import lookup_cache
+    from app.permissions import bump_permissions_version
+    from app.search import search_index
+    from app.settings import settings
+    for cache in caches.values():
+        cache.clear()
+    lookup_cache.invalidate()
+    settings.invalidate()
+    bump_permissions_version()
+    search_index.reset()
+
+
+@pytest.fixture
+def app(tmp_path):
+    config = type('Config', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'MEDIA_ROOT': str(tmp_path / 'media'),
+        'JOB_OUTPUT_DIR': str(tmp_path / 'job_output'),
+    })
+    app = create_app(config)
+    with app.app_context():
+        reset_caches()
+        db.create_all()
+        db.session.add_all(RoleGroup(id=i, name=name) for i, name in enumerate(GROUPS, 1))
+        for i, (name, group) in enumerate(ROLES, 1):
+            db.session.add(Role(id=i, name=name))
+            db.session.add(RoleGroupMembership(role_id=i, group_id=GROUPS.index(group) + 1))
+        db.session.add_all([Grade(id=1, name='1st'), Grade(id=2, name='2nd'),
+                            Language(id=1, name='English'), Language(id=2, name='Spanish'),
+                            State(id=1, name='Ohio', abbreviation='OH')])
+        for username, role_id in [('admin', 1), ('teacher', 2)]:
+            user = User(username=username, email=f'{username}@school.edu', first_name=username.title(),
+                        last_name='Staff', role_id=role_id)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username='admin'):
+    return client.post('/login', data={'username': username, 'password': PASSWORD})
+
+
+def add_student(username, **values):
+    user = User(username=username, email=f'{username}@school.edu', first_name=values.pop('first_name', 'Sam'),
+                last_name=values.pop('last_name', username.title()), role_id=3, password_hash='x', **values)
+    db.session.add(user)
+    return user
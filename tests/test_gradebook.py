@@ -0,0 +1,79 @@
+# tests/test_gradebook.py
+
+import numpy as np
+import pytest
+from app.gradebook import SectionLayout, weighted_averages
+
+nan = np.nan
+
+
+def _layout(categories, possible):
+    """categories: [(weight, drop_lowest)]; possible: [(category index, points possible)] per assignment."""
+    return SectionLayout(
+        assignment_ids=list(range(len(possible))),
+        columns={index: index for index in range(len(possible))},
+        category_ids=list(range(len(categories))),
+        category_index=np.array([category for category, points in possible], dtype=np.intp),
+        possible=np.array([points for category, points in possible], dtype=float),
+        weights=np.array([weight for weight, drop in categories], dtype=float),
+        drop_lowest=np.array([drop for weight, drop in categories], dtype=np.intp),
+    )
+
+
+def _reference(scores, layout):
+    # One student and one category at a time, the way a teacher would work it out
+    categories = np.full((len(scores), len(layout.category_ids)), nan)
+    averages = np.full(len(scores), nan)
+    weights = layout.weights if layout.weights.sum() > 0 else np.ones(len(layout.category_ids))
+    for row, student in enumerate(scores):
+        for category in range(len(layout.category_ids)):
+            graded = [(student[column], layout.possible[column]) for column in range(len(student))
+                      if layout.category_index[column] == category and not np.isnan(student[column])]
+            graded.sort(key=lambda score: score[0] / (score[1] if score[1] > 0 else 1.0))
+            kept = graded[min(int(layout.drop_lowest[category]), max(len(graded) - 1, 0)):]
+            possible = sum(points for earned, points in kept)
+            if possible > 0:
+                categories[row, category] = sum(earned for earned, points in kept) / possible * 100
+        counted = ~np.isnan(categories[row])
+        if weights[counted].sum() > 0:
+            averages[row] = (categories[row][counted] * weights[counted]).sum() / weights[counted].sum()
+    return categories, averages
+
+
+def test_drop_lowest_and_renormalized_weights():
+    # Homework (weight 1, drop 1) and tests (weight 3)
+    layout = _layout([(1, 1), (3, 0)], [(0, 10), (0, 10), (0, 20), (1, 100)])
+    scores = np.array([
+        [5, 10, 10, 80],     # 5/10 is dropped: homework 20/30
+        [nan, 8, nan, 90],   # Only one homework graded, so nothing is dropped
+        [6, 6, 12, nan],     # No test yet: the average is just homework
+        [nan, nan, nan, nan],
+    ])
+    categories, averages = weighted_averages(scores, layout)
+    assert np.allclose(categories, [[200 / 3, 80], [80, 90], [60, nan], [nan, nan]], equal_nan=True)
+    assert np.allclose(averages, [(200 / 3 + 3 * 80) / 4, (80 + 3 * 90) / 4, 60, nan], equal_nan=True)
+
+
+def test_empty_sections():
+    layout = _layout([(1, 0)], [(0, 10)])
+    categories, averages = weighted_averages(np.empty((0, 1)), layout)
+    assert categories.shape == (0, 1) and averages.shape == (0,)
+    categories, averages = weighted_averages(np.empty((2, 0)), _layout([], []))
+    assert categories.shape == (2, 0) and np.isnan(averages).all()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    category_count = int(rng.integers(1, 4))
+    assignment_count = int(rng.integers(1, 9))
+    # Zero weights everywhere mean equal weights; zero points possible is an extra-credit column
+    categories = [(float(rng.choice([0, 1, 2, 5])), int(rng.integers(0, 3))) for _ in range(category_count)]
+    possible = [(int(rng.integers(0, category_count)), float(rng.choice([0, 5, 10, 20])))
+                for _ in range(assignment_count)]
+    layout = _layout(categories, possible)
+    scores = rng.integers(0, 21, size=(12, assignment_count)).astype(float)
+    scores[rng.random(scores.shape) < 0.3] = nan
+    expected = _reference(scores, layout)
+    for actual, wanted in zip(weighted_averages(scores, layout), expected):
+        assert np.allclose(actual, wanted, equal_nan=True)
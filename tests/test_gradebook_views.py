@@ -0,0 +1,65 @@
+# tests/test_gradebook_views.py
+
+import pytest
+from app import db
+from app.models import Assignment, AssignmentCategory, Enrollment, Section, User
+from tests.conftest import PASSWORD, add_student, login
+
+
+@pytest.fixture
+def section(app):
+    for username in ('ann', 'bob'):
+        add_student(username)
+    db.session.commit()
+    runner = app.test_cli_runner()
+    for args in (['add-term', 'Fall', '--starts', '2026-09-01', '--ends', '2026-12-18'],
+                 ['add-course', 'MATH1', 'Arithmetic', '--grade', '1'],
+                 ['add-section', 'MATH1', 'Fall', 'A', '--teacher', 'teacher'],
+                 ['enroll', '1', 'ann', 'bob']):
+        result = runner.invoke(args=['gradebook'] + args)
+        assert result.exit_code == 0, result.output
+    return db.session.get(Section, 1)
+
+
+def test_setup_commands(app, section):
+    assert (section.course.code, section.term.name, section.teacher.username) == ('MATH1', 'Fall', 'teacher')
+    assert Enrollment.query.filter_by(section_id=section.id).count() == 2
+    result = app.test_cli_runner().invoke(args=['gradebook', 'enroll', '1', 'nobody'])
+    assert result.exit_code != 0 and 'nobody' in result.output
+
+
+def test_grade_a_section(app, client, section):
+    login(client, 'teacher')
+    assert b'MATH1' in client.get('/gradebook/').data
+    client.post(f'/gradebook/section/{section.id}', data={'action': 'category', 'name': 'Quizzes', 'weight': '1',
+                                                          'drop_lowest': '1'})
+    category = AssignmentCategory.query.one()
+    for name in ('Quiz 1', 'Quiz 2'):
+        client.post(f'/gradebook/section/{section.id}', data={'action': 'assignment', 'name': name,
+                                                              'category': category.id, 'points_possible': '10'})
+    quiz1, quiz2 = Assignment.query.order_by(Assignment.id).all()
+    ann, bob = [enrollment.student_id for enrollment in Enrollment.query.order_by(Enrollment.student_id)]
+
+    response = client.post(f'/gradebook/assignment/{quiz1.id}/scores', data={f'score-{ann}': '4', f'score-{bob}': '9'})
+    assert response.status_code == 302
+    client.post(f'/gradebook/assignment/{quiz2.id}/scores', data={f'score-{ann}': '8', f'score-{bob}': ''})
+    # Ann's lowest quiz is dropped; Bob only has one graded
+    averages = dict(db.session.query(Enrollment.student_id, Enrollment.average))
+    assert averages == {ann: pytest.approx(80.0), bob: pytest.approx(90.0)}
+    assert b'value="8.0"' in client.get(f'/gradebook/assignment/{quiz2.id}/scores').data
+    assert b'Quiz 2' in client.get(f'/gradebook/section/{section.id}').data
+
+    response = client.post(f'/gradebook/assignment/{quiz1.id}/scores', data={f'score-{ann}': 'ten'})
+    assert response.status_code == 302
+    assert db.session.get(Enrollment, (section.id, ann)).average == pytest.approx(80.0)
+
+
+def test_other_teachers_cannot_grade(app, client, section):
+    other = User(username='other', email='other@school.edu', first_name='Other', last_name='Staff', role_id=2)
+    other.set_password(PASSWORD)
+    db.session.add(other)
+    db.session.commit()
+    login(client, 'other')
+    assert b'MATH1' not in client.get('/gradebook/').data
+    assert client.get(f'/gradebook/section/{section.id}').status_code == 403
+    assert client.get('/gradebook/assignment/1/scores').status_code == 404
@@ -0,0 +1,66 @@
+# tests/test_homerooms.py
+
+from collections import Counter
+from app import db
+from app.homerooms import apply_placement, plan_grade
+from app.models import Homeroom, StudentProfile
+from tests.conftest import add_student, login
+
+
+def _seed_grade(languages):
+    for i, language_id in enumerate(languages):
+        user = add_student(f'stu{i}')
+        db.session.flush()
+        db.session.add(StudentProfile(user_id=user.id, grade_id=1, primary_language_id=language_id))
+    db.session.commit()
+
+
+def _add_rooms(client, *rooms):
+    login(client)
+    for name, capacity in rooms:
+        response = client.post('/admin/homerooms/add', data={'name': name, 'grade': 1, 'teacher': 2,
+                                                              'capacity': capacity})
+        assert response.status_code == 302
+    return {room.name: room.id for room in Homeroom.query}
+
+
+def test_manage_homerooms(app, client):
+    rooms = _add_rooms(client, ('1A', 10))
+    assert b'1A' in client.get('/admin/homerooms?grade=1').data
+    # Names are unique
+    response = client.post('/admin/homerooms/add', data={'name': '1A', 'grade': 1, 'teacher': 0, 'capacity': 5})
+    assert b'already exists' in response.data
+    client.post(f"/admin/homerooms/{rooms['1A']}/edit", data={'name': '1B', 'grade': 1, 'teacher': 0,
+                                                              'capacity': 12})
+    room = db.session.get(Homeroom, rooms['1A'])
+    assert (room.name, room.capacity, room.teacher_id) == ('1B', 12, None)
+    client.post(f"/admin/homerooms/{room.id}/delete")
+    assert Homeroom.query.count() == 0
+
+
+def test_plan_and_apply(app, client):
+    _seed_grade([1, 1, 1, 1, 2, 2, 2, 1, 2])
+    rooms = _add_rooms(client, ('1A', 5), ('1B', 5))
+    placement = plan_grade(1)
+    assert not placement.unplaced
+    assert apply_placement(placement) == 9
+
+    profiles = StudentProfile.query.all()
+    counts = Counter(profile.homeroom_id for profile in profiles)
+    assert sorted(counts.values()) == [4, 5]
+    assert set(counts) == set(rooms.values())
+    # Languages are spread across both rooms, not grouped
+    for language_id in (1, 2):
+        per_room = Counter(profile.homeroom_id for profile in profiles if profile.primary_language_id == language_id)
+        assert max(per_room.values()) - min(per_room.values()) <= 1 and len(per_room) == 2
+    # A balanced grade needs no moves
+    assert plan_grade(1).moves == {}
+
+
+def test_students_that_do_not_fit(app, client):
+    _seed_grade([1, 1, 1])
+    _add_rooms(client, ('1A', 2))
+    placement = plan_grade(1)
+    assert len(placement.unplaced) == 1
+    apply_placement(placement)
+    assert Counter(profile.homeroom_id for profile in StudentProfile.query)[None] == 1
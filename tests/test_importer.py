@@ -0,0 +1,19 @@
+# tests/test_importer.py
+
+from werkzeug.security import check_password_hash
+from app.models import User
+
+
+def test_import_students_hashes_default_passwords(app, tmp_path):
+    path = tmp_path / 'students.csv'
+    path.write_text('username,email,password_hash,first_name,last_name\n'
+                    'ann,ann@school.edu,,Ann,Lee\n'
+                    ',,,Bob,Ray\n'
+                    'admin,,,Dup,Licate\n')
+    result = app.test_cli_runner().invoke(args=['import-students', str(path), '--chunk-size', '2',
+                                                '--default-password', 'changeme'])
+    assert result.exit_code == 0, result.output
+    assert 'Done: 2 inserted, 1 skipped' in result.output
+    students = User.query.filter_by(role_id=3).order_by(User.id).all()
+    assert [user.first_name for user in students] == ['Ann', 'Bob']
+    assert all(check_password_hash(user.password_hash, 'changeme') for user in students)
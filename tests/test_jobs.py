@@ -0,0 +1,94 @@
+# tests/test_jobs.py
+
+import threading
+import time
+import pytest
+from app import db
+from app.jobs import JOB_TYPES, JobRunner, JobType, cancel, submit
+from app.models import Job
+
+
+def _wait(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def _statuses(ids):
+    db.session.expire_all()
+    return [db.session.get(Job, job_id).status for job_id in ids]
+
+
+@pytest.fixture
+def runner(app):
+    runner = JobRunner()
+    runner.configure(workers=4, processes=1, limits={'test_limited': 2})
+    yield runner
+    runner.shutdown()
+
+
+def test_limit_per_type(app, runner, monkeypatch):
+    lock = threading.Lock()
+    release = threading.Event()
+    counts = {'running': 0, 'peak': 0}
+
+    def handler(job, n):
+        with lock:
+            counts['running'] += 1
+            counts['peak'] = max(counts['peak'], counts['running'])
+        release.wait(10)
+        with lock:
+            counts['running'] -= 1
+        return {'n': n}
+
+    monkeypatch.setitem(JOB_TYPES, 'test_limited', JobType('test_limited', 'Test', handler, 1))
+    ids = [submit('test_limited', {'n': n}, start=False) for n in range(5)]
+    for job_id in ids:
+        runner.dispatch(job_id, 'test_limited', app)
+    _wait(lambda: _statuses(ids).count('running') == 2)
+    # The configured limit (2) overrides the type's default (1); the rest wait in memory
+    assert _statuses(ids).count('queued') == 3 and runner.tracks(ids[-1])
+    release.set()
+    _wait(lambda: not runner.busy())
+    assert _statuses(ids) == ['succeeded'] * 5
+    assert counts['peak'] == 2
+    assert db.session.get(Job, ids[0]).result == '{"n": 0}'
+
+
+def test_cancel_running_and_waiting(app, runner, monkeypatch):
+    started = threading.Event()
+
+    def handler(job):
+        started.set()
+        for done in range(1000):
+            job.progress(done, 1000, force=True)
+            time.sleep(0.01)
+
+    monkeypatch.setitem(JOB_TYPES, 'test_limited', JobType('test_limited', 'Test', handler, 1))
+    runner.configure(workers=4, processes=1, limits={'test_limited': 1})
+    running, waiting = [submit('test_limited', start=False) for _ in range(2)]
+    runner.dispatch(running, 'test_limited', app)
+    runner.dispatch(waiting, 'test_limited', app)
+    assert started.wait(10)
+
+    # A waiting job is cancelled at once and never claimed; a running one stops at its next progress report
+    assert cancel(waiting) and cancel(running)
+    _wait(lambda: not runner.busy())
+    assert _statuses([running, waiting]) == ['cancelled', 'cancelled']
+    job = db.session.get(Job, running)
+    assert job.cancel_requested and job.done < 1000 and job.finished_at is not None
+    assert not cancel(running)
+
+
+def test_failures_are_recorded(app, runner, monkeypatch):
+    def handler(job):
+        raise ValueError('bad input')
+
+    monkeypatch.setitem(JOB_TYPES, 'test_limited', JobType('test_limited', 'Test', handler, 1))
+    job_id = submit('test_limited', start=False)
+    runner.dispatch(job_id, 'test_limited', app)
+    _wait(lambda: not runner.busy())
+    job = db.session.get(Job, job_id)
+    db.session.refresh(job)
+    assert (job.status, job.error) == ('failed', 'bad input')
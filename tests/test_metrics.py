@@ -0,0 +1,49 @@
+# tests/test_metrics.py
+
+import json
+import os
+from app import metrics
+from tests.conftest import login
+
+
+def test_scrape_requires_admin_token_or_allowed_address(app, client):
+    assert client.get('/metrics').status_code == 403
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200 and b'app_http_requests_total' in response.data
+    app.config['METRICS_ALLOWED_IPS'] = ('127.0.0.1',)
+    assert client.get('/metrics').status_code == 200
+
+    app.config['METRICS_ALLOWED_IPS'] = ()
+    login(client, 'teacher')
+    assert client.get('/metrics').status_code == 403
+    client.get('/logout')
+    login(client)
+    assert client.get('/metrics').status_code == 200
+
+
+def test_reused_pid_keeps_the_old_counters(tmp_path):
+    # A worker that exited, and a newer one that got the same pid
+    pid = os.getpid()
+    for started, value in ((1, 5.0), (2, 7.0)):
+        gauges = [['app_test_gauge', [], 1.0]]
+        with open(tmp_path / f'{pid}-{started}.json', 'w') as f:
+            json.dump({'counters': [['app_test_total', [], value]], 'histograms': [], 'gauges': gauges}, f)
+    counters, _, gauges = metrics.gather(str(tmp_path))
+    assert counters[('app_test_total', ())] == 12.0
+    # This process's own file is the newest for its pid, so the older files' gauges are dropped
+    assert os.path.exists(tmp_path / metrics.registry.file_name)
+    assert [name for name, _, _ in gauges if name == 'app_test_gauge'] == []
+
+
+def test_non_finite_values(app, client, monkeypatch):
+    assert [metrics._format_value(value) for value in (3, 2.5, float('inf'), float('-inf'), float('nan'))] == \
+        ['3', '2.5', '+Inf', '-Inf', 'NaN']
+    monkeypatch.setattr(metrics, 'collect_gauges', lambda: [['app_test_gauge', [], float('nan')]])
+    monkeypatch.setattr(metrics.registry, 'histograms', {})
+    metrics.observe('app_test_seconds', (), float('inf'))
+    app.config['METRICS_ALLOWED_IPS'] = ('127.0.0.1',)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'app_test_gauge NaN' in response.data and b'app_test_seconds_sum +Inf' in response.data
@@ -0,0 +1,44 @@
+# tests/test_notes.py
+
+from app import db
+from app.models import Note
+from app.notes import notes_page
+from tests.conftest import add_student
+
+
+def _add_notes(count):
+    user = add_student('stu1')
+    db.session.flush()
+    # CURRENT_TIMESTAMP has one-second resolution, so these all share a created_at
+    db.session.add_all(Note(user_id=user.id, note=f'note {i}') for i in range(count))
+    db.session.commit()
+    return user.id, [note.id for note in Note.query.order_by(Note.id.desc())]
+
+
+def test_notes_page_forward_and_back(app):
+    user_id, ids = _add_notes(7)
+    pages = []
+    page = notes_page(user_id, per_page=2)
+    for _ in range(len(ids)):  # Bounded, so a cursor that doesn't advance fails instead of hanging
+        pages.append([note.id for note in page.items])
+        if page.next_cursor is None:
+            break
+        page = notes_page(user_id, after=page.next_cursor, per_page=2)
+    assert pages == [ids[0:2], ids[2:4], ids[4:6], ids[6:7]]
+
+    # "Newer" links walk back to the first page
+    back = []
+    while page.prev_cursor is not None and len(back) < len(ids):
+        page = notes_page(user_id, before=page.prev_cursor, per_page=2)
+        back.append([note.id for note in page.items])
+    assert back == [ids[4:6], ids[2:4], ids[0:2]]
+
+
+def test_notes_page_across_timestamps(app):
+    user_id, ids = _add_notes(3)
+    db.session.add(Note(user_id=user_id, note='older', created_at=Note.query.first().created_at.replace(year=2000)))
+    db.session.commit()
+    first = notes_page(user_id, per_page=3)
+    second = notes_page(user_id, after=first.next_cursor, per_page=3)
+    assert [note.note for note in second.items] == ['older']
+    assert [note.id for note in notes_page(user_id, before=second.prev_cursor, per_page=3).items] == ids
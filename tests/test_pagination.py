@@ -0,0 +1,63 @@
+# tests/test_pagination.py
+
+import pytest
+from app import db
+from app.models import User
+from app.pagination import decode_cursor, encode_cursor, keyset_paginate
+from tests.conftest import add_student
+
+COLUMNS = (User.last_name, User.id)
+
+
+def _key(user):
+    return [user.last_name, user.id]
+
+
+def _walk(columns, per_page, descending=False):
+    """Every page forward, then back again via the prev cursors."""
+    query = User.query.filter(User.role_id == 3)
+    key = lambda user: [getattr(user, column.key) for column in columns]
+    page = keyset_paginate(query, columns, key, per_page=per_page, descending=descending)
+    forward = [[user.id for user in page.items]]
+    while page.next_cursor is not None and len(forward) <= User.query.count():
+        page = keyset_paginate(query, columns, key, after=page.next_cursor, per_page=per_page, descending=descending)
+        forward.append([user.id for user in page.items])
+    back = [forward[-1]]
+    while page.prev_cursor is not None and len(back) <= len(forward):
+        page = keyset_paginate(query, columns, key, before=page.prev_cursor, per_page=per_page,
+                               descending=descending)
+        back.append([user.id for user in page.items])
+    return forward, back[::-1]
+
+
+@pytest.fixture
+def students(app):
+    # Ties and NULLs in the sort column
+    for username, last_name in [('s1', 'Lee'), ('s2', None), ('s3', 'Adams'), ('s4', 'Lee'), ('s5', None),
+                                ('s6', 'Zhou'), ('s7', 'Lee')]:
+        add_student(username, last_name=last_name)
+    db.session.commit()
+    return User.query.filter(User.role_id == 3).all()
+
+
+@pytest.mark.parametrize('per_page', [1, 2, 3, 7, 10])
+def test_pages_cover_every_row_once(students, per_page):
+    expected = [user.id for user in sorted(students, key=lambda user: (user.last_name is not None,
+                                                                       user.last_name or '', user.id))]
+    forward, back = _walk(COLUMNS, per_page)
+    assert sum(forward, []) == expected
+    assert all(len(page) == per_page for page in forward[:-1])
+    assert back == forward
+
+
+def test_descending(students):
+    forward, back = _walk((User.id,), 3, descending=True)
+    assert sum(forward, []) == sorted((user.id for user in students), reverse=True)
+    assert back == forward
+
+
+def test_bad_cursors_start_over(students):
+    first = keyset_paginate(User.query, COLUMNS, _key, per_page=2)
+    for cursor in ('not-base64!', encode_cursor([1]), encode_cursor({'a': 1})):
+        assert keyset_paginate(User.query, COLUMNS, _key, after=cursor, per_page=2).items == first.items
+    assert decode_cursor(encode_cursor(['Lee', 4])) == ['Lee', 4]
@@ -0,0 +1,45 @@
+# tests/test_permissions.py
+
+from flask import g
+from sqlalchemy import delete
+from app import db, permissions
+from app.models import RoleGroupMembership
+from app.permissions import ANONYMOUS, _cache, permissions_for_role
+from app.versions import bump
+
+
+def _next_request():
+    g.pop('data_versions', None)
+
+
+def test_role_changes_from_other_processes_are_seen(app, monkeypatch):
+    assert permissions_for_role(1).allows('admin')
+    # Another worker, job or script: Core write plus the shared 'roles' version, no local bump
+    db.session.execute(delete(RoleGroupMembership).where(RoleGroupMembership.role_id == 1))
+    bump('roles')
+    db.session.commit()
+    _next_request()
+    assert permissions_for_role(1).allows('admin')  # Not checked again until the interval passes
+    monkeypatch.setattr(_cache, '_checked_at', 0.0)
+    assert not permissions_for_role(1).allows('admin')
+
+
+def test_checks_read_the_shared_version_once_per_interval(app, monkeypatch):
+    reads = []
+    current_versions = permissions.current_versions
+    monkeypatch.setattr(permissions, 'current_versions', lambda: reads.append(1) or current_versions())
+    for _ in range(5):
+        _next_request()
+        assert permissions_for_role(1).allows('admin')
+    assert len(reads) == 1
+
+
+def test_unknown_role_is_not_rebuilt_per_lookup(app, monkeypatch):
+    permissions_for_role(1)
+    rebuilds = []
+    monkeypatch.setattr(_cache, '_rebuild', lambda key: rebuilds.append(key))
+    monkeypatch.setattr(_cache, 'check_interval', 0)
+    for _ in range(3):
+        _next_request()
+        assert permissions_for_role(999) is ANONYMOUS
+    assert rebuilds == []
@@ -0,0 +1,31 @@
+# tests/test_profiles.py
+
+from app import db
+from app.homerooms import apply_placement, plan_grade
+from app.models import Homeroom, Language, StudentProfile
+from tests.conftest import add_student, login
+
+
+def _student_with_profile():
+    user = add_student('stu1')
+    db.session.flush()
+    db.session.add(StudentProfile(user_id=user.id, grade_id=1, primary_language_id=2))
+    db.session.commit()
+    return user.id
+
+
+def test_read_only_profile_shows_renamed_lookups(app, client):
+    user_id = _student_with_profile()
+    login(client, 'teacher')
+    assert b'Spanish' in client.get(f'/student/{user_id}/profile').data
+    db.session.get(Language, 2).name = 'Espanol'
+    db.session.commit()
+    assert b'Espanol' in client.get(f'/student/{user_id}/profile').data
+
+
+def test_bulk_homeroom_changes_bump_the_profile_version(app):
+    user_id = _student_with_profile()
+    db.session.add(Homeroom(name='1A', grade_id=1, capacity=5))
+    db.session.commit()
+    apply_placement(plan_grade(1))
+    assert db.session.get(StudentProfile, user_id).version == 2
@@ -0,0 +1,70 @@
+# tests/test_search.py
+
+import time
+from flask import g
+from sqlalchemy import insert
+from app import db
+from app.models import StudentProfile, User
+from app.search import _boolean_query, search_index, search_users
+from app.versions import bump_versions
+from tests.conftest import add_student
+
+
+def _wait_for_rebuild():
+    deadline = time.monotonic() + 5
+    while search_index._rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_prefix_search(app):
+    add_student('stu1', first_name='Mary-Jo', last_name='Smith')
+    add_student('stu2', first_name='Maria', last_name='Jones')
+    db.session.commit()
+    assert {user['username'] for user in search_users('mar jo')} == {'stu1', 'stu2'}
+    assert [user['username'] for user in search_users('smi')] == ['stu1']
+    assert [user['username'] for user in search_users('stu2@school')] == ['stu2']
+
+
+def test_users_written_elsewhere_are_picked_up(app):
+    search_users('anything')
+    assert search_index.ready
+    # A Core insert from another worker or job: only the shared 'users' version moves
+    with db.engine.begin() as connection:
+        connection.execute(insert(User.__table__).values(username='late', email='late@school.edu', role_id=3))
+        bump_versions(connection, ['users'])
+    g.pop('data_versions', None)
+    search_index.check_interval = 0
+    search_users('late')  # Starts the rebuild; the old copy answers meanwhile
+    _wait_for_rebuild()
+    assert [user['username'] for user in search_users('late')] == ['late']
+
+
+def test_boolean_query_strips_operators(app):
+    assert _boolean_query('jo@sch') == '+jo* +sch*'
+    assert _boolean_query('o\'brien -x (y) "z" ~w') == '+o* +brien* +x* +y* +z* +w*'
+    assert _boolean_query('@ ..') == ''
+
+
+def test_own_writes_do_not_rebuild(app, monkeypatch):
+    add_student('stu1', first_name='Ann', last_name='Lee')
+    db.session.commit()
+    search_users('ann')
+    rebuilds = []
+    monkeypatch.setattr(search_index, '_rebuild_in_background', lambda: rebuilds.append(1))
+    search_index.check_interval = 0
+    # Edits in this worker move the shared 'users' version but are applied by upsert
+    user = User.query.filter_by(username='stu1').one()
+    user.last_name = 'Lee-Park'
+    db.session.commit()
+    db.session.add(StudentProfile(user_id=user.id, grade_id=1))
+    db.session.commit()
+    g.pop('data_versions', None)
+    assert [found['last_name'] for found in search_users('park')] == ['Lee-Park']
+    assert rebuilds == []
+
+    # A write from elsewhere on top of them still does
+    with db.engine.begin() as connection:
+        bump_versions(connection, ['users'])
+    g.pop('data_versions', None)
+    search_users('ann')
+    assert rebuilds == [1]
@@ -0,0 +1,16 @@
+# tests/test_settings.py
+
+from app.settings import settings
+
+
+def test_invalidate_racing_a_load(app, monkeypatch):
+    load = settings._load
+
+    def load_then_invalidate(version):
+        values = load(version)
+        settings._values = None  # What invalidate() in another thread can do right after the load
+        return values
+
+    monkeypatch.setattr(settings, '_load', load_then_invalidate)
+    settings.invalidate()
+    assert settings.get('school_name')
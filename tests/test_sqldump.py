@@ -0,0 +1,91 @@
+# tests/test_sqldump.py
+
+import datetime
+import gzip
+import re
+from decimal import Decimal
+import pytest
+from app.sqldump import DumpError, DumpReader, dump_rows, read_dump
+
+
+def _write(tmp_path, text):
+    path = tmp_path / 'dump.sql'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_escapes(tmp_path):
+    path = _write(tmp_path, "CREATE TABLE `t` (`id` int, `s` varchar(20));\n"
+                            "INSERT INTO `t` VALUES (1,'it\\'s'),(2,'a\\nb\\\\c'),(3,'50\\% off\\_x'),(4,'don''t');\n")
+    rows = [row for batch in read_dump(path) for row in batch.rows]
+    assert rows == [(1, "it's"), (2, 'a\nb\\c'), (3, '50\\% off\\_x'), (4, "don't")]
+
+
+DUMP = """-- MySQL dump
+/*!40101 SET NAMES utf8mb4 */;
+# comment line
+DROP TABLE IF EXISTS `users`;
+CREATE TABLE IF NOT EXISTS `users` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `name` varchar(64) DEFAULT NULL COMMENT 'a, (b)',
+  `balance` decimal(10,2) DEFAULT '0.00',
+  `score` double,
+  `born` date,
+  `seen` datetime,
+  `token` varbinary(4),
+  PRIMARY KEY (`id`),
+  KEY `ix_name` (`name`)
+) ENGINE=InnoDB;
+CREATE TABLE `skipped` (`id` int);
+INSERT INTO `skipped` VALUES (1),(2);
+INSERT INTO `users` VALUES (1,'Ann (x), y',12.50,1.5,'2010-05-01','2024-01-02 03:04:05',0x0a0b),
+(2,NULL,-3.00,2e3,'0000-00-00','0000-00-00 00:00:00',NULL);
+INSERT IGNORE INTO `users` (`id`, `name`) VALUES (3,'semi;colon');
+"""
+
+
+def _rows(path, **kwargs):
+    return [(batch.table, row) for batch in read_dump(path, **kwargs) for row in batch.rows]
+
+
+def test_types_and_tables(tmp_path):
+    path = _write(tmp_path, DUMP)
+    rows = _rows(path, tables=['users'])
+    assert rows == [
+        ('users', (1, 'Ann (x), y', Decimal('12.50'), 1.5, datetime.date(2010, 5, 1),
+                   datetime.datetime(2024, 1, 2, 3, 4, 5), b'\n\x0b')),
+        ('users', (2, None, Decimal('-3.00'), 2000.0, None, None, None)),
+        ('users', (3, 'semi;colon')),
+    ]
+    reader = DumpReader(path)
+    assert [batch.table for batch in reader.batches()][:1] == ['skipped']
+    assert [column.name for column in reader.tables['users'].columns] == ['id', 'name', 'balance', 'score', 'born',
+                                                                         'seen', 'token']
+    assert list(dump_rows(path, 'users'))[2] == {'id': 3, 'name': 'semi;colon'}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64])
+def test_small_buffers(tmp_path, chunk_size):
+    path = _write(tmp_path, DUMP)
+    expected = _rows(path)
+    batches = list(DumpReader(path, chunk_size=chunk_size).batches(batch_size=1))
+    assert [(batch.table, row) for batch in batches for row in batch.rows] == expected
+    assert all(len(batch.rows) == 1 for batch in batches)
+
+
+def test_gzip(tmp_path):
+    path = tmp_path / 'dump.sql.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(DUMP)
+    assert _rows(str(path)) == _rows(_write(tmp_path, DUMP))
+
+
+@pytest.mark.parametrize('text, message', [
+    ("INSERT INTO `t` VALUES (1);", 'no column list'),
+    ("CREATE TABLE `t` (`a` int, `b` int);\nINSERT INTO `t` VALUES (1,2),(3);", '1 values for 2 columns'),
+    ("CREATE TABLE `t` (`a` int);\nINSERT INTO `t` VALUES (1),(2", 'of t'),
+    ("/* never closed", 'Unterminated comment'),
+])
+def test_errors(tmp_path, text, message):
+    with pytest.raises(DumpError, match=re.escape(message)):
+        _rows(_write(tmp_path, text))
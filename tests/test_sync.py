@@ -0,0 +1,67 @@
+# tests/test_sync.py
+
+from werkzeug.security import check_password_hash
+from app import db, sync
+from app.models import Language, SyncLedger, User
+from app.sync import SYNC_TABLES, sync_batch
+
+
+def test_rows_without_a_match_value_are_conflicts(app):
+    spec = SYNC_TABLES['languages']
+    counts = sync_batch(spec, [{'id': 10, 'name': 'French'}, {'id': 11, 'name': ''}, {'id': 12, 'name': None}], {})
+    assert counts == (1, 0, 0, 2)
+    assert Language.query.filter_by(name='French').count() == 1
+    ledger = {entry.source_key: entry.target_id for entry in SyncLedger.query}
+    assert ledger['11'] is None and ledger['12'] is None
+
+
+def test_lookup_inserts_adopts_and_keeps_ids(app):
+    spec = SYNC_TABLES['languages']
+    rows = [{'id': 10, 'name': 'French'}, {'id': 2, 'name': 'German'}, {'id': 51, 'name': 'English'}]
+    assert sync_batch(spec, rows, {}) == (2, 1, 0, 0)
+    names = {language.name: language.id for language in Language.query}
+    # 10 was free so it's kept; 2 belongs to Spanish; English is matched by name, not duplicated
+    assert names['French'] == 10 and names['German'] not in (2, 10) and names['English'] == 1
+    assert names['Spanish'] == 2 and len(names) == 4
+    assert sync_batch(spec, rows, {}) == (0, 0, 3, 0)
+
+
+def test_unique_clashes_are_conflicts(app):
+    spec = SYNC_TABLES['languages']
+    sync_batch(spec, [{'id': 10, 'name': 'French'}], {})
+    # Renaming onto another language, or two new rows with one name, can't be applied
+    rows = [{'id': 10, 'name': 'Spanish'}, {'id': 61, 'name': 'Italian'}, {'id': 62, 'name': 'Italian'}]
+    assert sync_batch(spec, rows, {}) == (1, 0, 0, 2)
+    assert db.session.get(Language, 10).name == 'French'
+    assert Language.query.filter_by(name='Italian').count() == 1
+    ledger = {entry.source_key: entry.target_id for entry in SyncLedger.query}
+    assert ledger == {'10': None, '61': 61, '62': None}
+
+
+def test_students(app):
+    spec = SYNC_TABLES['students']
+    ann = {'id': 1, 'username': '', 'email': '', 'password_hash': '', 'first_name': 'Ann', 'last_name': 'Lee'}
+    bob = {'id': 2, 'username': 'bob', 'email': 'bob@old.edu', 'password_hash': 'h', 'first_name': 'Bob',
+           'last_name': 'Ray'}
+    options = {'default_password': 'changeme'}
+    assert sync_batch(spec, [ann, bob], options) == (2, 0, 0, 0)
+    user = User.query.filter_by(first_name='Ann').one()
+    assert user.username and user.email.startswith(user.username + '@') and user.role_id == 3
+    assert check_password_hash(user.password_hash, 'changeme')
+
+    # Empty source values never blank out the target
+    assert sync_batch(spec, [ann, dict(bob, first_name='', last_name='Ray-Lee')], options) == (0, 1, 1, 0)
+    user = User.query.filter_by(username='bob').one()
+    assert (user.first_name, user.last_name, user.email) == ('Bob', 'Ray-Lee', 'bob@old.edu')
+
+
+def test_generated_values_are_checked_for_clashes(app, monkeypatch):
+    # The generator hands out a name already taken, then the same new name twice
+    names = iter(['admin', 'newkid', 'newkid'])
+    monkeypatch.setattr(sync, 'generate_usernames', lambda count: [next(names) for _ in range(count)])
+    rows = [{'id': key, 'username': '', 'email': '', 'password_hash': 'h', 'first_name': 'New', 'last_name': 'Kid'}
+            for key in (1, 2, 3)]
+    assert sync_batch(SYNC_TABLES['students'], rows, {}) == (1, 0, 0, 2)
+    assert User.query.filter_by(username='newkid').count() == 1
+    ledger = {entry.source_key: entry.target_id for entry in SyncLedger.query}
+    assert ledger['1'] is None and ledger['3'] is None
@@ -0,0 +1,14 @@
+# tests/test_usernames.py
+
+from app.models import UsernameSequence
+from app.usernames import FIRST_STUDENT_NUMBER, generate_usernames, reserve_block
+
+
+def test_reserve_block(app):
+    assert reserve_block('stu2026', 0) == range(0)
+    assert generate_usernames(0, 'stu2026') == []
+    # Nothing is touched for an empty block
+    assert UsernameSequence.query.count() == 0
+    assert reserve_block('stu2026', 3) == range(FIRST_STUDENT_NUMBER, FIRST_STUDENT_NUMBER + 3)
+    assert generate_usernames(2, 'stu2026') == [f'stu2026{FIRST_STUDENT_NUMBER + 3:04d}',
+                                                f'stu2026{FIRST_STUDENT_NUMBER + 4:04d}']